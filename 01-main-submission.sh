@@ -16,29 +16,51 @@ source activate ~/ocssw_env
 
 scriptDir=/mnt/storage/labs/mitchell/spinkham/gitHubRepos/matchup_workflow_dev
 dataDir=/mnt/storage/labs/mitchell/projects/matchup-workflow-data/publish-dev-data/temp
-
-
-# From the field data file, create a SeaBASS formatted station list containing time, location, and ID data:
-python $scriptDir/02-seabass-station-list.py --fieldFile $dataDir/01-pic-sample-field.csv --idField ID --datetimeField yyyy-mm-ddThh:mm:ss --latitudeField Latitude --longitudeField Longitude --ofile $dataDir/02-seabass-station-list.sb
-
-
-# For a user defined list of satellites, search the CMR data repository for L2 download urls that matchup field data described in the SeaBASS station list within a given time window.
-# Note, list of satellites may include: ['modisa','modist','viirsn','viirsj1','viirsj2','meris','goci','czcs','seawifs','octs'].
-# If user desires matchups with other instruments, user must add key and values to the dict_plat in 03-find-matchup.py.
-
-for sensor in modisa modist viirsn seawifs viirsj1 viirsj2
-do
-    python $scriptDir/03-find-matchup.py --sat $sensor --seabass_file $dataDir/02-seabass-station-list.sb \
-    --output_file $dataDir/03-L2-granlinks.csv --data_type oc --max_time_diff 6 --verbose --includeGnatsCheck 1
-done
-
-
-# Edit the L2 urls to L1a urls which we will download:
-python $scriptDir/04-edit-L2-urls.py --L2granlinksFile $dataDir/03-L2-granlinks.csv --ofile $dataDir/04-L1a-granlinks.csv
-
-# Expand Bounding Boxes if multiple records point to single L1a granule. 
-# Output unique L1a granule list for downloading.
-python $scriptDir/05-create-L1a-download-list.py --L1aGranlinksFile $dataDir/04-L1a-granlinks.csv --ofile $dataDir/05-download-urls.csv
+# Format of the intermediate tables passed between the python stages (see table_support.py): csv, or parquet (typed, requires pyarrow,
+# which is not in the workflow environment: install it before switching).
+# Files read line by line by this script (09-pending-granlinks, shard lists) and the final matchup dataframe are always csv.
+tableExt=csv
+# Telemetry log of the timing and resources of every stage and step (see telemetry_support.py), reported by 12-report-telemetry.py
+# at the end of the run. Records are tagged with the run id. Comment out the export lines to disable.
+export MATCHUP_TELEMETRY=$dataDir/telemetry.jsonl
+export MATCHUP_RUN_ID=${PBS_JOBID:-$(date +%Y%m%dT%H%M%S)}
+# Uncomment to profile every python stage process with cProfile (see telemetry_support.py). The profiles are merged by stage
+# into $dataDir/profiles/merged by 12a-aggregate-profiles.py at the end of the run.
+#export MATCHUP_PROFILE=$dataDir/profiles
+# Run stages 02-05 in one python process (05a-run-stages-02-05.py), passing the tables between them in memory: 1, or 0 to run one script per stage.
+inProcess=1
+
+
+if [ $inProcess -eq 1 ]
+then
+    # Stages 02-05 in one process. The station list and L2 granule links are still written for reference:
+    python $scriptDir/05a-run-stages-02-05.py --fieldFile $dataDir/01-pic-sample-field.csv --idField ID --datetimeField yyyy-mm-ddThh:mm:ss --latitudeField Latitude --longitudeField Longitude \
+    --sat modisa modist viirsn seawifs viirsj1 viirsj2 --data_type oc --max_time_diff 6 --verbose --includeGnatsCheck 1 \
+    --stationList $dataDir/02-seabass-station-list.sb --L2granlinksFile $dataDir/03-L2-granlinks.csv \
+    --L1aGranlinksFile $dataDir/04-L1a-granlinks.$tableExt --downloadUrlsFile $dataDir/05-download-urls.$tableExt
+else
+    # From the field data file, create a SeaBASS formatted station list containing time, location, and ID data:
+    python $scriptDir/02-seabass-station-list.py --fieldFile $dataDir/01-pic-sample-field.csv --idField ID --datetimeField yyyy-mm-ddThh:mm:ss --latitudeField Latitude --longitudeField Longitude --ofile $dataDir/02-seabass-station-list.sb
+
+
+    # For a user defined list of satellites, search the CMR data repository for L2 download urls that matchup field data described in the SeaBASS station list within a given time window.
+    # Note, list of satellites may include: ['modisa','modist','viirsn','viirsj1','viirsj2','meris','goci','czcs','seawifs','octs'].
+    # If user desires matchups with other instruments, user must add key and values to the dict_plat in 03-find-matchup.py.
+
+    for sensor in modisa modist viirsn seawifs viirsj1 viirsj2
+    do
+        python $scriptDir/03-find-matchup.py --sat $sensor --seabass_file $dataDir/02-seabass-station-list.sb \
+        --output_file $dataDir/03-L2-granlinks.csv --data_type oc --max_time_diff 6 --verbose --includeGnatsCheck 1 --cache
+    done
+
+
+    # Edit the L2 urls to L1a urls which we will download:
+    python $scriptDir/04-edit-L2-urls.py --L2granlinksFile $dataDir/03-L2-granlinks.csv --ofile $dataDir/04-L1a-granlinks.$tableExt
+
+    # Expand Bounding Boxes if multiple records point to single L1a granule. 
+    # Output unique L1a granule list for downloading.
+    python $scriptDir/05-create-L1a-download-list.py --L1aGranlinksFile $dataDir/04-L1a-granlinks.$tableExt --ofile $dataDir/05-download-urls.$tableExt
+fi
 
 #############################
 ### Satellite Processing ###
@@ -51,144 +73,35 @@ if [ ! -d $satFileDir ]
 then mkdir $satFileDir
 fi
 
+# Generate this run's par files. The l2prod1 list is restricted to the products requested in the product manifest,
+# which is also read by 09-matchup-datarows.py so only those products are given pixel grid statistics.
+productManifest=$scriptDir/06g-product-manifest.txt
+python $scriptDir/06h-generate-par.py --defaultPar $scriptDir/06d-pardefaults-sst.par --productManifest $productManifest --ofile $dataDir/06-pardefaults-sst.par
+python $scriptDir/06h-generate-par.py --defaultPar $scriptDir/06e-pardefaults.par --productManifest $productManifest --ofile $dataDir/06-pardefaults.par
 
-### Download and Process Seawifs Files: ###
-satellite=seawifs
-if [ ! -d $satFileDir/$satellite ]
-then mkdir $satFileDir/$satellite
-fi
-parFile=$scriptDir/06e-pardefaults.par
-
-while IFS=, read -r granid granlink wlon slat elon nlat;
-	while [ $(jobs | wc -l) -ge 40 ] ; do
-		sleep 1s
-	done
-    year=${granid: -13:-9}
-    doy=${granid: -9:-6}
-    L2file=$granid.L2
-    if [[ ! -f $satFileDir/$satellite/$year/$doy/$L2file ]]; then
-        $scriptDir/06a-seawifs-workflow.sh -g $granlink -S $satFileDir -p $parFile -c $cookieFile -w $wlon -s $slat -e $elon -n $nlat
-    else
-        echo $L2file" already exists"
-    fi 
-done < $dataDir/05-download-urls-$satellite.csv
-
-
-### Download and Process Aqua Files: ###
-satellite=aqua
-if [ ! -d $satFileDir/$satellite ]
-then mkdir $satFileDir/$satellite
-fi
-parFile=$scriptDir/06d-pardefaults-sst.par
-
-while IFS=, read -r granid granlink wlon slat elon nlat; do
-	while [ $(jobs | wc -l) -ge 40 ] ; do
-		sleep 1s
-	done
-    year=${granid: -13:-9}
-    doy=${granid: -9:-6}
-    L2file=$granid.L2
-    if [[ ! -f $satFileDir/$satellite/$year/$doy/$L2file ]]; then
-        $scriptDir/06b-modis-workflow.sh -g $granlink -S $satFileDir -p $parFile -c $cookieFile -w $wlon -s $slat -e $elon -n $nlat
-    else
-        echo $L2file" already exists"
-    fi 
-done < $dataDir/05-download-urls-$satellite.csv
-
-
-### Download and Process Terra Files: ###
-satellite=terra
-if [ ! -d $satFileDir/$satellite ]
-then mkdir $satFileDir/$satellite
-fi
-parFile=$scriptDir/06d-pardefaults-sst.par
-
-while IFS=, read -r granid granlink wlon slat elon nlat; do
-	while [ $(jobs | wc -l) -ge 40 ] ; do
-		sleep 1s
-	done
-    year=${granid: -13:-9}
-    doy=${granid: -9:-6}
-    L2file=$granid.L2
-    if [[ ! -f $satFileDir/$satellite/$year/$doy/$L2file ]]; then
-        $scriptDir/06b-modis-workflow.sh -g $granlink -S $satFileDir -p $parFile -c $cookieFile -w $wlon -s $slat -e $elon -n $nlat
-    else
-        echo $L2file" already exists"
-    fi 
-done < $dataDir/05-download-urls-$satellite.csv
-
-
-### Download and Process Viirs SNPP Files: ###
-satellite=snpp
-if [ ! -d $satFileDir/$satellite ]
-then mkdir $satFileDir/$satellite
-fi
-parFile=$scriptDir/06d-pardefaults-sst.par
-
-while IFS=, read -r granid granlink wlon slat elon nlat; do
-	while [ $(jobs | wc -l) -ge 40 ] ; do
-		sleep 1s
-	done
-    year=${granid: -13:-9}
-    doy=${granid: -9:-6}
-    L2file=$granid.L2
-    
-    if [[ ! -f $satFileDir/$satellite/$year/$doy/$L2file ]]; then
-        $scriptDir/06c-viirs-workflow.sh -i $granid -g $granlink -S $satFileDir -p $parFile -c $cookieFile -w $wlon -s $slat -e $elon -n $nlat
-    else
-        echo $L2file" already exists"
-    fi 
-done < $dataDir/05-download-urls-$satellite.csv
-
-
-### Download and process JPSS1 Files: ###
-satellite=jpss1
-if [ ! -d $satFileDir/$satellite ]
-then mkdir $satFileDir/$satellite
-fi
-parFile=$scriptDir/06d-pardefaults-sst.par
-
-while IFS=, read -r granid granlink wlon slat elon nlat; do
-	while [ $(jobs | wc -l) -ge 40 ] ; do
-		sleep 1s
-	done
-    year=${granid: -13:-9}
-    doy=${granid: -9:-6}
-    L2file=$granid.L2
-    
-    if [[ ! -f $satFileDir/$satellite/$year/$doy/$L2file ]]; then
-        $scriptDir/06c-viirs-workflow.sh -i $granid -g $granlink -S $satFileDir -p $parFile -c $cookieFile -w $wlon -s $slat -e $elon -n $nlat
-    else
-        echo $L2file" already exists"
-    fi 
-done < $dataDir/05-download-urls-$satellite.csv
-
-
-### Download and process JPSS2 Files: ###
-satellite=jpss2
-if [ ! -d $satFileDir/$satellite ]
-then mkdir $satFileDir/$satellite
-fi
-parFile=$scriptDir/06d-pardefaults-sst.par
-
-while IFS=, read -r granid granlink wlon slat elon nlat; do
-	while [ $(jobs | wc -l) -ge 40 ] ; do
-		sleep 1s
-	done
-    year=${granid: -13:-9}
-    doy=${granid: -9:-6}
-    L2file=$granid.L2
-    
-    if [[ ! -f $satFileDir/$satellite/$year/$doy/$L2file ]]; then
-        $scriptDir/06c-viirs-workflow.sh -i $granid -g $granlink -S $satFileDir -p $parFile -c $cookieFile -w $wlon -s $slat -e $elon -n $nlat
-    else
-        echo $L2file" already exists"
-    fi 
-done < $dataDir/05-download-urls-$satellite.csv
+# The run state database records the status, timings, failure reasons, and outputs of every granule and matchup.
+# The scheduler, the percent-processed report, and the matchup reruns query it instead of re-scanning the data directories.
+stateDb=$dataDir/run-state.db
+
+# Prefetch ancillary data for the MODIS granules once per hour of acquisition, rather than calling getanc twice per granule.
+# The cached .anc par fragments are passed to 06b-modis-workflow.sh with the -a flag.
+ancCacheDir=$dataDir/ancillary-cache
+for satellite in aqua terra
+do
+    python $scriptDir/06f-prefetch-ancillary.py --downloadUrlsFile $dataDir/05-download-urls-$satellite.$tableExt --satellite $satellite --ancCacheDir $ancCacheDir
+done
+
+
+### Download and Process Satellite Files: ###
+# Granules from all satellites are processed from one queue. Jobs are packed against the PBS allocation (ncpus, mem) using the
+# per-satellite cpu and memory costs declared in 06i-sensor-costs.csv, and granules matched to the most field records go first.
+python $scriptDir/06j-schedule-granules.py --downloadUrlsFile $dataDir/05-download-urls.$tableExt --L1aGranlinksFile $dataDir/04-L1a-granlinks.$tableExt \
+--sensorCosts $scriptDir/06i-sensor-costs.csv --scriptDir $scriptDir --satFileDir $satFileDir --parFile $dataDir/06-pardefaults.par \
+--parFileSST $dataDir/06-pardefaults-sst.par --cookieFile $cookieFile --ancCacheDir $ancCacheDir --ncpus 40 --mem 512 --stateDb $stateDb
 
 
 ### Report percentages of satellite files that successfully processed to L2: ### 
-python $scriptDir/07-report-L2-percent-processed.py --downloadUrlsFile $dataDir/05-download-urls.csv --satelliteFileDirectory $dataDir/satellite-files
+python $scriptDir/07-report-L2-percent-processed.py --downloadUrlsFile $dataDir/05-download-urls.$tableExt --satelliteFileDirectory $dataDir/satellite-files --stateDb $stateDb
 
 
 #########################################################################################################
@@ -196,10 +109,11 @@ python $scriptDir/07-report-L2-percent-processed.py --downloadUrlsFile $dataDir/
 #########################################################################################################
 
 # Break apart the field dataframe by field datarows that are matched to specific satellites.
-python $scriptDir/08-partition-field-by-satellite.py --fieldFile $dataDir/01-pic-sample-field.csv --idField ID --granlinksFile $dataDir/04-L1a-granlinks.csv --ofile_base_name $dataDir/01-pic-sample-field
+python $scriptDir/08-partition-field-by-satellite.py --fieldFile $dataDir/01-pic-sample-field.csv --idField ID --granlinksFile $dataDir/04-L1a-granlinks.$tableExt --ofile_base_name $dataDir/01-pic-sample-field --ofile_extension .$tableExt
 
+# The navigation of each L2 granule is decoded once into memory-mapped arrays shared by its matchups (see nav_cache_support.py).
+navCacheDir=$dataDir/nav-cache
 
-underscore="_"
 
 ### Seawifs Matchups ###
 satellite=seawifs
@@ -208,16 +122,14 @@ if [ ! -d $matchupDir ]
 then mkdir -p $matchupDir
 fi
 
+python $scriptDir/09a-list-pending-matchups.py --granlinksFile $dataDir/04-L1a-granlinks-$satellite.$tableExt --matchupDir $matchupDir --stateDb $stateDb --ofile $dataDir/09-pending-granlinks-$satellite.csv
+
 while IFS=, read -r id granid url ; do
     while [ $(jobs | wc -l) -ge 40 ] ; do
         sleep 1s
     done  
-    if [[ ! -f $matchupDir/$id$underscore$granid.csv ]]; then
-        python $scriptDir/09-matchup-datarows.py --id $id --granid $granid --fieldDf $dataDir/01-pic-sample-field-$satellite.csv --matchupDir $matchupDir --satDir $dataDir/satellite-files --ofile_excludedMatchupLog $matchupDir/x01-excluded-matchup-log-$satellite.txt &
-    else
-        continue
-    fi    
-done < $dataDir/04-L1a-granlinks-$satellite.csv
+    python $scriptDir/09-matchup-datarows.py --id $id --granid $granid --fieldDf $dataDir/01-pic-sample-field-$satellite.$tableExt --matchupDir $matchupDir --satDir $dataDir/satellite-files --ofile_excludedMatchupLog $matchupDir/x01-excluded-matchup-log-$satellite.txt --productManifest $productManifest --stateDb $stateDb --navCache $navCacheDir &
+done < $dataDir/09-pending-granlinks-$satellite.csv
 wait
 
 
@@ -228,16 +140,14 @@ if [ ! -d $matchupDir ]
 then mkdir -p $matchupDir
 fi
 
+python $scriptDir/09a-list-pending-matchups.py --granlinksFile $dataDir/04-L1a-granlinks-$satellite.$tableExt --matchupDir $matchupDir --stateDb $stateDb --ofile $dataDir/09-pending-granlinks-$satellite.csv
+
 while IFS=, read -r id granid url ; do
     while [ $(jobs | wc -l) -ge 40 ] ; do
         sleep 1s
     done  
-    if [[ ! -f $matchupDir/$id$underscore$granid.csv ]]; then
-        python $scriptDir/09-matchup-datarows.py --id $id --granid $granid --fieldDf $dataDir/01-pic-sample-field-$satellite.csv --matchupDir $matchupDir --satDir $dataDir/satellite-files --ofile_excludedMatchupLog $matchupDir/x01-excluded-matchup-log-$satellite.txt &
-    else
-        continue
-    fi    
-done < $dataDir/04-L1a-granlinks-$satellite.csv
+    python $scriptDir/09-matchup-datarows.py --id $id --granid $granid --fieldDf $dataDir/01-pic-sample-field-$satellite.$tableExt --matchupDir $matchupDir --satDir $dataDir/satellite-files --ofile_excludedMatchupLog $matchupDir/x01-excluded-matchup-log-$satellite.txt --productManifest $productManifest --stateDb $stateDb --navCache $navCacheDir &
+done < $dataDir/09-pending-granlinks-$satellite.csv
 wait
 
 ### Terra Matchups ###
@@ -248,16 +158,14 @@ then mkdir -p $matchupDir
 fi
 
 
+python $scriptDir/09a-list-pending-matchups.py --granlinksFile $dataDir/04-L1a-granlinks-$satellite.$tableExt --matchupDir $matchupDir --stateDb $stateDb --ofile $dataDir/09-pending-granlinks-$satellite.csv
+
 while IFS=, read -r id granid url ; do
     while [ $(jobs | wc -l) -ge 40 ] ; do
         sleep 1s
     done  
-    if [[ ! -f $matchupDir/$id$underscore$granid.csv ]]; then
-        python $scriptDir/09-matchup-datarows.py --id $id --granid $granid --fieldDf $dataDir/01-pic-sample-field-$satellite.csv --matchupDir $matchupDir --satDir $dataDir/satellite-files --ofile_excludedMatchupLog $matchupDir/x01-excluded-matchup-log-$satellite.txt &
-    else
-        continue
-    fi    
-done < $dataDir/04-L1a-granlinks-$satellite.csv
+    python $scriptDir/09-matchup-datarows.py --id $id --granid $granid --fieldDf $dataDir/01-pic-sample-field-$satellite.$tableExt --matchupDir $matchupDir --satDir $dataDir/satellite-files --ofile_excludedMatchupLog $matchupDir/x01-excluded-matchup-log-$satellite.txt --productManifest $productManifest --stateDb $stateDb --navCache $navCacheDir &
+done < $dataDir/09-pending-granlinks-$satellite.csv
 wait
 
 
@@ -269,16 +177,14 @@ then mkdir -p $matchupDir
 fi
 
 
+python $scriptDir/09a-list-pending-matchups.py --granlinksFile $dataDir/04-L1a-granlinks-$satellite.$tableExt --matchupDir $matchupDir --stateDb $stateDb --ofile $dataDir/09-pending-granlinks-$satellite.csv
+
 while IFS=, read -r id granid url ; do
     while [ $(jobs | wc -l) -ge 40 ] ; do
         sleep 1s
     done  
-    if [[ ! -f $matchupDir/$id$underscore$granid.csv ]]; then
-        python $scriptDir/09-matchup-datarows.py --id $id --granid $granid --fieldDf $dataDir/01-pic-sample-field-$satellite.csv --matchupDir $matchupDir --satDir $dataDir/satellite-files --ofile_excludedMatchupLog $matchupDir/x01-excluded-matchup-log-$satellite.txt &
-    else
-        continue
-    fi    
-done < $dataDir/04-L1a-granlinks-$satellite.csv
+    python $scriptDir/09-matchup-datarows.py --id $id --granid $granid --fieldDf $dataDir/01-pic-sample-field-$satellite.$tableExt --matchupDir $matchupDir --satDir $dataDir/satellite-files --ofile_excludedMatchupLog $matchupDir/x01-excluded-matchup-log-$satellite.txt --productManifest $productManifest --stateDb $stateDb --navCache $navCacheDir &
+done < $dataDir/09-pending-granlinks-$satellite.csv
 wait
 
 ### Jpss1 Matchups ### 
@@ -289,16 +195,14 @@ then mkdir -p $matchupDir
 fi
 
 
+python $scriptDir/09a-list-pending-matchups.py --granlinksFile $dataDir/04-L1a-granlinks-$satellite.$tableExt --matchupDir $matchupDir --stateDb $stateDb --ofile $dataDir/09-pending-granlinks-$satellite.csv
+
 while IFS=, read -r id granid url ; do
     while [ $(jobs | wc -l) -ge 40 ] ; do
         sleep 1s
     done  
-    if [[ ! -f $matchupDir/$id$underscore$granid.csv ]]; then
-        python $scriptDir/09-matchup-datarows.py --id $id --granid $granid --fieldDf $dataDir/01-pic-sample-field-$satellite.csv --matchupDir $matchupDir --satDir $dataDir/satellite-files --ofile_excludedMatchupLog $matchupDir/x01-excluded-matchup-log-$satellite.txt &
-    else
-        continue
-    fi    
-done < $dataDir/04-L1a-granlinks-$satellite.csv
+    python $scriptDir/09-matchup-datarows.py --id $id --granid $granid --fieldDf $dataDir/01-pic-sample-field-$satellite.$tableExt --matchupDir $matchupDir --satDir $dataDir/satellite-files --ofile_excludedMatchupLog $matchupDir/x01-excluded-matchup-log-$satellite.txt --productManifest $productManifest --stateDb $stateDb --navCache $navCacheDir &
+done < $dataDir/09-pending-granlinks-$satellite.csv
 wait
 
 
@@ -310,16 +214,14 @@ then mkdir -p $matchupDir
 fi
 
 
+python $scriptDir/09a-list-pending-matchups.py --granlinksFile $dataDir/04-L1a-granlinks-$satellite.$tableExt --matchupDir $matchupDir --stateDb $stateDb --ofile $dataDir/09-pending-granlinks-$satellite.csv
+
 while IFS=, read -r id granid url ; do
     while [ $(jobs | wc -l) -ge 40 ] ; do
         sleep 1s
     done  
-    if [[ ! -f $matchupDir/$id$underscore$granid.csv ]]; then
-        python $scriptDir/09-matchup-datarows.py --id $id --granid $granid --fieldDf $dataDir/01-pic-sample-field-$satellite.csv --matchupDir $matchupDir --satDir $dataDir/satellite-files --ofile_excludedMatchupLog $matchupDir/x01-excluded-matchup-log-$satellite.txt &
-    else
-        continue
-    fi    
-done < $dataDir/04-L1a-granlinks-$satellite.csv
+    python $scriptDir/09-matchup-datarows.py --id $id --granid $granid --fieldDf $dataDir/01-pic-sample-field-$satellite.$tableExt --matchupDir $matchupDir --satDir $dataDir/satellite-files --ofile_excludedMatchupLog $matchupDir/x01-excluded-matchup-log-$satellite.txt --productManifest $productManifest --stateDb $stateDb --navCache $navCacheDir &
+done < $dataDir/09-pending-granlinks-$satellite.csv
 wait
 
 ############################################################
@@ -329,35 +231,43 @@ wait
 ### Seawifs ###
 satellite=seawifs
 matchupDir=$dataDir/matchups/$satellite
-python $scriptDir/10-merge-datarows.py --matchupDirectory $matchupDir --ofile $dataDir/06-matchup-$satellite.csv
+python $scriptDir/10-merge-datarows.py --matchupDirectory $matchupDir --ofile $dataDir/06-matchup-$satellite.$tableExt
 
 ### Aqua ###
 satellite=aqua
 matchupDir=$dataDir/matchups/$satellite
-python $scriptDir/10-merge-datarows.py --matchupDirectory $matchupDir --ofile $dataDir/06-matchup-$satellite.csv
+python $scriptDir/10-merge-datarows.py --matchupDirectory $matchupDir --ofile $dataDir/06-matchup-$satellite.$tableExt
 
 ### Terra ###
 satellite=terra
 matchupDir=$dataDir/matchups/$satellite
-python $scriptDir/10-merge-datarows.py --matchupDirectory $matchupDir --ofile $dataDir/06-matchup-$satellite.csv
+python $scriptDir/10-merge-datarows.py --matchupDirectory $matchupDir --ofile $dataDir/06-matchup-$satellite.$tableExt
 
 ### Snpp ###
 satellite=snpp
 matchupDir=$dataDir/matchups/$satellite
-python $scriptDir/10-merge-datarows.py --matchupDirectory $matchupDir --ofile $dataDir/06-matchup-$satellite.csv
+python $scriptDir/10-merge-datarows.py --matchupDirectory $matchupDir --ofile $dataDir/06-matchup-$satellite.$tableExt
 
 ### Jpss1 ###
 satellite=jpss1
 matchupDir=$dataDir/matchups/$satellite
-python $scriptDir/10-merge-datarows.py --matchupDirectory $matchupDir --ofile $dataDir/06-matchup-$satellite.csv
+python $scriptDir/10-merge-datarows.py --matchupDirectory $matchupDir --ofile $dataDir/06-matchup-$satellite.$tableExt
 
 ### Jpss2 ###
 satellite=jpss2
 matchupDir=$dataDir/matchups/$satellite
-python $scriptDir/10-merge-datarows.py --matchupDirectory $matchupDir --ofile $dataDir/06-matchup-$satellite.csv
+python $scriptDir/10-merge-datarows.py --matchupDirectory $matchupDir --ofile $dataDir/06-matchup-$satellite.$tableExt
 
 ####################################################################################
 ### Merge satellite-specific matchup dataframes into a single matchup dataframe: ###
 ####################################################################################
 
-python $scriptDir/11-merge-matchup-dfs.py --matchupDf1 $dataDir/06-matchup-seawifs.csv --matchupDf2 $dataDir/06-matchup-aqua.csv --matchupDf3 $dataDir/06-matchup-terra.csv --matchupDf4 $dataDir/06-matchup-snpp.csv --matchupDf5 $dataDir/06-matchup-jpss1.csv --matchupDf6 $dataDir/06-matchup-jpss2.csv  --datetimeField yyyy-mm-ddThh:mm:ss --ofile $dataDir/07-matchup-dataframe.csv
+python $scriptDir/11-merge-matchup-dfs.py --matchupDf1 $dataDir/06-matchup-seawifs.$tableExt --matchupDf2 $dataDir/06-matchup-aqua.$tableExt --matchupDf3 $dataDir/06-matchup-terra.$tableExt --matchupDf4 $dataDir/06-matchup-snpp.$tableExt --matchupDf5 $dataDir/06-matchup-jpss1.$tableExt --matchupDf6 $dataDir/06-matchup-jpss2.$tableExt  --datetimeField yyyy-mm-ddThh:mm:ss --ofile $dataDir/07-matchup-dataframe.csv
+
+# Report where the time of the run went:
+if [ -n "$MATCHUP_TELEMETRY" ]
+then python $scriptDir/12-report-telemetry.py --telemetryLog $MATCHUP_TELEMETRY --run $MATCHUP_RUN_ID --ofile $dataDir/12-telemetry-report.csv
+fi
+if [ -n "$MATCHUP_PROFILE" ]
+then python $scriptDir/12a-aggregate-profiles.py --profileDir $MATCHUP_PROFILE --ofileDir $MATCHUP_PROFILE/merged
+fi
@@ -0,0 +1,74 @@
+#!/bin/bash
+
+#PBS -N matchups-prepare
+#PBS -q route
+
+#PBS -l ncpus=4,mem=32gb
+#PBS -l walltime=24:00:00
+#PBS -o /mnt/storage/labs/mitchell/projects/matchup-workflow-data/publish-dev-data/logs
+#PBS -e /mnt/storage/labs/mitchell/projects/matchup-workflow-data/publish-dev-data/logs
+
+# Sharded alternative to 01-main-submission.sh for running satellite processing (06) and matchups (09) across the cluster.
+# This job runs the front half of the workflow (02-05, 08), splits the granules into $nshards balanced shards (06k-shard-workload.py),
+# then submits one PBS array job (01c-shard-array-job.sh) with one index per shard, and a gather job (01d-shard-gather.sh)
+# that runs once every array index has finished.
+
+# Load modules and environment
+module use /mod/bigelow
+module load anaconda3
+source activate ~/ocssw_env
+
+scriptDir=/mnt/storage/labs/mitchell/spinkham/gitHubRepos/matchup_workflow_dev
+dataDir=/mnt/storage/labs/mitchell/projects/matchup-workflow-data/publish-dev-data/temp
+# Format of the intermediate tables passed between the python stages (see table_support.py): csv, or parquet (typed, requires pyarrow,
+# which is not in the workflow environment: install it before switching).
+# Files read line by line by this script (09-pending-granlinks, shard lists) and the final matchup dataframe are always csv.
+tableExt=csv
+# Telemetry log of the timing and resources of every stage and step (see telemetry_support.py), reported by 12-report-telemetry.py
+# at the end of the run. Records are tagged with the run id. Comment out the export lines to disable.
+export MATCHUP_TELEMETRY=$dataDir/telemetry.jsonl
+export MATCHUP_RUN_ID=${PBS_JOBID:-$(date +%Y%m%dT%H%M%S)}
+# Run stages 02-05 in one python process (05a-run-stages-02-05.py), passing the tables between them in memory: 1, or 0 to run one script per stage.
+inProcess=1
+nshards=8
+
+
+if [ $inProcess -eq 1 ]
+then
+    # Stages 02-05 in one process. The station list and L2 granule links are still written for reference:
+    python $scriptDir/05a-run-stages-02-05.py --fieldFile $dataDir/01-pic-sample-field.csv --idField ID --datetimeField yyyy-mm-ddThh:mm:ss --latitudeField Latitude --longitudeField Longitude \
+    --sat modisa modist viirsn seawifs viirsj1 viirsj2 --data_type oc --max_time_diff 6 --verbose --includeGnatsCheck 1 \
+    --stationList $dataDir/02-seabass-station-list.sb --L2granlinksFile $dataDir/03-L2-granlinks.csv \
+    --L1aGranlinksFile $dataDir/04-L1a-granlinks.$tableExt --downloadUrlsFile $dataDir/05-download-urls.$tableExt
+else
+    # From the field data file, create a SeaBASS formatted station list containing time, location, and ID data:
+    python $scriptDir/02-seabass-station-list.py --fieldFile $dataDir/01-pic-sample-field.csv --idField ID --datetimeField yyyy-mm-ddThh:mm:ss --latitudeField Latitude --longitudeField Longitude --ofile $dataDir/02-seabass-station-list.sb
+
+    # Search the CMR data repository for L2 download urls that matchup the field data:
+    for sensor in modisa modist viirsn seawifs viirsj1 viirsj2
+    do
+        python $scriptDir/03-find-matchup.py --sat $sensor --seabass_file $dataDir/02-seabass-station-list.sb \
+        --output_file $dataDir/03-L2-granlinks.csv --data_type oc --max_time_diff 6 --verbose --includeGnatsCheck 1 --cache
+    done
+
+    # Edit the L2 urls to L1a urls and output the unique L1a granule list for downloading:
+    python $scriptDir/04-edit-L2-urls.py --L2granlinksFile $dataDir/03-L2-granlinks.csv --ofile $dataDir/04-L1a-granlinks.$tableExt
+    python $scriptDir/05-create-L1a-download-list.py --L1aGranlinksFile $dataDir/04-L1a-granlinks.$tableExt --ofile $dataDir/05-download-urls.$tableExt
+fi
+
+# Generate this run's par files from the product manifest:
+productManifest=$scriptDir/06g-product-manifest.txt
+python $scriptDir/06h-generate-par.py --defaultPar $scriptDir/06d-pardefaults-sst.par --productManifest $productManifest --ofile $dataDir/06-pardefaults-sst.par
+python $scriptDir/06h-generate-par.py --defaultPar $scriptDir/06e-pardefaults.par --productManifest $productManifest --ofile $dataDir/06-pardefaults.par
+
+# Break apart the field dataframe by field datarows that are matched to specific satellites:
+python $scriptDir/08-partition-field-by-satellite.py --fieldFile $dataDir/01-pic-sample-field.csv --idField ID --granlinksFile $dataDir/04-L1a-granlinks.$tableExt --ofile_base_name $dataDir/01-pic-sample-field --ofile_extension .$tableExt
+
+# Split the granules into shards balanced by expected download size and number of matchups:
+shardDir=$dataDir/shards
+python $scriptDir/06k-shard-workload.py --downloadUrlsFile $dataDir/05-download-urls.$tableExt --L1aGranlinksFile $dataDir/04-L1a-granlinks.$tableExt \
+--sensorCosts $scriptDir/06i-sensor-costs.csv --nshards $nshards --shardDir $shardDir
+
+# Submit the array job (one index per shard) and the gather job, which waits for every array index to finish:
+arrayJob=$(qsub -J 0-$(($nshards-1)) -v scriptDir=$scriptDir,dataDir=$dataDir,tableExt=$tableExt,shardDir=$shardDir,MATCHUP_TELEMETRY=$MATCHUP_TELEMETRY,MATCHUP_RUN_ID=$MATCHUP_RUN_ID $scriptDir/01c-shard-array-job.sh)
+qsub -W depend=afterok:$arrayJob -v scriptDir=$scriptDir,dataDir=$dataDir,tableExt=$tableExt,MATCHUP_TELEMETRY=$MATCHUP_TELEMETRY,MATCHUP_RUN_ID=$MATCHUP_RUN_ID $scriptDir/01d-shard-gather.sh
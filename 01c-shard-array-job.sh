@@ -0,0 +1,69 @@
+#!/bin/bash
+
+#PBS -N matchups-shard
+#PBS -q route
+
+#PBS -l ncpus=40,mem=512gb
+#PBS -l walltime=96:00:00
+#PBS -o /mnt/storage/labs/mitchell/projects/matchup-workflow-data/publish-dev-data/logs
+#PBS -e /mnt/storage/labs/mitchell/projects/matchup-workflow-data/publish-dev-data/logs
+
+# One index of the PBS array job submitted by 01b-shard-submission.sh.
+# Processes the granules of shard $PBS_ARRAY_INDEX to L2 (06), then outputs the matchup datarows of the same granules (09).
+# scriptDir, dataDir, shardDir, tableExt, and the telemetry log and run id are passed in by qsub -v.
+
+# Load modules and environment
+module use /mod/bigelow
+module load anaconda3
+source activate ~/ocssw_env
+
+shard=$PBS_ARRAY_INDEX
+# Each shard runs on its own node, so it writes its own telemetry log (reported together by the gather job):
+if [ -n "$MATCHUP_TELEMETRY" ]
+then export MATCHUP_TELEMETRY=${MATCHUP_TELEMETRY%.jsonl}-shard$shard.jsonl
+fi
+cookieFile=/home/spinkham/.urs_cookies
+satFileDir=$dataDir/satellite-files
+productManifest=$scriptDir/06g-product-manifest.txt
+# Run state database shared by every shard (see state_support.py), on the shared filesystem like the rest of the data directory:
+stateDb=$dataDir/run-state.db
+mkdir -p $satFileDir
+
+#############################
+### Satellite Processing ###
+############################
+ancCacheDir=$dataDir/ancillary-cache
+for satellite in aqua terra
+do
+    python $scriptDir/06f-prefetch-ancillary.py --downloadUrlsFile $shardDir/05-download-urls-shard$shard-$satellite.csv --satellite $satellite --ancCacheDir $ancCacheDir
+done
+
+# Granules recorded as done in the state database are skipped:
+python $scriptDir/06j-schedule-granules.py --downloadUrlsFile $shardDir/05-download-urls-shard$shard.csv --L1aGranlinksFile $shardDir/04-L1a-granlinks-shard$shard.csv \
+--sensorCosts $scriptDir/06i-sensor-costs.csv --scriptDir $scriptDir --satFileDir $satFileDir --parFile $dataDir/06-pardefaults.par \
+--parFileSST $dataDir/06-pardefaults-sst.par --cookieFile $cookieFile --ancCacheDir $ancCacheDir --ncpus 40 --mem 512 --stateDb $stateDb
+
+#########################################################################################################
+### Open Satellite L2 files, calculate pixel grid statistics, output field-satellite merged datarows: ###
+#########################################################################################################
+# The navigation of each L2 granule is decoded once into memory-mapped arrays shared by its matchups (see nav_cache_support.py).
+navCacheDir=$dataDir/nav-cache
+# Each shard writes its own excluded matchup log, which 01d-shard-gather.sh concatenates.
+# Matchups recorded as done in the state database are not listed as pending:
+for satellite in seawifs aqua terra snpp jpss1 jpss2
+do
+    matchupDir=$dataDir/matchups/$satellite
+    if [ ! -d $matchupDir ]
+    then mkdir -p $matchupDir
+    fi
+
+    python $scriptDir/09a-list-pending-matchups.py --granlinksFile $shardDir/04-L1a-granlinks-shard$shard-$satellite.csv --matchupDir $matchupDir --stateDb $stateDb --ofile $shardDir/09-pending-granlinks-shard$shard-$satellite.csv
+
+    while IFS=, read -r id granid url ; do
+        while [ $(jobs | wc -l) -ge 40 ] ; do
+            sleep 1s
+        done
+        python $scriptDir/09-matchup-datarows.py --id $id --granid $granid --fieldDf $dataDir/01-pic-sample-field-$satellite.$tableExt --matchupDir $matchupDir --satDir $satFileDir --ofile_excludedMatchupLog $matchupDir/x01-excluded-matchup-log-$satellite-shard$shard.txt --productManifest $productManifest --stateDb $stateDb --navCache $navCacheDir &
+    done < $shardDir/09-pending-granlinks-shard$shard-$satellite.csv
+    wait
+done
@@ -0,0 +1,40 @@
+#!/bin/bash
+
+#PBS -N matchups-gather
+#PBS -q route
+
+#PBS -l ncpus=4,mem=128gb
+#PBS -l walltime=48:00:00
+#PBS -o /mnt/storage/labs/mitchell/projects/matchup-workflow-data/publish-dev-data/logs
+#PBS -e /mnt/storage/labs/mitchell/projects/matchup-workflow-data/publish-dev-data/logs
+
+# Gather step of the sharded workflow, submitted by 01b-shard-submission.sh to run after every index of the array job.
+# Combines the per-shard results into the same outputs as 01-main-submission.sh.
+# scriptDir, dataDir, tableExt, and the telemetry log and run id are passed in by qsub -v.
+
+# Load modules and environment
+module use /mod/bigelow
+module load anaconda3
+source activate ~/ocssw_env
+
+### Report percentages of satellite files that successfully processed to L2: ###
+python $scriptDir/07-report-L2-percent-processed.py --downloadUrlsFile $dataDir/05-download-urls.$tableExt --satelliteFileDirectory $dataDir/satellite-files --stateDb $dataDir/run-state.db
+
+### Combine the per-shard excluded matchup logs and merge datarows into matchup dataframes per satellite: ###
+for satellite in seawifs aqua terra snpp jpss1 jpss2
+do
+    matchupDir=$dataDir/matchups/$satellite
+    if ls $matchupDir/x01-excluded-matchup-log-$satellite-shard*.txt 1> /dev/null 2>&1; then
+        # Appended, so the logs of earlier runs are kept; the shard logs are only removed once they are copied:
+        cat $matchupDir/x01-excluded-matchup-log-$satellite-shard*.txt >> $matchupDir/x01-excluded-matchup-log-$satellite.txt && rm $matchupDir/x01-excluded-matchup-log-$satellite-shard*.txt
+    fi
+    python $scriptDir/10-merge-datarows.py --matchupDirectory $matchupDir --ofile $dataDir/06-matchup-$satellite.$tableExt
+done
+
+### Merge satellite-specific matchup dataframes into a single matchup dataframe: ###
+python $scriptDir/11-merge-matchup-dfs.py --matchupDf1 $dataDir/06-matchup-seawifs.$tableExt --matchupDf2 $dataDir/06-matchup-aqua.$tableExt --matchupDf3 $dataDir/06-matchup-terra.$tableExt --matchupDf4 $dataDir/06-matchup-snpp.$tableExt --matchupDf5 $dataDir/06-matchup-jpss1.$tableExt --matchupDf6 $dataDir/06-matchup-jpss2.$tableExt  --datetimeField yyyy-mm-ddThh:mm:ss --ofile $dataDir/07-matchup-dataframe.csv
+
+# Report where the time of the run went, from the logs of the submission job and of every shard:
+if [ -n "$MATCHUP_TELEMETRY" ]
+then python $scriptDir/12-report-telemetry.py --telemetryLog $MATCHUP_TELEMETRY ${MATCHUP_TELEMETRY%.jsonl}-shard*.jsonl --run $MATCHUP_RUN_ID --ofile $dataDir/12-telemetry-report.csv
+fi
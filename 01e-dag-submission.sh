@@ -0,0 +1,36 @@
+#!/bin/bash
+
+#PBS -N matchups-dag
+#PBS -q route
+
+#PBS -l ncpus=40,mem=512gb
+#PBS -l walltime=96:00:00
+#PBS -o /mnt/storage/labs/mitchell/projects/matchup-workflow-data/publish-dev-data/logs
+#PBS -e /mnt/storage/labs/mitchell/projects/matchup-workflow-data/publish-dev-data/logs
+
+# Incremental alternative to 01-main-submission.sh. The same stages (02-11) are run by 01f-run-workflow-dag.py as a DAG:
+# a stage is only re-executed when its input files, parameters, or scripts changed since its last successful run,
+# so resubmitting after adding records to the field file does not redo the work of the unchanged stages.
+# Add --dryRun to list the stages that would be run, or --force <stage names | all> to re-execute stages.
+
+# Load modules and environment
+module use /mod/bigelow
+module load anaconda3
+source activate ~/ocssw_env
+
+scriptDir=/mnt/storage/labs/mitchell/spinkham/gitHubRepos/matchup_workflow_dev
+dataDir=/mnt/storage/labs/mitchell/projects/matchup-workflow-data/publish-dev-data/temp
+cookieFile=/home/spinkham/.urs_cookies
+# Telemetry log of the timing and resources of every stage and step (see telemetry_support.py), reported by 12-report-telemetry.py
+# at the end of the run. Records are tagged with the run id. Comment out the export lines to disable.
+export MATCHUP_TELEMETRY=$dataDir/telemetry.jsonl
+export MATCHUP_RUN_ID=${PBS_JOBID:-$(date +%Y%m%dT%H%M%S)}
+
+python $scriptDir/01f-run-workflow-dag.py --scriptDir $scriptDir --dataDir $dataDir --fieldFile $dataDir/01-pic-sample-field.csv --idField ID \
+--datetimeField yyyy-mm-ddThh:mm:ss --latitudeField Latitude --longitudeField Longitude --sensors modisa modist viirsn seawifs viirsj1 viirsj2 \
+--max_time_diff 6 --cookieFile $cookieFile --ncpus 40 --mem 512 --tableExt csv
+
+# Report where the time of the run went:
+if [ -n "$MATCHUP_TELEMETRY" ]
+then python $scriptDir/12-report-telemetry.py --telemetryLog $MATCHUP_TELEMETRY --run $MATCHUP_RUN_ID --ofile $dataDir/12-telemetry-report.csv
+fi
@@ -0,0 +1,221 @@
+## This script runs stages 02-11 of the matchup workflow as a DAG (see dag_support.py): each stage declares its inputs,
+## outputs, and parameters, and is only re-executed when they changed since its last successful run. It is submitted by
+## 01e-dag-submission.sh, and runs the same commands as 01-main-submission.sh.
+
+SATELLITES = ['seawifs','aqua','terra','snpp','jpss1','jpss2']
+
+def main():
+
+    import argparse
+    import os
+    import dag_support
+
+
+    parser = argparse.ArgumentParser(description='''\
+      This script runs the matchup workflow stages (02-11) in dependency order, skipping every stage whose input files \
+      (compared by content), parameters, and scripts are unchanged since its last successful run and whose outputs exist. \
+      The fingerprints of the stages are kept in workflow-dag-state.json in the data directory. Stages 06 and 09 also skip \
+      the granules and matchups recorded as done in the run state database, so adding records to the field file only \
+      processes the granules and matchups of the new records.''')
+
+    parser.add_argument('--scriptDir', nargs=1, type=str, required=True, help='''\
+    Full path of the directory containing the workflow scripts.''')
+
+    parser.add_argument('--dataDir', nargs=1, type=str, required=True, help='''\
+    Full path of the directory in which the workflow files are written.''')
+
+    parser.add_argument('--fieldFile', nargs=1, type=str, required=True, help='''\
+    Full path, filename, and extension of the field data file.''')
+
+    parser.add_argument('--idField', nargs=1, type=str, required=True, help='''\
+    Name of id field/column.''')
+
+    parser.add_argument('--datetimeField', nargs=1, type=str, required=True, help='''\
+    Name of datetime field/column.''')
+
+    parser.add_argument('--latitudeField', nargs=1, type=str, required=True, help='''\
+    Name of latitude field.''')
+
+    parser.add_argument('--longitudeField', nargs=1, type=str, required=True, help='''\
+    Name of longitude field.''')
+
+    parser.add_argument('--sensors', nargs='+', type=str, default=(['modisa','modist','viirsn','seawifs','viirsj1','viirsj2']), help='''\
+    OPTIONAL: Satellites searched in the CMR (03-find-matchup.py --sat). Default is modisa modist viirsn seawifs viirsj1 viirsj2.''')
+
+    parser.add_argument('--max_time_diff', nargs=1, type=float, default=([6]), help='''\
+    OPTIONAL: Time window of the CMR search in hours (03-find-matchup.py --max_time_diff). Default is 6.''')
+
+    parser.add_argument('--cookieFile', nargs=1, type=str, required=True, help='''\
+    Full path of the earthdata login cookies file.''')
+
+    parser.add_argument('--ncpus', nargs=1, type=int, default=([40]), help='''\
+    OPTIONAL: Number of cpus in the allocation. Default is 40.''')
+
+    parser.add_argument('--mem', nargs=1, type=float, default=([512]), help='''\
+    OPTIONAL: Memory of the allocation in gb. Default is 512.''')
+
+    parser.add_argument('--tableExt', nargs=1, type=str, default=(['csv']), choices=['parquet','csv'], help='''\
+    OPTIONAL: Format of the intermediate tables (see table_support.py). Default is csv. parquet requires pyarrow.''')
+
+    parser.add_argument('--force', nargs='+', type=str, default=([]), help='''\
+    OPTIONAL: Names of stages to re-execute even if up to date, or all.''')
+
+    parser.add_argument('--dryRun', default=False, action='store_true', help='''\
+    OPTIONAL: Only print the stages that would be run.''')
+
+    args=parser.parse_args()
+    dict_args=vars(args)
+
+    stages = workflow_stages(dict_args['scriptDir'][0], dict_args['dataDir'][0], dict_args['fieldFile'][0], dict_args['idField'][0], \
+                             dict_args['datetimeField'][0], dict_args['latitudeField'][0], dict_args['longitudeField'][0], dict_args['sensors'], \
+                             dict_args['max_time_diff'][0], dict_args['cookieFile'][0], dict_args['ncpus'][0], dict_args['mem'][0], dict_args['tableExt'][0])
+
+    unknown = [name for name in dict_args['force'] if name != 'all' and name not in [stage.name for stage in stages]]
+    if unknown:
+        parser.error('unknown stage(s) given to --force: ' + ', '.join(unknown) + '. Stages: ' + ', '.join(stage.name for stage in stages))
+
+    ran = dag_support.run_stages(stages, os.path.join(dict_args['dataDir'][0], 'workflow-dag-state.json'), dict_args['force'], dict_args['dryRun'])
+    print('Stages run: ', len(ran), ' of ', len(stages))
+
+
+def workflow_stages(scriptDir, dataDir, field_fp, idField, datetimeField, latitudeField, longitudeField, sensors, max_time_diff, cookieFile, ncpus, mem, tableExt):
+    ''' Declare the workflow stages, with the same files and commands as 01-main-submission.sh. Every stage's scripts are among
+    its inputs, so editing a script re-executes its stage. '''
+    import os
+    from dag_support import Stage
+
+    py = 'python'
+    script = lambda fn: os.path.join(scriptDir, fn)
+    data = lambda fn: os.path.join(dataDir, fn)
+    sat_files = lambda base: [data(base + '-' + satellite + '.' + tableExt) for satellite in SATELLITES]
+
+    station_list = data('02-seabass-station-list.sb')
+    L2granlinks = data('03-L2-granlinks.csv')
+    L1agranlinks = data('04-L1a-granlinks.' + tableExt)
+    download_urls = data('05-download-urls.' + tableExt)
+    productManifest = script('06g-product-manifest.txt')
+    parFile, parFileSST = data('06-pardefaults.par'), data('06-pardefaults-sst.par')
+    ancCacheDir = data('ancillary-cache')
+    satFileDir = data('satellite-files')
+    stateDb = data('run-state.db')
+    navCacheDir = data('nav-cache')
+    field_base = os.path.splitext(field_fp)[0]
+
+    stages = []
+
+    stages.append(Stage('02-station-list', [[py, script('02-seabass-station-list.py'), '--fieldFile', field_fp, '--idField', idField, '--datetimeField', datetimeField, \
+                                             '--latitudeField', latitudeField, '--longitudeField', longitudeField, '--ofile', station_list]],
+                        inputs=[field_fp, script('02-seabass-station-list.py'), script('SB_support.py')], outputs=[station_list],
+                        params={'idField':idField, 'datetimeField':datetimeField, 'latitudeField':latitudeField, 'longitudeField':longitudeField}))
+
+    # 03 appends to its output file, so the file is emptied before searching the satellites:
+    def find_matchup(stage):
+        import dag_support
+        open(L2granlinks, 'w').close()
+        dag_support.run_commands([[py, script('03-find-matchup.py'), '--sat', sensor, '--seabass_file', station_list, '--output_file', L2granlinks, '--data_type', 'oc', \
+                                   '--max_time_diff', max_time_diff, '--verbose', '--includeGnatsCheck', 1, '--cache'] for sensor in sensors])
+    stages.append(Stage('03-find-matchup', find_matchup,
+                        inputs=[station_list, script('03-find-matchup.py'), script('SB_support.py')], outputs=[L2granlinks],
+                        params={'sensors':sensors, 'max_time_diff':max_time_diff, 'data_type':'oc', 'includeGnatsCheck':1}))
+
+    stages.append(Stage('04-edit-L2-urls', [[py, script('04-edit-L2-urls.py'), '--L2granlinksFile', L2granlinks, '--ofile', L1agranlinks]],
+                        inputs=[L2granlinks, script('04-edit-L2-urls.py'), script('table_support.py')], outputs=[L1agranlinks] + sat_files('04-L1a-granlinks')))
+
+    stages.append(Stage('05-download-list', [[py, script('05-create-L1a-download-list.py'), '--L1aGranlinksFile', L1agranlinks, '--ofile', download_urls]],
+                        inputs=[L1agranlinks, script('05-create-L1a-download-list.py'), script('table_support.py')], outputs=[download_urls] + sat_files('05-download-urls')))
+
+    stages.append(Stage('06h-generate-par', [[py, script('06h-generate-par.py'), '--defaultPar', script('06d-pardefaults-sst.par'), '--productManifest', productManifest, '--ofile', parFileSST],
+                                             [py, script('06h-generate-par.py'), '--defaultPar', script('06e-pardefaults.par'), '--productManifest', productManifest, '--ofile', parFile]],
+                        inputs=[script('06d-pardefaults-sst.par'), script('06e-pardefaults.par'), productManifest, script('06h-generate-par.py'), script('product_support.py')], outputs=[parFileSST, parFile]))
+
+    stages.append(Stage('06f-prefetch-ancillary', [[py, script('06f-prefetch-ancillary.py'), '--downloadUrlsFile', data('05-download-urls-' + satellite + '.' + tableExt), \
+                                                    '--satellite', satellite, '--ancCacheDir', ancCacheDir] for satellite in ['aqua','terra']],
+                        inputs=[data('05-download-urls-aqua.' + tableExt), data('05-download-urls-terra.' + tableExt), script('06f-prefetch-ancillary.py'), script('table_support.py')], outputs=[ancCacheDir]))
+
+    def schedule_granules(stage):
+        import dag_support
+        os.makedirs(satFileDir, exist_ok=True)
+        dag_support.run_commands([[py, script('06j-schedule-granules.py'), '--downloadUrlsFile', download_urls, '--L1aGranlinksFile', L1agranlinks, \
+                                   '--sensorCosts', script('06i-sensor-costs.csv'), '--scriptDir', scriptDir, '--satFileDir', satFileDir, '--parFile', parFile, \
+                                   '--parFileSST', parFileSST, '--cookieFile', cookieFile, '--ancCacheDir', ancCacheDir, '--ncpus', ncpus, '--mem', mem, '--stateDb', stateDb]])
+    stages.append(Stage('06j-schedule-granules', schedule_granules,
+                        inputs=[download_urls] + sat_files('05-download-urls') + [L1agranlinks, script('06i-sensor-costs.csv'), parFile, parFileSST, ancCacheDir, \
+                                script('06j-schedule-granules.py'), script('06a-seawifs-workflow.sh'), script('06b-modis-workflow.sh'), script('06c-viirs-workflow.sh'), \
+                                script('table_support.py'), script('state_support.py'), script('workflow_support.py')],
+                        outputs=[satFileDir], params={'ncpus':ncpus, 'mem':mem}))
+
+    stages.append(Stage('07-report', [[py, script('07-report-L2-percent-processed.py'), '--downloadUrlsFile', download_urls, '--satelliteFileDirectory', satFileDir, '--stateDb', stateDb]],
+                        inputs=[download_urls, satFileDir, script('07-report-L2-percent-processed.py'), script('table_support.py'), script('state_support.py')]))
+
+    stages.append(Stage('08-partition-field', [[py, script('08-partition-field-by-satellite.py'), '--fieldFile', field_fp, '--idField', idField, '--granlinksFile', L1agranlinks, \
+                                                '--ofile_base_name', field_base, '--ofile_extension', '.' + tableExt]],
+                        inputs=[field_fp, L1agranlinks, script('08-partition-field-by-satellite.py'), script('table_support.py')], outputs=[field_base + '-' + satellite + '.' + tableExt for satellite in SATELLITES], params={'idField':idField}))
+
+    for satellite in SATELLITES:
+        matchupDir = data(os.path.join('matchups', satellite))
+        granlinks_fp = data('04-L1a-granlinks-' + satellite + '.' + tableExt)
+        fieldDf = field_base + '-' + satellite + '.' + tableExt
+
+        stages.append(Stage('09-matchups-' + satellite, matchup_action(scriptDir, dataDir, satellite, granlinks_fp, fieldDf, matchupDir, satFileDir, productManifest, stateDb, navCacheDir, ncpus),
+                            inputs=[granlinks_fp, fieldDf, satFileDir, productManifest, script('09-matchup-datarows.py'), script('nav_cache_support.py'), script('09a-list-pending-matchups.py'), \
+                                    script('table_support.py'), script('product_support.py'), script('state_support.py')], outputs=[matchupDir]))
+
+        stages.append(Stage('10-merge-' + satellite, [[py, script('10-merge-datarows.py'), '--matchupDirectory', matchupDir, '--ofile', data('06-matchup-' + satellite + '.' + tableExt)]],
+                            inputs=[matchupDir, script('10-merge-datarows.py'), script('table_support.py'), script('flag_support.py')], outputs=[data('06-matchup-' + satellite + '.' + tableExt)]))
+
+    matchup_dfs = [data('06-matchup-' + satellite + '.' + tableExt) for satellite in SATELLITES]
+    stages.append(Stage('11-merge-matchup-dfs', [[py, script('11-merge-matchup-dfs.py')] + [arg for i,fp in enumerate(matchup_dfs) for arg in ['--matchupDf' + str(i+1), fp]] + \
+                                                 ['--datetimeField', datetimeField, '--ofile', data('07-matchup-dataframe.csv')]],
+                        inputs=matchup_dfs + [script('11-merge-matchup-dfs.py'), script('table_support.py')], outputs=[data('07-matchup-dataframe.csv')], params={'datetimeField':datetimeField}))
+
+    return stages
+
+def matchup_action(scriptDir, dataDir, satellite, granlinks_fp, fieldDf, matchupDir, satFileDir, productManifest, stateDb, navCacheDir, ncpus):
+    ''' Action of the matchup stage of a satellite: list the pending matchups (09a-list-pending-matchups.py), then run
+    09-matchup-datarows.py for each, ncpus at a time, as the matchup loops of 01-main-submission.sh do. Raises RuntimeError if
+    any 09 process fails (excluded matchups exit normally), so the stage is not recorded as up to date and is run again. '''
+    def action(stage):
+        import os
+        import subprocess
+        import time
+        import dag_support
+        from table_support import read_table
+
+        os.makedirs(matchupDir, exist_ok=True)
+        pending_fp = os.path.join(dataDir, '09-pending-granlinks-' + satellite + '.csv')
+        dag_support.run_commands([['python', os.path.join(scriptDir, '09a-list-pending-matchups.py'), '--granlinksFile', granlinks_fp, '--matchupDir', matchupDir, \
+                                   '--stateDb', stateDb, '--ofile', pending_fp]])
+
+        running = []
+        failed = []
+
+        def reap(running):
+            # Keep the processes still running, recording the exit status of those that failed:
+            still_running = []
+            for row, proc in running:
+                if proc.poll() is None:
+                    still_running.append((row, proc))
+                elif proc.returncode != 0:
+                    failed.append((row, proc.returncode))
+            return still_running
+
+        for row in read_table(pending_fp, 'L1a-granlinks').itertuples(index=False):
+            while len(running) >= ncpus:
+                running = reap(running)
+                time.sleep(1)
+            running.append((row, subprocess.Popen(['python', os.path.join(scriptDir, '09-matchup-datarows.py'), '--id', str(row.station), '--granid', row.granid, \
+                                             '--fieldDf', fieldDf, '--matchupDir', matchupDir, '--satDir', satFileDir, \
+                                             '--ofile_excludedMatchupLog', os.path.join(matchupDir, 'x01-excluded-matchup-log-' + satellite + '.txt'), \
+                                             '--productManifest', productManifest, '--stateDb', stateDb, '--navCache', navCacheDir])))
+        for row, proc in running:
+            proc.wait()
+        reap(running)
+
+        if failed:
+            raise RuntimeError(str(len(failed)) + ' matchup process(es) of ' + satellite + ' failed, e.g. ' + \
+                               ', '.join(str(row.station) + '/' + row.granid + ' (exit status ' + str(returncode) + ')' for row, returncode in failed[0:5]))
+    return action
+
+if __name__ == "__main__":
+    import telemetry_support
+    telemetry_support.run_main(main)
@@ -0,0 +1,114 @@
+#!/bin/bash
+
+#PBS -N matchups-delta
+#PBS -q route
+
+#PBS -l ncpus=40,mem=512gb
+#PBS -l walltime=96:00:00
+#PBS -o /mnt/storage/labs/mitchell/projects/matchup-workflow-data/publish-dev-data/logs
+#PBS -e /mnt/storage/labs/mitchell/projects/matchup-workflow-data/publish-dev-data/logs
+
+# Delta alternative to 01-main-submission.sh, for updating a previous run after records were added to (or changed in) the field file.
+# The stations of the field file are compared by id and content hash to those of the previous run (02a-field-delta.py), and the CMR
+# search and download list stages (02-05) run on the new and changed stations only. Their granule links are merged into those of the
+# previous run (05b-merge-delta.py), which also removes the outputs invalidated by changed stations. Satellite processing (06) and
+# matchups (09) then only run for granules and matchups not already done, and the matchup dataframes are merged incrementally (10).
+# The first delta run (no station hashes file yet) processes every station, like 01-main-submission.sh.
+
+# Load modules and environment
+module use /mod/bigelow
+module load anaconda3
+source activate ~/ocssw_env
+
+scriptDir=/mnt/storage/labs/mitchell/spinkham/gitHubRepos/matchup_workflow_dev
+dataDir=/mnt/storage/labs/mitchell/projects/matchup-workflow-data/publish-dev-data/temp
+# Format of the intermediate tables passed between the python stages (see table_support.py): csv, or parquet (typed, requires pyarrow,
+# which is not in the workflow environment: install it before switching).
+tableExt=csv
+# Telemetry log of the timing and resources of every stage and step (see telemetry_support.py), reported by 12-report-telemetry.py
+# at the end of the run. Records are tagged with the run id. Comment out the export lines to disable.
+export MATCHUP_TELEMETRY=$dataDir/telemetry.jsonl
+export MATCHUP_RUN_ID=${PBS_JOBID:-$(date +%Y%m%dT%H%M%S)}
+cookieFile=/home/spinkham/.urs_cookies
+satFileDir=$dataDir/satellite-files
+productManifest=$scriptDir/06g-product-manifest.txt
+stateDb=$dataDir/run-state.db
+mkdir -p $satFileDir
+
+# Stop at the first failing step: the station hashes of the run are only promoted (at the end) when every step succeeded, as the
+# stations they mark as processed are not searched again by the next delta run.
+set -e
+
+### Find the new and changed stations: ###
+python $scriptDir/02a-field-delta.py --fieldFile $dataDir/01-pic-sample-field.csv --idField ID --stationHashes $dataDir/02-station-hashes.$tableExt \
+--ofile $dataDir/02-field-delta.csv --ofile_hashes $dataDir/02-station-hashes-new.$tableExt
+
+### CMR search and L1a granule links of the new and changed stations only: ###
+# The delta outputs of the previous delta run are removed first, so they can never be merged in place of those of this run:
+rm -f $dataDir/04-L1a-granlinks-delta*.$tableExt $dataDir/05-download-urls-delta*.$tableExt
+python $scriptDir/05a-run-stages-02-05.py --fieldFile $dataDir/02-field-delta.csv --idField ID --datetimeField yyyy-mm-ddThh:mm:ss --latitudeField Latitude --longitudeField Longitude \
+--sat modisa modist viirsn seawifs viirsj1 viirsj2 --data_type oc --max_time_diff 6 --verbose --includeGnatsCheck 1 \
+--L1aGranlinksFile $dataDir/04-L1a-granlinks-delta.$tableExt --downloadUrlsFile $dataDir/05-download-urls-delta.$tableExt
+
+### Merge them into the granule links and download list of the previous run: ###
+python $scriptDir/05b-merge-delta.py --L1aGranlinksFile $dataDir/04-L1a-granlinks.$tableExt --L1aGranlinksDelta $dataDir/04-L1a-granlinks-delta.$tableExt \
+--downloadUrlsFile $dataDir/05-download-urls.$tableExt --stationHashes $dataDir/02-station-hashes.$tableExt --newStationHashes $dataDir/02-station-hashes-new.$tableExt \
+--matchupDir $dataDir/matchups --satFileDir $satFileDir --stateDb $stateDb
+
+#############################
+### Satellite Processing ###
+############################
+python $scriptDir/06h-generate-par.py --defaultPar $scriptDir/06d-pardefaults-sst.par --productManifest $productManifest --ofile $dataDir/06-pardefaults-sst.par
+python $scriptDir/06h-generate-par.py --defaultPar $scriptDir/06e-pardefaults.par --productManifest $productManifest --ofile $dataDir/06-pardefaults.par
+
+ancCacheDir=$dataDir/ancillary-cache
+for satellite in aqua terra
+do
+    python $scriptDir/06f-prefetch-ancillary.py --downloadUrlsFile $dataDir/05-download-urls-$satellite.$tableExt --satellite $satellite --ancCacheDir $ancCacheDir
+done
+
+# Granules recorded as done in the state database are skipped:
+python $scriptDir/06j-schedule-granules.py --downloadUrlsFile $dataDir/05-download-urls.$tableExt --L1aGranlinksFile $dataDir/04-L1a-granlinks.$tableExt \
+--sensorCosts $scriptDir/06i-sensor-costs.csv --scriptDir $scriptDir --satFileDir $satFileDir --parFile $dataDir/06-pardefaults.par \
+--parFileSST $dataDir/06-pardefaults-sst.par --cookieFile $cookieFile --ancCacheDir $ancCacheDir --ncpus 40 --mem 512 --stateDb $stateDb
+
+python $scriptDir/07-report-L2-percent-processed.py --downloadUrlsFile $dataDir/05-download-urls.$tableExt --satelliteFileDirectory $satFileDir --stateDb $stateDb
+
+#########################################################################################################
+### Open Satellite L2 files, calculate pixel grid statistics, output field-satellite merged datarows: ###
+#########################################################################################################
+python $scriptDir/08-partition-field-by-satellite.py --fieldFile $dataDir/01-pic-sample-field.csv --idField ID --granlinksFile $dataDir/04-L1a-granlinks.$tableExt --ofile_base_name $dataDir/01-pic-sample-field --ofile_extension .$tableExt
+
+# The navigation of each L2 granule is decoded once into memory-mapped arrays shared by its matchups (see nav_cache_support.py).
+navCacheDir=$dataDir/nav-cache
+# Matchups recorded as done in the state database are not listed as pending:
+for satellite in seawifs aqua terra snpp jpss1 jpss2
+do
+    matchupDir=$dataDir/matchups/$satellite
+    if [ ! -d $matchupDir ]
+    then mkdir -p $matchupDir
+    fi
+
+    python $scriptDir/09a-list-pending-matchups.py --granlinksFile $dataDir/04-L1a-granlinks-$satellite.$tableExt --matchupDir $matchupDir --stateDb $stateDb --ofile $dataDir/09-pending-granlinks-$satellite.csv
+
+    while IFS=, read -r id granid url ; do
+        while [ $(jobs | wc -l) -ge 40 ] ; do
+            sleep 1s
+        done
+        python $scriptDir/09-matchup-datarows.py --id $id --granid $granid --fieldDf $dataDir/01-pic-sample-field-$satellite.$tableExt --matchupDir $matchupDir --satDir $satFileDir --ofile_excludedMatchupLog $matchupDir/x01-excluded-matchup-log-$satellite.txt --productManifest $productManifest --stateDb $stateDb --navCache $navCacheDir &
+    done < $dataDir/09-pending-granlinks-$satellite.csv
+    wait
+
+    # Only the datarows written since the previous matchup dataframe (or removed by 05b-merge-delta.py) are merged:
+    python $scriptDir/10-merge-datarows.py --matchupDirectory $matchupDir --ofile $dataDir/06-matchup-$satellite.$tableExt --incremental
+done
+
+python $scriptDir/11-merge-matchup-dfs.py --matchupDf1 $dataDir/06-matchup-seawifs.$tableExt --matchupDf2 $dataDir/06-matchup-aqua.$tableExt --matchupDf3 $dataDir/06-matchup-terra.$tableExt --matchupDf4 $dataDir/06-matchup-snpp.$tableExt --matchupDf5 $dataDir/06-matchup-jpss1.$tableExt --matchupDf6 $dataDir/06-matchup-jpss2.$tableExt  --datetimeField yyyy-mm-ddThh:mm:ss --ofile $dataDir/07-matchup-dataframe.csv
+
+# The delta run is complete (every step succeeded): its station hashes become those of the previous run for the next delta run.
+mv $dataDir/02-station-hashes-new.$tableExt $dataDir/02-station-hashes.$tableExt
+
+# Report where the time of the run went:
+if [ -n "$MATCHUP_TELEMETRY" ]
+then python $scriptDir/12-report-telemetry.py --telemetryLog $MATCHUP_TELEMETRY --run $MATCHUP_RUN_ID --ofile $dataDir/12-telemetry-report.csv
+fi
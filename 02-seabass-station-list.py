@@ -1,6 +1,7 @@
+DATETIME_FORMATS = ['%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f']
+
 def main():
     
-    import pandas as pd
     import argparse
     
     parser = argparse.ArgumentParser(description='''\
@@ -13,7 +14,10 @@ def main():
     Name of id field/column.''')
     
     parser.add_argument('--datetimeField', nargs=1, type=str, required=True, help='''\
-    Name of datetime field/column. Note that this script works on datetime strings formatted as yyyy-mm-ddThh:mm:ss.  If the datetimes are formatted otherwise, the splitDatetime function included in this script will need to be modified.''')
+    Name of datetime field/column. Note that this script works on datetime strings formatted as yyyy-mm-ddThh:mm:ss or yyyy-mm-dd hh:mm:ss, with or without fractional seconds, by default.  If the datetimes are formatted otherwise, give their format(s) with --datetimeFormat.''')
+    
+    parser.add_argument('--datetimeFormat', nargs='+', type=str, default=(DATETIME_FORMATS), help='''\
+    OPTIONAL: One or more strftime formats of the datetime strings (e.g. %%m/%%d/%%Y %%H:%%M), tried in order for each datetime. Default is the ISO formats: ''' + ' '.join(DATETIME_FORMATS).replace('%','%%') + '''.''')
     
     parser.add_argument('--latitudeField', nargs=1, type=str, required=True, help='''\
     Name of latitude field. Note that the latitudes must be given in decimal degrees.''')
@@ -24,6 +28,12 @@ def main():
     parser.add_argument('--ofile', nargs=1, type=str, required=True, help='''\
     Full path including file name with.sb extension for where to write the seabass formatted station list.''')
     
+    parser.add_argument('--chunksize', nargs=1, type=int, default=([500000]), help='''\
+    OPTIONAL: Number of field file rows read, converted, and appended to the station list at a time. Only the id, datetime, latitude, and longitude columns are read, so memory use is bounded by the chunk size however large the field file is. Default is 500000.''')
+    
+    parser.add_argument('--dedupTolerance', nargs=2, type=float, required=False, help='''\
+    OPTIONAL: Position tolerance (decimal degrees) and time tolerance (seconds). If given, stations falling in the same cell of a grid of this resolution in latitude, longitude, and time are deduplicated: only the first station of each cell is written to the station list, reducing the number of CMR queries. The other stations are written, with the station they duplicate, to the duplicates file (--ofile with a -duplicates.csv suffix), which 04-edit-L2-urls.py uses to give them the same granule links.''')
+    
     
     args = parser.parse_args()
     dict_args = vars(args)
@@ -36,63 +46,147 @@ def main():
     longitude = dict_args['longitudeField'][0]
     ofile_fn = dict_args['ofile'][0]
     
-    # Read In Data:
-    field = pd.read_csv(field_fn)
-    
-    # Split the datetime column into six datetime components: year, month, day, hour, minute, second.
-    # Note that the splitDatetime function may need to be edited depending on the format of the datetimes in the field dataframe. The default function is based on datetime strings formatted as: 'yyyy-mm-ddThh:mm:ss'.
-    seabassDf = pd.DataFrame(splitDatetime(field[datetime]), columns=['year','month','day','hour','min','sec'])
-    
-    # Insert Latitude and Longitude columns into the seabass dataframe:
-    seabassDf['ID'] = field[data_id]
-    seabassDf['lon'] = field[longitude]
-    seabassDf['lat'] = field[latitude]
-    
-    # Write SeaBASS station list to csv file with seabass formatted header:
-    with open(ofile_fn,'w') as file:
-        file.write('/begin_header\n')
-        file.write('/delimiter=comma\n')
-        file.write('/missing=NaN\n')
-        file.write('/fields=year,month,day,hour,minute,second,station,lon,lat\n')
-        file.write('/end_header\n')
-        seabassDf.to_csv(file, header=None, index=None, sep=',', mode='a')
+    if dict_args['chunksize'][0] < 1:
+        parser.error('--chunksize must be at least 1. Received --chunksize = ' + str(dict_args['chunksize'][0]))
+    
+    # Write the SeaBASS formatted header, then convert and append the field data chunk by chunk.
+    # Whole columns are formatted at once, and missing values are written as NaN:
+    writeStationList(ofile_fn)
+    
+    dedup = dict_args['dedupTolerance']
+    if dedup:
+        duplicates_fn = ofile_fn[0:-3] + '-duplicates.csv'
+        open(duplicates_fn, 'w').close()
+    
+    nrows, nwritten = 0, 0
+    try:
+        for seabassDf, duplicates, chunk_rows in stationListChunks(field_fn, data_id, datetime, latitude, longitude, dict_args['datetimeFormat'], \
+                                                                    dict_args['chunksize'][0], dedup):
+            writeStationList(ofile_fn, seabassDf)
+            if dedup:
+                duplicates.to_csv(duplicates_fn, mode='a', index=False, header=False)
+            nrows += chunk_rows
+            nwritten += len(seabassDf)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    print('Stations written: ', nwritten, ' of ', nrows)
+
+def stationListChunks(field_fn, data_id, datetime, latitude, longitude, datetimeFormats=None, chunksize=500000, dedupTolerance=None):
+    ''' Read the field data file chunk by chunk and convert it to station list rows. For each chunk, yields the station list
+    dataframe (columns year, month, day, hour, min, sec, ID, lon, lat; sec includes any fractional seconds), the dataframe of
+    stations deduplicated from the chunk (columns station, kept_station; empty unless dedupTolerance, a (position tolerance in
+    decimal degrees, time tolerance in seconds) pair, is given), and the number of field rows in the chunk.
+    Raises ValueError listing the datetimes that match none of the datetime formats. '''
+    import pandas as pd
+    
+    kept_stations = {}
+    for field in pd.read_csv(field_fn, usecols=[data_id, datetime, latitude, longitude], chunksize=chunksize):
+    
+        # Split the datetime column into six datetime components: year, month, day, hour, minute, second.
+        # All datetimes of the chunk are parsed at once; rows that match none of the datetime formats are reported together.
+        dateTime, microsecond = splitDatetime(field[datetime], datetimeFormats, return_microsecond=True)
+        seabassDf = pd.DataFrame(dateTime, columns=['year','month','day','hour','min','sec'])
+        if microsecond.any():
+            seabassDf['sec'] = seabassDf['sec'] + microsecond/1000000
+        
+        # Insert Latitude and Longitude columns into the seabass dataframe:
+        seabassDf['ID'] = field[data_id].to_numpy()
+        seabassDf['lon'] = field[longitude].to_numpy()
+        seabassDf['lat'] = field[latitude].to_numpy()
+        
+        duplicates = pd.DataFrame({'station':[], 'kept_station':[]})
+        if dedupTolerance:
+            seabassDf, duplicates = deduplicateStations(seabassDf, microsecond, dedupTolerance[0], dedupTolerance[1], kept_stations)
+        
+        yield seabassDf, duplicates, len(field)
+
+def writeStationList(ofile_fn, seabassDf=None):
+    ''' Write the SeaBASS formatted header of the station list, or, if given the station list dataframe of a chunk, append its rows. '''
+    from collections import OrderedDict
+    from SB_support import writeSB
+    
+    headers = OrderedDict([('delimiter','comma'), ('missing','NaN'), ('fields','year,month,day,hour,minute,second,station,lon,lat')])
+    columns = ['year','month','day','hour','min','sec','ID','lon','lat']
+    
+    if seabassDf is None:
+        writeSB(ofile_fn, headers, [], OrderedDict((field_name, []) for field_name in headers['fields'].split(',')))
+    else:
+        data = OrderedDict((field_name, seabassDf[column].to_numpy()) for field_name,column in zip(headers['fields'].split(','), columns))
+        writeSB(ofile_fn, headers, [], data, append=True)
+        
+def deduplicateStations(seabassDf, microsecond, positionTolerance, timeTolerance, kept_stations):
+    ''' Drop the stations of a chunk that fall in the same latitude, longitude, and time grid cell as an earlier station
+    (of this chunk or of a previous chunk, as recorded in kept_stations: grid cell -> station). Returns the remaining
+    stations, and the dropped stations with the stations they duplicate. '''
+    import numpy as np
+    import pandas as pd
+    
+    seconds = pd.to_datetime(seabassDf[['year','month','day','hour','min','sec']].astype(int).rename(columns={'min':'minute','sec':'second'}))
+    seconds = (seconds - pd.Timestamp(0)).dt.total_seconds().to_numpy() + microsecond/1000000
+    
+    cells = pd.Series(list(zip(np.floor(seabassDf['lat'].to_numpy()/positionTolerance), \
+                               np.floor(seabassDf['lon'].to_numpy()/positionTolerance), \
+                               np.floor(seconds/timeTolerance))), index=seabassDf.index)
+    
+    # The first station of each new cell is kept:
+    first = ~cells.duplicated() & ~cells.isin(kept_stations.keys())
+    kept_stations.update(zip(cells[first], seabassDf.loc[first, 'ID']))
+    
+    duplicates = pd.DataFrame({'station':seabassDf.loc[~first, 'ID'], 'kept_station':cells[~first].map(kept_stations)})
+    
+    return seabassDf.loc[first], duplicates
         
-def splitDatetime(datetimeArray):
+def splitDatetime(datetimeArray, datetimeFormats=None, return_microsecond=False):
     ''' splitting Bruce's database output date-time string into
     individual parts
     INPUT: datetimeArray = either a single value or an array/list of
                         strings output from Bruce's database
                         i.e. in the format: yyyy-mm-ddThh:mm:ss
+           datetimeFormats = OPTIONAL list of strftime formats, tried in order
+                        for each string (default DATETIME_FORMATS: ISO with
+                        'T' or a space, with or without fractional seconds)
+           return_microsecond = OPTIONAL flag to also return the fractional
+                        seconds, in microseconds
     OUTPUT: N x 6 array, where N is the number of date-time strings
             and the columns are years, months, days, hours, minutes
-            and seconds respectively.'''
+            and seconds respectively (and, if requested, an N array of
+            microseconds). A single string returns a 6 element array.
+            Raises ValueError listing all strings that match none of the
+            formats.'''
     import numpy as np
-    import re
-    
-    if type(datetimeArray) != str:
-        dates = np.empty((len(datetimeArray),3),dtype=int)
-        times = np.empty((len(datetimeArray),3),dtype=int)
-        for ix,dts in enumerate(datetimeArray): 
-            dateSplit = re.split('-',dts)
-            dateSplit[2] = dateSplit[2][0:2]
-            timeSplit = re.split(':',dts)
-            timeSplit[0] = timeSplit[0][-2:]
-            
-            dateSplit = np.asarray([int(d) for d in dateSplit])
-            dates[ix,:] =  dateSplit
-            timeSplit = np.asarray([int(t) for t in timeSplit])
-            times[ix,:] =  timeSplit
-    else:
-        dateSplit = re.split('-',datetimeArray)
-        dateSplit[2] = dateSplit[2][0:2]
-        timeSplit = re.split(':',datetimeArray)
-        timeSplit[0] = timeSplit[0][-2:]
-        
-        dates = np.asarray([int(d) for d in dateSplit])
-        times = np.asarray([int(t) for t in timeSplit])
-        
-    dateTime = np.concatenate((dates,times),axis=1)
+    import pandas as pd
+    
+    if datetimeFormats is None:
+        datetimeFormats = DATETIME_FORMATS
+    
+    single = type(datetimeArray) == str
+    strings = pd.Series([datetimeArray] if single else datetimeArray, dtype=object).astype(str).str.strip()
+    
+    # Parse the whole column with each format in turn, only retrying the strings not parsed yet:
+    parsed = pd.Series(pd.NaT, index=strings.index, dtype='datetime64[ns]')
+    for datetimeFormat in datetimeFormats:
+        todo = parsed.isna()
+        if not todo.any():
+            break
+        parsed[todo] = pd.to_datetime(strings[todo], format=datetimeFormat, errors='coerce')
+    
+    bad = parsed.isna().to_numpy()
+    if bad.any():
+        rows = np.flatnonzero(bad)
+        raise ValueError('{:d} datetime(s) match none of the datetime formats ({:}). Rows (from 0): {:}'.format(len(rows), ', '.join(datetimeFormats), \
+                         ', '.join(str(strings.index[row]) + ': ' + repr(strings.iloc[row]) for row in rows[0:20]) + (', ...' if len(rows) > 20 else '')))
+    
+    dateTime = np.column_stack([parsed.dt.year, parsed.dt.month, parsed.dt.day, parsed.dt.hour, parsed.dt.minute, parsed.dt.second]).astype(int)
+    microsecond = parsed.dt.microsecond.to_numpy().astype(int)
+    
+    if single:
+        dateTime, microsecond = dateTime[0], microsecond[0]
     
+    if return_microsecond:
+        return dateTime, microsecond
     return dateTime
 
-if __name__ == "__main__": main()
\ No newline at end of file
+if __name__ == "__main__":
+    import telemetry_support
+    telemetry_support.run_main(main)
@@ -0,0 +1,81 @@
+## This script finds the stations of the field data file that are new or changed since the previous run, for the delta mode
+## (01g-delta-submission.sh). Each station's field data is hashed, and the hashes are compared by station id to those recorded
+## by the previous run. Only the rows of the new and changed stations are written to the delta field file, which is run through
+## the CMR search and download list stages (02-05) in place of the whole field file.
+
+def main():
+
+    import argparse
+    import os
+    from table_support import read_table, write_table
+
+
+    parser = argparse.ArgumentParser(description='''\
+      This script writes the rows of the field data file whose station is new, or whose field data changed, since the previous \
+      run (according to the station hashes file of that run), and the station hashes of the current field data file. The \
+      stations of the previous run left out of the current field file are reported as removed.''')
+
+    parser.add_argument('--fieldFile', nargs=1, type=str, required=True, help='''\
+    Full path, name, and extension of the field data file, which must contain an id field.''')
+
+    parser.add_argument('--idField', nargs=1, type=str, required=True, help='''\
+    Name of id field/column.''')
+
+    parser.add_argument('--stationHashes', nargs=1, type=str, required=True, help='''\
+    Full path of the station hashes file of the previous run. If it does not exist, every station is new.''')
+
+    parser.add_argument('--ofile', nargs=1, type=str, required=True, help='''\
+    Full path, name, and extension (.csv) of the delta field file to write. Same columns as the field data file.''')
+
+    parser.add_argument('--ofile_hashes', nargs=1, type=str, required=True, help='''\
+    Full path of the station hashes file of the current field data file to write. Once the delta run has succeeded, it replaces \
+    the station hashes file of the previous run.''')
+
+    args=parser.parse_args()
+    dict_args=vars(args)
+
+    id_col = dict_args['idField'][0]
+    field = read_table(dict_args['fieldFile'][0], 'field')
+    if id_col not in field.columns:
+        parser.error('--idField ' + id_col + ' is not a column of ' + dict_args['fieldFile'][0])
+
+    hashes = station_hashes(field, id_col)
+
+    previous_fp = dict_args['stationHashes'][0]
+    if os.path.isfile(previous_fp):
+        previous = read_table(previous_fp, 'station-hashes')
+    else:
+        previous = hashes.iloc[0:0]
+
+    new, changed, removed = diff_stations(previous, hashes)
+
+    field.loc[field[id_col].astype(str).isin(new | changed)].to_csv(dict_args['ofile'][0], index=False)
+    write_table(hashes, dict_args['ofile_hashes'][0], 'station-hashes')
+
+    print('Stations: ', len(hashes), ', new: ', len(new), ', changed: ', len(changed), ', removed: ', len(removed), ', unchanged: ', len(hashes) - len(new) - len(changed))
+
+def station_hashes(field, id_col):
+    ''' Return the station hashes table (station, hash) of the field data: a hash of all columns of each station's rows. '''
+    import pandas as pd
+
+    row_hashes = pd.util.hash_pandas_object(field.astype(str), index=False).map('{:016x}'.format)
+    stations = field[id_col].astype(str)
+
+    if stations.is_unique:
+        return pd.DataFrame({'station':stations.to_numpy(), 'hash':row_hashes.to_numpy()})
+    hashes = row_hashes.groupby(stations.to_numpy(), sort=False).agg('-'.join)
+    return pd.DataFrame({'station':hashes.index.to_numpy(), 'hash':hashes.to_numpy()})
+
+def diff_stations(previous, current):
+    ''' Compare two station hashes tables. Returns the sets of new, changed, and removed stations. '''
+    previous_hash = dict(zip(previous['station'], previous['hash']))
+    current_hash = dict(zip(current['station'], current['hash']))
+
+    new = set(current_hash) - set(previous_hash)
+    changed = set(station for station in current_hash if station in previous_hash and current_hash[station] != previous_hash[station])
+    removed = set(previous_hash) - set(current_hash)
+    return new, changed, removed
+
+if __name__ == "__main__":
+    import telemetry_support
+    telemetry_support.run_main(main)
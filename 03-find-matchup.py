@@ -5,13 +5,27 @@
 This script performs searches of the CMR for satellite granule names and download links. Originally written by J.Scott on 2016/12/12, then modified by Inia Soto, Catherine Mitchell, and Sunny Pinkham.  The original script has been heavily modified to suit current purposes and procedures, including updates to include satellites launched after the original script was written. Returns granules names for granules containing field data location, which defaults to within a +-3 hour (6 hour total) time window. 
 """
 
+# Dictionary of lists of CMR platform, instrument, collection names
+dict_plat = {}
+dict_plat['modisa']  = ['MODIS',['AQUA'],'MODISA_L2_']
+dict_plat['modist']  = ['MODIS',['TERRA'],'MODIST_L2_']
+dict_plat['viirsn']  = ['VIIRS',['Suomi-NPP'],'VIIRSN_L2_']
+dict_plat['viirsj1'] = ['VIIRS',['NOAA-20'],'VIIRSJ1_L2_']
+dict_plat['viirsj2'] = ['VIIRS',['NOAA-21'],'VIIRSJ2_L2_']
+dict_plat['meris']   = ['MERIS',['ENVISAT'],'MERIS_L2_']
+dict_plat['goci']    = ['GOCI',['COMS'],'GOCI_L2_']
+dict_plat['czcs']    = ['CZCS',['Nimbus-7'],'CZCS_L2_']
+dict_plat['seawifs'] = ['SeaWiFS',['OrbView-2'],'SeaWiFS_L2_MLAC_']
+dict_plat['octs']    = ['OCTS',['ADEOS-I'],'OCTS_L2_']
+
+# Base URL of the CMR (a local stand-in, see 03a-cmr-standin-server.py, can be given with --cmrUrl)
+CMR_URL = 'https://cmr.earthdata.nasa.gov'
+
 def main():
 
     import argparse
     import os
-    from datetime import timedelta
     from math import isnan
-    from collections import OrderedDict
 
     parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter,description='''\
       This program perform searches of the EarthData Search (https://search.earthdata.nasa.gov/search) Common Metadata
@@ -68,22 +82,35 @@ def main():
       A file name to save the L2 granule links to.
       ''')
 
-    
+    parser.add_argument('--chunksize', nargs=1, type=int, default=([100000]), help=('''\
+      OPTIONAL: Number of SeaBASS file rows read and searched at a time. Default is 100000.
+      CMR queries for the first rows start before the rest of the file is read, and memory use is bounded by the chunk size.
+      '''))
+
+    parser.add_argument('--cache', default=False, action='store_true', help=('''\
+      OPTIONAL: Reuse (or write) the binary sidecar cache of the parsed SeaBASS file (seabass_file + '.cache', see SB_support.readSB).
+      Later invocations on the same unchanged file open the cached columns and datetimes instead of parsing the file.
+      '''))
+
+    parser.add_argument('--workers', nargs=1, type=int, default=([1]), help=('''\
+      OPTIONAL: Number of CMR queries sent concurrently. Default is 1. Results are written in the same order whatever the number.
+      '''))
+
+    parser.add_argument('--coalesce', default=False, action='store_true', help=('''\
+      OPTIONAL: Send identical CMR queries (stations with the same lat/lon and time window) only once per chunk.
+      '''))
+
+    parser.add_argument('--cmrCache', nargs=1, type=str, help=('''\
+      OPTIONAL: Directory in which CMR responses are cached by query, for reruns over the same stations. Cached responses
+      never expire: remove the directory to pick up granules added to (or reprocessed in) the CMR since.
+      '''))
+
+    parser.add_argument('--cmrUrl', nargs=1, type=str, default=([CMR_URL]), help=('''\
+      OPTIONAL: Base URL of the CMR. Default is ''' + CMR_URL + '''.
+      '''))
+
     args=parser.parse_args()
     
-    # Create dictionary of lists of CMR platform, instrument, collection names
-    dict_plat = {}
-    dict_plat['modisa']  = ['MODIS',['AQUA'],'MODISA_L2_']
-    dict_plat['modist']  = ['MODIS',['TERRA'],'MODIST_L2_']
-    dict_plat['viirsn']  = ['VIIRS',['Suomi-NPP'],'VIIRSN_L2_']
-    dict_plat['viirsj1'] = ['VIIRS',['NOAA-20'],'VIIRSJ1_L2_']
-    dict_plat['viirsj2'] = ['VIIRS',['NOAA-21'],'VIIRSJ2_L2_']
-    dict_plat['meris']   = ['MERIS',['ENVISAT'],'MERIS_L2_']
-    dict_plat['goci']    = ['GOCI',['COMS'],'GOCI_L2_']
-    dict_plat['czcs']    = ['CZCS',['Nimbus-7'],'CZCS_L2_']
-    dict_plat['seawifs'] = ['SeaWiFS',['OrbView-2'],'SeaWiFS_L2_MLAC_']
-    dict_plat['octs']    = ['OCTS',['ADEOS-I'],'OCTS_L2_']
-
     ### CHECK INPUT ARGUMENTS: ###################################################################
     
     if not args.sat:
@@ -97,11 +124,9 @@ def main():
 
     if dict_args['max_time_diff'][0] < 0 or dict_args['max_time_diff'][0] > 36:
         parser.error('invalid --max_time_diff value provided. Please specify a value between 0 and 36 hours. Received --max_time_diff = ' + str(dict_args['max_time_diff'][0]))
-    else:
-        twin_Hmin = -1 * int(dict_args['max_time_diff'][0])
-        twin_Mmin = -60 * (dict_args['max_time_diff'][0] - int(dict_args['max_time_diff'][0]))
-        twin_Hmax = 1 * int(dict_args['max_time_diff'][0])
-        twin_Mmax = 60 * (dict_args['max_time_diff'][0] - int(dict_args['max_time_diff'][0]));
+
+    if dict_args['workers'][0] < 1:
+        parser.error('--workers must be at least 1. Received --workers = ' + str(dict_args['workers'][0]))
         
     ################################################################################################
     ### SEARCH CMR FOR L2 DOWNLOAD URLS ###
@@ -109,24 +134,91 @@ def main():
         
     for filein_sb in dict_args['seabass_file']:
 
-        ds = check_SBfile(parser, filein_sb.name)           
+        sb = check_SBfile(parser, filein_sb.name, dict_args['chunksize'][0], dict_args['cache'])
+        chunks = (check_SBchunk(parser, ds) for ds in sb.iter_chunks(dict_args['chunksize'][0]))
+        stations = ((ds.lat, ds.lon, ds.datetime64, ds.data['station']) for ds in chunks)
+
+        # The results of each chunk are appended to the output granule links file before the next chunk is searched,
+        # so memory use is bounded by the chunk size. The rows of a station may span a chunk boundary, so the
+        # (station, granule) pairs already written are kept to write each of them once:
+        hits = unique_hits = 0
+        emitted = set()
+        for chunk_hits, granlinks, rowinfo in search_CMR_chunks(sat, stations, dict_args['max_time_diff'][0], dict_args['data_type'][0], \
+                                                                dict_args['includeGnatsCheck'][0], dict_args['verbose'], dict_args['workers'][0], \
+                                                                dict_args['cmrCache'][0] if dict_args['cmrCache'] else None, dict_args['coalesce'], \
+                                                                dict_args['cmrUrl'][0]):
+
+            # The following function writes the results of the CMR search to a text file. This becomes our output granule links file.
+            hits += chunk_hits
+            granlinks, rowinfo = drop_emitted_granlinks(granlinks, rowinfo, emitted)
+            unique_hits += printtofile_CMRreq(chunk_hits, granlinks, dict_plat[sat], args, dict_args, rowinfo, report=False)
+
+        report_CMRreq(hits, unique_hits, dict_plat[sat])
+
+    return
+
+
+def search_CMR(sat, stations, max_time_diff=3, data_type='*', includeGnatsCheck=0, verbose=False, workers=1, cache_dir=None, coalesce=False, cmr_url=CMR_URL):
+    """ function to search the CMR for the sat granules matching up to each station, within +-max_time_diff hours;
+    stations is an iterable of chunks (lat, lon, datetime64, station) of equal length arrays or lists, as for search_CMR_chunks;
+    returns the number of hits and the granule links and row info of every station, as given to printtofile_CMRreq """
+    from collections import OrderedDict
+
+    granlinks = OrderedDict()
+    rowinfo = OrderedDict()
+    hits = 0
+
+    for chunk_hits, chunk_granlinks, chunk_rowinfo in search_CMR_chunks(sat, stations, max_time_diff, data_type, includeGnatsCheck, verbose, workers, cache_dir, coalesce, cmr_url):
+        hits += chunk_hits
+        granlinks.update(chunk_granlinks)
+        rowinfo.update(chunk_rowinfo)
+
+    return hits, granlinks, rowinfo
+
+
+def search_CMR_chunks(sat, stations, max_time_diff=3, data_type='*', includeGnatsCheck=0, verbose=False, workers=1, cache_dir=None, coalesce=False, cmr_url=CMR_URL):
+    """ function to search the CMR for the sat granules matching up to each station, within +-max_time_diff hours, chunk by chunk;
+    stations is an iterable of chunks (lat, lon, datetime64, station) of equal length arrays or lists, such as the
+    checked chunks of a SeaBASS file or the station list dataframes of 02-seabass-station-list.py;
+    the queries of each chunk are sent as by fetch_CMRreqs (workers, cache_dir, coalesce);
+    yields, for each chunk, the number of hits and the granule links and row info of its stations, as given to printtofile_CMRreq """
+    import numpy as np
+    from datetime import timedelta
+    from collections import OrderedDict
+    import telemetry_support
+
+    twin_Hmin = -1 * int(max_time_diff)
+    twin_Mmin = -60 * (max_time_diff - int(max_time_diff))
+    twin_Hmax = 1 * int(max_time_diff)
+    twin_Mmax = 60 * (max_time_diff - int(max_time_diff))
+
+    for lats, lons, datetime64, stations_chunk in stations:
+
         granlinks = OrderedDict()
         rowinfo = OrderedDict()
         hits = 0
 
+        ### Specify time limits for search, for all rows at once: ###
+        datetime64 = np.asarray(datetime64, dtype='datetime64[us]')
+        tim_min = datetime64 + np.timedelta64(timedelta(hours=twin_Hmin,minutes=twin_Mmin))
+        tim_max = datetime64 + np.timedelta64(timedelta(hours=twin_Hmax,minutes=twin_Mmax))
+        temporal = np.char.add(np.char.add(np.datetime_as_string(tim_min, unit='s'), 'Z,'), np.char.add(np.datetime_as_string(tim_max, unit='s'), 'Z'))
+
+        queries = []
+
         ### Set bounding box for downloading L2 files. ###
         # Define bounding box as +- 1 degree latitude and longitude from the field coordinates in the SeaBASS file.
-        for lat,lon,dt,station in zip(ds.lat,ds.lon,ds.datetime,ds.data['station']):
-            
+        for lat,lon,dt,station,temporal_range in zip(lats,lons,datetime64.astype(object).tolist(),stations_chunk,temporal):
+
             #If is Gnats station, set gnats bounding box
-            if (dict_args['includeGnatsCheck'][0]==1)&(isGnats(station)): 
+            if (includeGnatsCheck==1)&(isGnats(station)):
                 wlon = -71
                 slat = 42
                 elon = -66
                 nlat = 45
-                
+
             else:
-            
+
                 if (lon>=-180)&(lon<-179):
                     wlon = -180
                 else:
@@ -147,43 +239,41 @@ def main():
                 else:
                     nlat = lat + 1
 
-            ### Specify time limits for search: ###
-            tim_min = dt + timedelta(hours=twin_Hmin,minutes=twin_Mmin)
-            tim_max = dt + timedelta(hours=twin_Hmax,minutes=twin_Mmax)
-            
             # For the input satellite, construct a search url based on lat, lon, and time parameters:
             platform = ''
             for entry in dict_plat[sat][1]:
                 platform += '&platform=' + entry
 
-            url = 'https://cmr.earthdata.nasa.gov/search/granules.json?page_size=2000' + \
+            url = cmr_url + '/search/granules.json?page_size=2000' + \
                             '&provider=OB_DAAC' + \
                             '&point=' + str(lon) + ',' + str(lat) + \
                             '&instrument=' + dict_plat[sat][0] + \
                             platform + \
-                            '&short_name=' + dict_plat[sat][2] + dict_args['data_type'][0] + \
+                            '&short_name=' + dict_plat[sat][2] + data_type + \
                             '&options[short_name][pattern]=true' + \
-                            '&temporal=' + tim_min.strftime('%Y-%m-%dT%H:%M:%SZ') + ',' + tim_max.strftime('%Y-%m-%dT%H:%M:%SZ') + \
+                            '&temporal=' + temporal_range + \
                             '&sort_key=short_name'
 
-            if dict_args['verbose']:
+            if verbose:
                 print(url)
 
-            # The following function sends the url to CMR and returns a json formatted search query.
-            content = send_CMRreq(url)
+            queries.append((url, [lat, lon, dt, station, wlon, slat, elon, nlat]))
 
+        # The following function sends the urls of the chunk to CMR and returns the json formatted search results, in the same order.
+        with telemetry_support.step('cmr_query', items=len(queries), sat=sat):
+            contents = fetch_CMRreqs([url for url, row in queries], workers, cache_dir, coalesce)
+
+        for (url, row), content in zip(queries, contents):
             # The following function submits the json query and outputs granule links to matched up satellite files.
             # Also returns corresponding SeaBASS file row/station info, so when batch downloading, we can keep track of which field station corresponds to which satellite file.
-            [hits, granlinks, rowinfo] = processandtrack_CMRreq(content, hits, granlinks, rowinfo, lat, lon, dt, station, wlon, slat, elon, nlat)
-
-        # The following function writes the results of the CMR search to a text file. This becomes our output granule links file.
-        printtofile_CMRreq(hits, granlinks, dict_plat[sat], args, dict_args, rowinfo)
+            [hits, granlinks, rowinfo] = processandtrack_CMRreq(content, hits, granlinks, rowinfo, *row)
 
-    return
+        yield hits, granlinks, rowinfo
 
 
-def check_SBfile(parser, file_sb):
-    """ function to verify SB file exists, is valid, and has correct fields; returns data structure """
+def check_SBfile(parser, file_sb, chunksize, cache=False):
+    """ function to verify SB file exists and is valid; returns data structure holding the header, whose rows are read in chunks of chunksize rows
+    (with cache, sliced from the binary sidecar cache, or read from the file while the cache is written) """
     #from seabass.SB_support import readSB
     import os
     from SB_support import readSB
@@ -194,26 +284,40 @@ def check_SBfile(parser, file_sb):
                     mask_missing=True, 
                     mask_above_detection_limit=True, 
                     mask_below_detection_limit=True, 
-                    no_warn=True)
+                    no_warn=True,
+                    columnar=True,
+                    chunksize=chunksize,
+                    cache=cache)
     else:
         parser.error('ERROR: invalid --seabass_file specified. Does: ' + file_sb + ' exist?')
 
+    ### Check if lat, lon exist:
+    if 'lat' not in ds.variables or 'lon' not in ds.variables:
+        parser.error('missing headers/fields in SeaBASS file. File must contain lat,lon information')
+
+    return ds
+
+
+def check_SBchunk(parser, ds):
+    """ function to verify a chunk of SB file rows has valid date/time and lat/lon; returns data structure """
+    import numpy as np
+
     ### Check if datetime exists and has correct format: ##################
-    ds.datetime = ds.fd_datetime()
+    ds.datetime64 = ds.fd_datetime64()
+    ds.datetime = ds.datetime64.astype(object).tolist()
     if not ds.datetime:
         parser.error('missing fields in SeaBASS file. File must contain date/time, date/hour/minute/second, year/month/day/time, OR year/month/day/hour/minute/second')
      
-    ### Check if lat, lon exist and are not nan:
-    ds.lon = []
-    ds.lat = []
-    if 'lat' in ds.data and 'lon' in ds.data:
-        for lat,lon in zip(ds.data['lat'],ds.data['lon']):
-            check_lat(parser, float(lat))
-            check_lon(parser, float(lon))
-            ds.lat.append(float(lat))
-            ds.lon.append(float(lon))
-    else:
-        parser.error('missing headers/fields in SeaBASS file. File must contain lat,lon information')
+    ### Check if lat, lon are in range:
+    lats = np.asarray(ds.data['lat'], dtype=float)
+    lons = np.asarray(ds.data['lon'], dtype=float)
+    # Check the first out of range value, if any:
+    for lat in lats[np.abs(lats) > 90.0][0:1]:
+        check_lat(parser, lat)
+    for lon in lons[np.abs(lons) > 180.0][0:1]:
+        check_lon(parser, lon)
+    ds.lat = lats.tolist()
+    ds.lon = lons.tolist()
     
     return ds
 
@@ -232,16 +336,90 @@ def check_lon(parser, lon):
     return
 
 
-def send_CMRreq(url):
-    """ function to submit a given URL request to the CMR; return JSON output """
+def send_CMRreq(url, session=None, retries=3):
+    """ function to submit a given URL request to the CMR; return JSON output;
+    when there are more hits than the page size, the following pages are requested (CMR-Search-After header) and their
+    entries appended to the first page's; server errors (and throttling) are retried up to retries times, with backoff """
     import requests
-
-    req = requests.get(url)
-    content = req.json()
+    import time
+
+    if session is None:
+        session = requests
+
+    headers = {}
+    content = None
+    while True:
+        for attempt in range(retries + 1):
+            try:
+                req = session.get(url, headers=headers)
+            except requests.exceptions.ConnectionError:
+                if attempt == retries:
+                    raise
+            else:
+                if req.status_code < 500 and req.status_code != 429 or attempt == retries:
+                    break
+            time.sleep(0.5 * 2**attempt)
+
+        page = req.json()
+        if content is None:
+            content = page
+        elif 'feed' in page:
+            content['feed']['entry'] += page['feed']['entry']
+        else:
+            print('WARNING: CMR error on a following page of results: ' + str(page))
+            break
+
+        if 'feed' not in content or 'CMR-Search-After' not in req.headers or len(content['feed']['entry']) >= int(req.headers.get('CMR-Hits', 0)):
+            break
+        headers = {'CMR-Search-After': req.headers['CMR-Search-After']}
 
     return content
 
 
+def fetch_CMRreqs(urls, workers=1, cache_dir=None, coalesce=False):
+    """ function to submit the given URL requests to the CMR; return the JSON outputs in the order of urls;
+    with workers > 1, requests are sent concurrently (one HTTP session per worker);
+    with cache_dir, responses are read from (or written to) cache_dir/<sha256 of the url>.json, so only new queries are sent;
+    with coalesce, identical urls are requested once and share their JSON output """
+    import hashlib
+    import json
+    import os
+    import threading
+    import requests
+    from concurrent.futures import ThreadPoolExecutor
+
+    pending = list(dict.fromkeys(urls)) if coalesce else urls
+    local = threading.local()
+
+    def fetch(url):
+        if cache_dir:
+            cache_fp = os.path.join(cache_dir, hashlib.sha256(url.encode()).hexdigest() + '.json')
+            if os.path.isfile(cache_fp):
+                with open(cache_fp) as f:
+                    return json.load(f)
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        content = send_CMRreq(url, local.session)
+        # Only successful searches are cached, so errors are retried by the next run:
+        if cache_dir and 'feed' in content:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(cache_fp + '.tmp' + str(threading.get_ident()), 'w') as f:
+                json.dump(content, f)
+            os.replace(cache_fp + '.tmp' + str(threading.get_ident()), cache_fp)
+        return content
+
+    if workers > 1:
+        with ThreadPoolExecutor(workers) as executor:
+            contents = list(executor.map(fetch, pending))
+    else:
+        contents = [fetch(url) for url in pending]
+
+    if coalesce:
+        contents = dict(zip(pending, contents))
+        return [contents[url] for url in urls]
+    return contents
+
+
 def processandtrack_CMRreq(content, hits, granlinks, rowinfo, lat, lon, dt, station, wlon, slat, elon, nlat):
     """ function to process the return from a single CMR JSON return
     while keeping track of sb file """
@@ -308,11 +486,12 @@ def download_file(url, out_dir):
     return str(path_local)
 
 
-def printtofile_CMRreq(hits, granlinks, plat_ls, args, dict_args, rowinfo):
-    """" function to print the CMR results from a SB file to a text file """
+def printtofile_CMRreq(hits, granlinks, plat_ls, args, dict_args, rowinfo, report=True):
+    """" function to print the CMR results from a SB file to a text file (appending to it, e.g. chunk by chunk);
+    returns the number of granules found, which is reported unless report is False """
 
+    unique_hits = 0
     if hits > 0:
-        unique_hits = 0
         for station in granlinks:
             for granid in granlinks[station]:
                 unique_hits = unique_hits + 1
@@ -331,6 +510,35 @@ def printtofile_CMRreq(hits, granlinks, plat_ls, args, dict_args, rowinfo):
                         file.write(str(rowinfo[station][granid][6])+',')
                         file.write(str(rowinfo[station][granid][7])+'\n')
 
+    if report:
+        report_CMRreq(hits, unique_hits, plat_ls)
+
+    return unique_hits
+
+
+def drop_emitted_granlinks(granlinks, rowinfo, emitted):
+    """ function to leave out of the granule links and row info of a chunk the (station, granid) pairs of the set emitted,
+    i.e. those already written for an earlier chunk; the pairs left are added to emitted """
+    from collections import OrderedDict
+
+    new_granlinks = OrderedDict()
+    new_rowinfo = OrderedDict()
+    for station in granlinks:
+        new_granlinks[station] = OrderedDict()
+        new_rowinfo[station] = OrderedDict()
+        for granid in granlinks[station]:
+            if (station, granid) not in emitted:
+                emitted.add((station, granid))
+                new_granlinks[station][granid] = granlinks[station][granid]
+                new_rowinfo[station][granid] = rowinfo[station][granid]
+
+    return new_granlinks, new_rowinfo
+
+
+def report_CMRreq(hits, unique_hits, plat_ls):
+    """ function to report the number of granules found by the CMR search of a SB file """
+
+    if hits > 0:
         print('Number of granules found: ' + str(unique_hits))
         
     else:
@@ -338,9 +546,26 @@ def printtofile_CMRreq(hits, granlinks, plat_ls, args, dict_args, rowinfo):
 
     return
 
+
+def granlinks_table(granlinks, rowinfo):
+    """ function to collect the CMR results of search_CMR into a dataframe with the columns of the L2 granule links file
+    (the L2-granlinks stage of table_support.py), leaving out the GAC granules as printtofile_CMRreq does """
+    import pandas as pd
+    from table_support import schemas
+
+    rows = [rowinfo[station][granid][0:4] + [granlinks[station][granid]] + rowinfo[station][granid][4:8] \
+            for station in granlinks for granid in granlinks[station] if '_GAC' not in granlinks[station][granid]]
+    grandf = pd.DataFrame(rows, columns=list(schemas['L2-granlinks']))
+    grandf['datetimes'] = pd.to_datetime(grandf['datetimes'])
+    grandf['station'] = grandf['station'].astype(str).astype(object)
+
+    return grandf
+
 def isGnats(matchup_id):
     gnatsStatus = matchup_id[0] == 's'
     return gnatsStatus
 
 
-if __name__ == "__main__": main()
\ No newline at end of file
+if __name__ == "__main__":
+    import telemetry_support
+    telemetry_support.run_main(main)
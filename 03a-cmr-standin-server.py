@@ -0,0 +1,172 @@
+## This script serves a local stand-in of the CMR granule search (search/granules.json) used by 03-find-matchup.py, so the search
+## stage can be run and benchmarked (see 03b-benchmark-cmr-search.py) without the live cmr.earthdata.nasa.gov. Granules come from a
+## synthetic catalog: every collection of the OB.DAAC sensors has a 5 minute granule every 5 minutes, covering the swath of a
+## sun-synchronous orbit. Point, temporal and short_name queries are answered from the orbit model, with configurable latency,
+## error rate and maximum page size (further pages are requested with the CMR-Search-After header, as on the CMR).
+
+# Collections of the synthetic catalog: short_name prefix (as in dict_plat of 03-find-matchup.py): file name prefix, products,
+# swath width (km), and phase of the orbit (fraction of an orbit) at the catalog epoch.
+COLLECTIONS = {'MODISA_L2_'       : ['AQUA_MODIS', ['OC','IOP','SST'], 2330, 0.0],
+               'MODIST_L2_'       : ['TERRA_MODIS', ['OC','IOP','SST'], 2330, 0.5],
+               'VIIRSN_L2_'       : ['SNPP_VIIRS', ['OC','IOP','SST'], 3040, 0.25],
+               'VIIRSJ1_L2_'      : ['JPSS1_VIIRS', ['OC','IOP','SST'], 3040, 0.75],
+               'VIIRSJ2_L2_'      : ['JPSS2_VIIRS', ['OC','IOP','SST'], 3040, 0.125],
+               'SeaWiFS_L2_MLAC_' : ['SEASTAR_SEAWIFS_MLAC', ['OC','IOP'], 2800, 0.375]}
+
+ORBIT_MINUTES = 98.8
+INCLINATION = 98.2
+GRANULE_MINUTES = 5
+EPOCH = '2000-01-01T00:00:00'
+GETFILE_URL = 'https://oceandata.sci.gsfc.nasa.gov/cmr/getfile/'
+
+def main():
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description='''\
+      This script serves a local stand-in of the CMR granule search (search/granules.json) for 03-find-matchup.py --cmrUrl, \
+      answering point, temporal and short_name queries from a synthetic granule catalog. GET /stats returns the number of \
+      requests and injected errors so far.''')
+
+    parser.add_argument('--port', nargs=1, type=int, default=([8080]), help='''\
+    OPTIONAL: Port to listen on (on localhost). Default is 8080.''')
+
+    parser.add_argument('--latency', nargs=1, type=float, default=([0]), help='''\
+    OPTIONAL: Median latency added to every request, in milliseconds. Default is 0.''')
+
+    parser.add_argument('--latencySpread', nargs=1, type=float, default=([0.5]), help='''\
+    OPTIONAL: Spread (sigma of the log-normal distribution) of the added latency. Default is 0.5.''')
+
+    parser.add_argument('--errorRate', nargs=1, type=float, default=([0]), help='''\
+    OPTIONAL: Fraction of requests answered with a 503 error. Default is 0.''')
+
+    parser.add_argument('--maxPageSize', nargs=1, type=int, default=([2000]), help='''\
+    OPTIONAL: Largest page size served, whatever the page_size of the query. Default is 2000 (as the CMR).''')
+
+    parser.add_argument('--seed', nargs=1, type=int, default=([0]), help='''\
+    OPTIONAL: Random seed of the latency and errors. Default is 0.''')
+
+    args=parser.parse_args()
+    dict_args=vars(args)
+
+    server = make_server(dict_args['port'][0], dict_args['latency'][0], dict_args['latencySpread'][0], dict_args['errorRate'][0], \
+                         dict_args['maxPageSize'][0], dict_args['seed'][0])
+    print('CMR stand-in serving on http://localhost:' + str(server.server_address[1]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+def make_server(port=0, latency=0, latency_spread=0.5, error_rate=0, max_page_size=2000, seed=0):
+    ''' Return the (threaded) HTTP server of the stand-in on localhost:port (port 0 picks a free port; see server.server_address).
+    latency is in milliseconds. The server counts requests and errors in server.stats. '''
+    import json
+    import random
+    import threading
+    import time
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    from urllib.parse import urlsplit, parse_qs
+
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            split = urlsplit(self.path)
+            if split.path == '/stats':
+                return self.reply(200, dict(server.stats))
+            if split.path != '/search/granules.json':
+                return self.reply(404, {'errors':['Unknown path ' + split.path]})
+
+            with lock:
+                server.stats['requests'] += 1
+                delay = latency/1000*rng.lognormvariate(0, latency_spread) if latency > 0 else 0
+                error = rng.random() < error_rate
+                if error:
+                    server.stats['errors'] += 1
+            time.sleep(delay)
+            if error:
+                return self.reply(503, {'errors':['Service temporarily unavailable (stand-in)']})
+
+            query = parse_qs(split.query)
+            try:
+                lon, lat = [float(x) for x in query['point'][0].split(',')]
+                start, end = query['temporal'][0].split(',')
+                entries = search_catalog(query['short_name'][0], lat, lon, start, end)
+                page_size = min(int(query.get('page_size', ['10'])[0]), max_page_size)
+            except (KeyError, ValueError) as e:
+                return self.reply(400, {'errors':['Invalid query: ' + repr(e)]})
+
+            offset = json.loads(self.headers['CMR-Search-After'])[0] if 'CMR-Search-After' in self.headers else 0
+            headers = {'CMR-Hits':str(len(entries))}
+            if offset + page_size < len(entries):
+                headers['CMR-Search-After'] = json.dumps([offset + page_size])
+            self.reply(200, {'feed':{'entry':entries[offset:offset + page_size]}}, headers)
+
+        def reply(self, status, content, headers={}):
+            body = json.dumps(content).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('localhost', port), Handler)
+    server.daemon_threads = True
+    server.stats = {'requests':0, 'errors':0}
+    return server
+
+def search_catalog(short_name, lat, lon, start, end):
+    ''' Entries (producer_granule_id, time_start, time_end, links) of the catalog granules of the collections matching short_name
+    (a case insensitive pattern, e.g. MODISA_L2_oc or MODISA_L2_*) that start between start and end (ISO times, e.g.
+    2019-01-01T00:00:00Z) and contain the point lat, lon; sorted by short_name, then time. '''
+    import fnmatch
+    import numpy as np
+
+    start = np.datetime64(start.rstrip('Z'), 's')
+    end = np.datetime64(end.rstrip('Z'), 's')
+    epoch = np.datetime64(EPOCH, 's')
+    step = 60*GRANULE_MINUTES
+    first = -(-(start - epoch).astype(int)//step)
+    starts = epoch + np.arange(first, (end - epoch).astype(int)//step + 1)*step
+
+    entries = []
+    for prefix, (file_prefix, products, swath_km, phase) in COLLECTIONS.items():
+        names = sorted(prefix + product for product in products if fnmatch.fnmatch((prefix + product).lower(), short_name.lower()))
+        if not names or len(starts) == 0:
+            continue
+        covered = starts[granules_contain(starts, lat, lon, swath_km, phase)]
+        # MODIS granule names on the CMR start one second after the granule time (see 04-edit-L2-urls.py):
+        second = np.timedelta64(1 if 'MODIS' in file_prefix else 0, 's')
+        for name in names:
+            for granule_start in covered:
+                fname = file_prefix + '.' + str(granule_start + second).replace('-','').replace(':','') + '.L2.' + name.split('_')[-1] + '.nc'
+                entries.append({'producer_granule_id':fname, 'title':fname,
+                                'time_start':str(granule_start) + 'Z', 'time_end':str(granule_start + np.timedelta64(step, 's')) + 'Z',
+                                'links':[{'rel':'http://esipfed.org/ns/fedsearch/1.1/data#', 'href':GETFILE_URL + fname}]})
+    return entries
+
+def granules_contain(starts, lat, lon, swath_km, phase):
+    ''' Whether the point lat, lon lies within half a swath of the ground track of each granule (datetime64 start times). '''
+    import numpy as np
+
+    # Ground track sampled every 30 seconds over each granule:
+    seconds = (starts - np.datetime64(EPOCH, 's')).astype(float)[:, None] + np.arange(0, 60*GRANULE_MINUTES + 1, 30)[None, :]
+    u = 2*np.pi*(seconds/(60*ORBIT_MINUTES) + phase)
+    i = np.radians(INCLINATION)
+    track_lat = np.arcsin(np.sin(i)*np.sin(u))
+    # The orbit plane is fixed relative to the sun (sun-synchronous), so the ground track drifts west with the Earth's rotation relative to the sun:
+    track_lon = np.arctan2(np.cos(i)*np.sin(u), np.cos(u)) - 2*np.pi*seconds/86400
+    lat, lon = np.radians(lat), np.radians(lon)
+    a = np.sin((track_lat - lat)/2)**2 + np.cos(lat)*np.cos(track_lat)*np.sin((track_lon - lon)/2)**2
+    dist = 2*6371*np.arcsin(np.sqrt(a))
+    return (dist <= swath_km/2).any(axis=1)
+
+if __name__ == "__main__": main()
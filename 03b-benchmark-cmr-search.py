@@ -0,0 +1,161 @@
+## This script benchmarks the CMR search of 03-find-matchup.py against the local CMR stand-in (03a-cmr-standin-server.py):
+## queries per second, query latency percentiles, and correctness (granule links compared to those of the synthetic catalog)
+## of the serial search and of its concurrent, coalescing, and caching modes, for synthetic stations.
+
+def main():
+
+    import argparse
+    import json
+    import shutil
+    import tempfile
+    import threading
+    from workflow_support import load_script
+
+    find_matchup = load_script('03-find-matchup.py')
+    standin = load_script('03a-cmr-standin-server.py')
+
+
+    parser = argparse.ArgumentParser(description='''\
+      This script starts the CMR stand-in server (03a-cmr-standin-server.py) with the given latency, error rate, and page size, \
+      and runs search_CMR of 03-find-matchup.py on synthetic stations in each mode: serial, concurrent (--workers), coalescing, \
+      concurrent and coalescing, and with the response cache (cold, then warm). For each mode it reports the stations searched \
+      and HTTP requests sent per second, the latency percentiles of the queries, and the granule links missing or extra \
+      compared to the catalog. The results are written to a JSON file.''')
+
+    parser.add_argument('--ofile', nargs=1, type=str, required=True, help='''\
+    Full path and .json extension of the results file to write.''')
+
+    parser.add_argument('--sat', nargs=1, type=str, default=(['modisa']), choices=sorted(find_matchup.dict_plat), help='''\
+    OPTIONAL: Satellite searched. Default is modisa.''')
+
+    parser.add_argument('--nstations', nargs=1, type=int, default=([200]), help='''\
+    OPTIONAL: Number of synthetic stations. Default is 200.''')
+
+    parser.add_argument('--repeatFraction', nargs=1, type=float, default=([0.3]), help='''\
+    OPTIONAL: Fraction of the stations sampled at the same place and time as another station (e.g. several depths), whose \
+    CMR queries are identical. Default is 0.3.''')
+
+    parser.add_argument('--workers', nargs=1, type=int, default=([8]), help='''\
+    OPTIONAL: Number of concurrent queries of the concurrent modes. Default is 8.''')
+
+    parser.add_argument('--latency', nargs=1, type=float, default=([100]), help='''\
+    OPTIONAL: Median latency of the stand-in, in milliseconds. Default is 100.''')
+
+    parser.add_argument('--errorRate', nargs=1, type=float, default=([0]), help='''\
+    OPTIONAL: Fraction of the stand-in requests answered with an error (retried by 03). Default is 0.''')
+
+    parser.add_argument('--maxPageSize', nargs=1, type=int, default=([2000]), help='''\
+    OPTIONAL: Largest page size served by the stand-in. Default is 2000.''')
+
+    parser.add_argument('--max_time_diff', nargs=1, type=float, default=([3]), help='''\
+    OPTIONAL: Search time window (+- hours). Default is 3.''')
+
+    parser.add_argument('--seed', nargs=1, type=int, default=([0]), help='''\
+    OPTIONAL: Random seed. Default is 0.''')
+
+    args=parser.parse_args()
+    dict_args=vars(args)
+
+    server = standin.make_server(0, dict_args['latency'][0], 0.5, dict_args['errorRate'][0], dict_args['maxPageSize'][0], dict_args['seed'][0])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cmr_url = 'http://localhost:' + str(server.server_address[1])
+
+    sat = dict_args['sat'][0]
+    stations = synthetic_stations(dict_args['nstations'][0], dict_args['repeatFraction'][0], dict_args['seed'][0])
+    expected = expected_links(standin, find_matchup.dict_plat[sat][2] + '*', stations, dict_args['max_time_diff'][0])
+
+    workers = dict_args['workers'][0]
+    cache_dir = tempfile.mkdtemp(prefix='cmr-cache-')
+    modes = [('serial', 1, None, False), ('concurrent', workers, None, False), ('coalesce', 1, None, True), \
+             ('concurrent-coalesce', workers, None, True), ('cache-cold', workers, cache_dir, True), ('cache-warm', workers, cache_dir, True)]
+
+    results = []
+    try:
+        for mode, mode_workers, mode_cache, coalesce in modes:
+            result = run_mode(find_matchup, server, sat, stations, dict_args['max_time_diff'][0], mode_workers, mode_cache, coalesce, cmr_url, expected)
+            result.update({'mode':mode, 'workers':mode_workers, 'coalesce':coalesce, 'cache':mode_cache is not None})
+            results.append(result)
+            print(mode + ':', result['stations'], 'stations in', '%.2f' % result['seconds'], 's (' + '%.1f' % result['stations_per_s'], 'stations/s),', \
+                  result['requests'], 'requests,', 'latency p50/p95/p99', '/'.join('%.0f' % (1000*result[p]) for p in ['p50','p95','p99']), 'ms,', \
+                  result['missing'], 'missing,', result['extra'], 'extra granule links')
+    finally:
+        shutil.rmtree(cache_dir)
+        server.shutdown()
+
+    settings = {key: dict_args[key][0] for key in ['sat','nstations','repeatFraction','latency','errorRate','maxPageSize','max_time_diff','seed']}
+    with open(dict_args['ofile'][0], 'w') as f:
+        json.dump({'meta':environment(), 'settings':settings, 'results':results}, f, indent=1)
+
+def synthetic_stations(nstations, repeat_fraction, seed):
+    ''' A chunk (lat, lon, datetime64, station) of synthetic stations in 2019, a fraction of them repeating the place and time of another. '''
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    lats = rng.uniform(-70, 70, nstations).round(4)
+    lons = rng.uniform(-180, 180, nstations).round(4)
+    times = np.datetime64('2019-01-01T00:00:00') + rng.integers(0, 365*86400, nstations).astype('timedelta64[s]')
+    repeats = np.flatnonzero(rng.random(nstations) < repeat_fraction)
+    repeats = repeats[repeats > 0]
+    source = rng.integers(0, repeats, len(repeats)) if len(repeats) else repeats
+    lats[repeats], lons[repeats], times[repeats] = lats[source], lons[source], times[source]
+    return [(lats, lons, times, ['bench' + str(i) for i in range(nstations)])]
+
+def expected_links(standin, short_name, stations, max_time_diff):
+    ''' Set of (station, granule url) expected from the catalog of the stand-in. '''
+    import numpy as np
+
+    window = np.timedelta64(int(3600*max_time_diff), 's')
+    expected = set()
+    for lats, lons, times, ids in stations:
+        for lat, lon, time, station in zip(lats, lons, times, ids):
+            entries = standin.search_catalog(short_name, lat, lon, str(time - window) + 'Z', str(time + window) + 'Z')
+            expected.update((station, entry['links'][0]['href']) for entry in entries)
+    return expected
+
+def run_mode(find_matchup, server, sat, stations, max_time_diff, workers, cache_dir, coalesce, cmr_url, expected):
+    ''' Run search_CMR in one mode, timing each query. Returns the throughput, latency, and correctness results. '''
+    import time
+    import threading
+    import numpy as np
+
+    latencies = []
+    lock = threading.Lock()
+    send_CMRreq = find_matchup.send_CMRreq
+
+    def timed_send_CMRreq(*args, **kwargs):
+        t0 = time.perf_counter()
+        content = send_CMRreq(*args, **kwargs)
+        with lock:
+            latencies.append(time.perf_counter() - t0)
+        return content
+
+    requests_before = server.stats['requests']
+    find_matchup.send_CMRreq = timed_send_CMRreq
+    try:
+        started = time.perf_counter()
+        hits, granlinks, rowinfo = find_matchup.search_CMR(sat, stations, max_time_diff, '*', 0, False, workers, cache_dir, coalesce, cmr_url)
+        seconds = time.perf_counter() - started
+    finally:
+        find_matchup.send_CMRreq = send_CMRreq
+
+    found = set((station, url) for station in granlinks for url in granlinks[station].values())
+    nstations = sum(len(chunk[0]) for chunk in stations)
+    requests = server.stats['requests'] - requests_before
+    queries = len(latencies)
+    # All queries answered from the cache:
+    latencies = latencies or [0]
+    return {'stations':nstations, 'queries':queries, 'requests':requests, 'seconds':seconds, \
+            'stations_per_s':nstations/seconds, 'requests_per_s':requests/seconds, \
+            'p50':float(np.percentile(latencies, 50)), 'p95':float(np.percentile(latencies, 95)), 'p99':float(np.percentile(latencies, 99)), \
+            'max':float(np.max(latencies)), 'links':len(found), 'missing':len(expected - found), 'extra':len(found - expected)}
+
+def environment():
+    ''' Description of the machine and package versions the benchmark was run with. '''
+    import platform
+    import os
+    from datetime import datetime
+    import numpy, requests
+    return {'date':datetime.now().isoformat(timespec='seconds'), 'host':platform.node(), 'machine':platform.machine(), 'cpus':os.cpu_count(), \
+            'python':platform.python_version(), 'numpy':numpy.__version__, 'requests':requests.__version__}
+
+if __name__ == "__main__": main()
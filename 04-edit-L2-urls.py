@@ -5,8 +5,8 @@
 def main():
     
     import argparse
-    import pandas as pd
-    import re
+    import os
+    from table_support import read_table
     
     
     parser = argparse.ArgumentParser(description='''\
@@ -19,7 +19,11 @@ def main():
     parser.add_argument('--ofile', nargs=1, type=str, required=True, help='''\
       File path for the output file which contains the full list of stations matched to \
       granule names and l1a urls. This will have duplicates of the granule info, but a unique \
-      station list.''')
+      station list. Written as Parquet if the extension is .parquet, else as csv (see table_support.py).''')
+
+    parser.add_argument('--duplicatesFile', nargs=1, type=str, required=False, help='''\
+      OPTIONAL: Duplicates file written by 02-seabass-station-list.py --dedupTolerance, listing stations left out of the \
+      station list and the station they duplicate. Each duplicate station is given the granule links of the station it duplicates.''')
 
     args=parser.parse_args()
     dict_args=vars(args)
@@ -27,7 +31,22 @@ def main():
     filepath = dict_args['L2granlinksFile'][0]
     ofilepath = dict_args['ofile'][0]
     
-    grandf = pd.read_csv(filepath, names=['lat','lon','datetimes','station','granurls','wlon','slat','elon','nlat'])
+    grandf = read_table(filepath, 'L2-granlinks')
+    
+    duplicates = None
+    if dict_args['duplicatesFile'] and os.path.getsize(dict_args['duplicatesFile'][0]) > 0:
+        duplicates = read_table(dict_args['duplicatesFile'][0], 'duplicates')
+    
+    outdf = edit_L2_urls(grandf, duplicates)
+    write_L1a_granlinks(outdf, ofilepath)
+
+def edit_L2_urls(grandf, duplicates=None):
+    ''' Edit the L2 urls of the L2 granule links table (output of 03-find-matchup.py) to L1a urls, and return the table of the
+    stations matched to granule names and L1a urls (the L1a-granlinks stage of table_support.py). If given the duplicates table of
+    02-seabass-station-list.py, each duplicate station is given the granule links of the station it duplicates. '''
+    import pandas as pd
+    
+    grandf = grandf.copy()
     
     # For Modis urls, replace 1.L2 from CMR urls with 0.L2 for earthdata direct data access urls:
     grandf.loc[grandf['granurls'].str.contains('MODIS'), 'granurls'] = [gurl.replace('1.L2','0.L2') for gurl in grandf.loc[grandf['granurls'].str.contains('MODIS'), 'granurls']]
@@ -39,15 +58,27 @@ def main():
     grandf['granid'] = grandf['granurls'].apply(lambda x : getgranname(x))
     
     # The full list of stations matched to granule names and urls (contains duplicate granule info)
-    outdf = grandf[['station','granid','granurls','wlon','slat','elon','nlat']]
-    outdf.to_csv(ofilepath, index=False, header=False)
+    outdf = grandf[['station','granid','granurls','wlon','slat','elon','nlat']].rename(columns={'granurls':'granurl'})
+    
+    # Give the stations deduplicated from the station list the granule links of the station they duplicate:
+    if duplicates is not None and len(duplicates) > 0:
+        expanded = outdf.assign(kept_station=outdf['station'].astype(str)).drop(columns='station').merge(duplicates, on='kept_station')
+        outdf = pd.concat([outdf, expanded[outdf.columns]], ignore_index=True)
+    
+    return outdf
+
+def write_L1a_granlinks(outdf, ofilepath):
+    ''' Write the L1a granule links table, and one file per satellite (the satellite name appended to the file name). '''
+    from table_support import write_table, satellite_path
+    
+    write_table(outdf, ofilepath, 'L1a-granlinks')
     
     # Separate the output file by satellite and save files per satellite:
     satellite_names = {'S':'seawifs','A':'aqua','T':'terra','VS':'snpp','V1J':'jpss1','V2J':'jpss2'}
     
     for key in satellite_names:
         sat_df = outdf.loc[outdf['granid'].str[0:-13]==key]
-        sat_df.to_csv(ofilepath[0:-4]+'-'+satellite_names[key]+'.csv', index=False, header=False)
+        write_table(sat_df, satellite_path(ofilepath, satellite_names[key]), 'L1a-granlinks')
 
     
 def urledit(urlstring):
@@ -140,4 +171,6 @@ def getgranname(urlstring):
    
     return granid
 
-if __name__ == "__main__": main()
\ No newline at end of file
+if __name__ == "__main__":
+    import telemetry_support
+    telemetry_support.run_main(main)
@@ -2,8 +2,7 @@
 def main():
     
     import argparse
-    import pandas as pd
-    import re
+    from table_support import read_table
     
     
     parser = argparse.ArgumentParser(description='''\
@@ -21,14 +20,22 @@ def main():
     
     parser.add_argument('--ofile', nargs=1, type=str, required=True, help='''\
       File path for the output file which will contain a unique list of L1a download granules\
-      with appropriately expanded bounding boxes.''')
+      with appropriately expanded bounding boxes. Written as Parquet if the extension is .parquet, else as csv (see table_support.py).''')
 
     args=parser.parse_args()
     dict_args=vars(args)
     
     filepath = dict_args['L1aGranlinksFile'][0]
     
-    df_l1a = pd.read_csv(filepath, names=['station','granid','granurl','wlon','slat','elon','nlat'])
+    df_l1a = read_table(filepath, 'L1a-granlinks')
+    
+    unique_granules_df = unique_granules(df_l1a)
+    write_download_urls(unique_granules_df, dict_args['ofile'][0])
+
+def unique_granules(df_l1a):
+    ''' Return the table of unique L1a granules (the download-urls stage of table_support.py) of the L1a granule links table,
+    with each bounding box expanded to the limits of all datarows mapping to the granule. '''
+    import pandas as pd
     
     gids = []
     urls = []
@@ -46,8 +53,14 @@ def main():
         slats.append(curr_df['slat'].min())
         nlats.append(curr_df['nlat'].max())
     
-    unique_granules_df = pd.DataFrame({'granid':gids,'granurl':urls,'wlon':wlons,'slat':slats,'elon':elons,'nlat':nlats})
-    unique_granules_df.to_csv(dict_args['ofile'][0], index=False, header=False)
+    # granid and granurl are given the object dtype, so an empty table (no matchups, e.g. a delta run without new stations) keeps text columns:
+    return pd.DataFrame({'granid':pd.Series(gids, dtype=object),'granurl':pd.Series(urls, dtype=object),'wlon':wlons,'slat':slats,'elon':elons,'nlat':nlats})
+
+def write_download_urls(unique_granules_df, ofilepath):
+    ''' Write the unique L1a granules table, and one file per satellite (the satellite name appended to the file name). '''
+    from table_support import write_table, satellite_path
+    
+    write_table(unique_granules_df, ofilepath, 'download-urls')
     
     # Separate output file into individual files by satellite:
     satellite_names = {'S':'seawifs','A':'aqua','T':'terra','VS':'snpp','V1J':'jpss1','V2J':'jpss2'}
@@ -55,13 +68,15 @@ def main():
     for key in satellite_names:
         if 'V' not in key:
             sat_df = unique_granules_df.loc[unique_granules_df['granid'].str[0]==key]
-            sat_df.to_csv(dict_args['ofile'][0][0:-4]+'-'+satellite_names[key]+'.csv', index=False, header=False)
+            write_table(sat_df, satellite_path(ofilepath, satellite_names[key]), 'download-urls')
         elif key=='VS':
             sat_df = unique_granules_df.loc[unique_granules_df['granid'].str[0:2]==key]
-            sat_df.to_csv(dict_args['ofile'][0][0:-4]+'-'+satellite_names[key]+'.csv', index=False, header=False)
+            write_table(sat_df, satellite_path(ofilepath, satellite_names[key]), 'download-urls')
         else:
             sat_df = unique_granules_df.loc[unique_granules_df['granid'].str[0:3]==key]
-            sat_df.to_csv(dict_args['ofile'][0][0:-4]+'-'+satellite_names[key]+'.csv', index=False, header=False)
+            write_table(sat_df, satellite_path(ofilepath, satellite_names[key]), 'download-urls')
         
     
-if __name__ == "__main__": main()
\ No newline at end of file
+if __name__ == "__main__":
+    import telemetry_support
+    telemetry_support.run_main(main)
@@ -0,0 +1,180 @@
+## This script runs stages 02-05 (station list, CMR search, L1a urls, download list) in one process.
+## The station list, L2 granule links, and L1a granule links are passed between the stages as dataframes instead of being
+## written to and parsed back from disk by a separate interpreter per stage; intermediate files are only written when asked.
+## The outputs are the same as those of the separate scripts, which remain the reference implementation of each stage.
+
+def main():
+
+    import argparse
+    import pandas as pd
+    from telemetry_support import step
+    from workflow_support import load_script
+
+    station_list = load_script('02-seabass-station-list.py')
+    find_matchup = load_script('03-find-matchup.py')
+    edit_L2_urls = load_script('04-edit-L2-urls.py')
+    download_list = load_script('05-create-L1a-download-list.py')
+
+
+    parser = argparse.ArgumentParser(description='''\
+      This script runs 02-seabass-station-list.py, 03-find-matchup.py (for each --sat), 04-edit-L2-urls.py, and \
+      05-create-L1a-download-list.py in one process, passing the tables between the stages in memory. It writes the L1a granule \
+      links file and the download list (and their satellite specific files), plus the station list, L2 granule links file, and \
+      duplicates file if their paths are given. See the separate scripts for the details of each stage.''')
+
+    parser.add_argument('--fieldFile', nargs=1, type=str, required=True, help='''\
+    Full path, filename, and extension of the field data, which must contain an id field.''')
+
+    parser.add_argument('--idField', nargs=1, type=str, required=True, help='''\
+    Name of id field/column.''')
+
+    parser.add_argument('--datetimeField', nargs=1, type=str, required=True, help='''\
+    Name of datetime field/column. See 02-seabass-station-list.py.''')
+
+    parser.add_argument('--datetimeFormat', nargs='+', type=str, default=(station_list.DATETIME_FORMATS), help='''\
+    OPTIONAL: One or more strftime formats of the datetime strings, tried in order for each datetime. Default is the ISO formats of 02-seabass-station-list.py.''')
+
+    parser.add_argument('--latitudeField', nargs=1, type=str, required=True, help='''\
+    Name of latitude field, in decimal degrees.''')
+
+    parser.add_argument('--longitudeField', nargs=1, type=str, required=True, help='''\
+    Name of longitude field, in decimal degrees.''')
+
+    parser.add_argument('--chunksize', nargs=1, type=int, default=([500000]), help='''\
+    OPTIONAL: Number of field file rows read and converted at a time. Default is 500000.''')
+
+    parser.add_argument('--dedupTolerance', nargs=2, type=float, required=False, help='''\
+    OPTIONAL: Position tolerance (decimal degrees) and time tolerance (seconds) for deduplicating the station list. See 02-seabass-station-list.py.''')
+
+    parser.add_argument('--sat', nargs='+', type=str, required=True, choices=sorted(find_matchup.dict_plat), help='''\
+    One or more satellite/instrument specifiers searched in order, as given to 03-find-matchup.py --sat.''')
+
+    parser.add_argument('--data_type', nargs=1, type=str, default=(['*']), choices=['oc','iop','sst'], help='''\
+    OPTIONAL: Satellite data type (oc, iop, or sst). Default returns all product suites.''')
+
+    parser.add_argument('--max_time_diff', nargs=1, type=float, default=([3]), help='''\
+    OPTIONAL: Maximum time difference between satellite and in situ point, in hours (0-36). Default is 3.''')
+
+    parser.add_argument('--includeGnatsCheck', nargs=1, type=int, default=([0]), help='''\
+    OPTIONAL: If set to 1, GNATS stations (ids starting with 's') are given the Gulf of Maine bounding box. Default is 0.''')
+
+    parser.add_argument('--verbose', default=False, action='store_true', help='''\
+    OPTIONAL: Displays HTTP requests for each Earthdata CMR query.''')
+
+    parser.add_argument('--workers', nargs=1, type=int, default=([1]), help='''\
+    OPTIONAL: Number of CMR queries sent concurrently (see 03-find-matchup.py). Default is 1.''')
+
+    parser.add_argument('--coalesce', default=False, action='store_true', help='''\
+    OPTIONAL: Send identical CMR queries only once per chunk (see 03-find-matchup.py).''')
+
+    parser.add_argument('--cmrCache', nargs=1, type=str, required=False, help='''\
+    OPTIONAL: Directory in which CMR responses are cached by query (see 03-find-matchup.py).''')
+
+    parser.add_argument('--cmrUrl', nargs=1, type=str, default=([find_matchup.CMR_URL]), help='''\
+    OPTIONAL: Base URL of the CMR. Default is ''' + find_matchup.CMR_URL + '''.''')
+
+    parser.add_argument('--L1aGranlinksFile', nargs=1, type=str, required=True, help='''\
+    File path for the L1a granule links file (output of 04-edit-L2-urls.py). Written as Parquet if the extension is .parquet, else as csv.''')
+
+    parser.add_argument('--downloadUrlsFile', nargs=1, type=str, required=True, help='''\
+    File path for the unique L1a download list (output of 05-create-L1a-download-list.py). Written as Parquet if the extension is .parquet, else as csv.''')
+
+    parser.add_argument('--stationList', nargs=1, type=str, required=False, help='''\
+    OPTIONAL: File path with .sb extension for writing the SeaBASS formatted station list (output of 02-seabass-station-list.py).''')
+
+    parser.add_argument('--L2granlinksFile', nargs=1, type=str, required=False, help='''\
+    OPTIONAL: File path for writing the L2 granule links of all satellites (output of 03-find-matchup.py).''')
+
+    parser.add_argument('--duplicatesFile', nargs=1, type=str, required=False, help='''\
+    OPTIONAL: File path for writing the stations deduplicated from the station list (with --dedupTolerance).''')
+
+    args=parser.parse_args()
+    dict_args=vars(args)
+
+    if dict_args['chunksize'][0] < 1:
+        parser.error('--chunksize must be at least 1. Received --chunksize = ' + str(dict_args['chunksize'][0]))
+    if dict_args['workers'][0] < 1:
+        parser.error('--workers must be at least 1. Received --workers = ' + str(dict_args['workers'][0]))
+    if dict_args['max_time_diff'][0] < 0 or dict_args['max_time_diff'][0] > 36:
+        parser.error('invalid --max_time_diff value provided. Please specify a value between 0 and 36 hours. Received --max_time_diff = ' + str(dict_args['max_time_diff'][0]))
+
+    ### 02: station list ###
+    try:
+        with step('station_list') as record:
+            stations, duplicates = run_station_list(station_list, dict_args['fieldFile'][0], dict_args['idField'][0], dict_args['datetimeField'][0], \
+                                                    dict_args['latitudeField'][0], dict_args['longitudeField'][0], dict_args['datetimeFormat'], \
+                                                    dict_args['chunksize'][0], dict_args['dedupTolerance'], \
+                                                    dict_args['stationList'][0] if dict_args['stationList'] else None)
+            record['items'] = sum(len(chunk[0]) for chunk in stations)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if dict_args['duplicatesFile']:
+        duplicates.to_csv(dict_args['duplicatesFile'][0], index=False, header=False)
+
+    ### 03: CMR search, satellite by satellite ###
+    # The L2 granule links file, if asked for, is appended to satellite by satellite exactly as by 03-find-matchup.py:
+    if dict_args['L2granlinksFile']:
+        open(dict_args['L2granlinksFile'][0], 'w').close()
+    grandfs = []
+    for sat in dict_args['sat']:
+        [hits, granlinks, rowinfo] = find_matchup.search_CMR(sat, stations, dict_args['max_time_diff'][0], dict_args['data_type'][0], \
+                                                             dict_args['includeGnatsCheck'][0], dict_args['verbose'], dict_args['workers'][0], \
+                                                             dict_args['cmrCache'][0] if dict_args['cmrCache'] else None, dict_args['coalesce'], \
+                                                             dict_args['cmrUrl'][0])
+        grandfs.append(find_matchup.granlinks_table(granlinks, rowinfo))
+        if dict_args['L2granlinksFile']:
+            find_matchup.printtofile_CMRreq(hits, granlinks, find_matchup.dict_plat[sat], args, {'output_file':dict_args['L2granlinksFile']}, rowinfo)
+        elif hits > 0:
+            print('Number of granules found: ' + str(sum(len(granlinks[station]) for station in granlinks)))
+        else:
+            print('WARNING: No granules found for ' + find_matchup.dict_plat[sat][1][0] + '/' + find_matchup.dict_plat[sat][0] + ' and any lat/lon/time inputs.')
+    grandf = pd.concat(grandfs, ignore_index=True)
+
+    ### 04: L1a granule links ###
+    outdf = edit_L2_urls.edit_L2_urls(grandf, duplicates if dict_args['dedupTolerance'] else None)
+    edit_L2_urls.write_L1a_granlinks(outdf, dict_args['L1aGranlinksFile'][0])
+
+    ### 05: unique L1a download list ###
+    download_list.write_download_urls(download_list.unique_granules(outdf), dict_args['downloadUrlsFile'][0])
+
+    print('Stations: ', sum(len(chunk[0]) for chunk in stations), ', L2 granule links: ', len(grandf), ', L1a granule links: ', len(outdf))
+
+
+def run_station_list(station_list, field_fn, data_id, datetime, latitude, longitude, datetimeFormats=None, chunksize=500000, dedupTolerance=None, ofile_fn=None):
+    ''' Convert the field data file to the station list with the functions of 02-seabass-station-list.py (loaded as station_list), and
+    return it as a list of (lat, lon, datetime64, station) chunks for search_CMR of 03-find-matchup.py, along with the duplicates table.
+    The values are those 03-find-matchup.py reads back from the SeaBASS station list: stations as strings and datetimes in microseconds.
+    If ofile_fn is given, the SeaBASS station list is also written to it. Raises ValueError for unparsable datetimes or out of range coordinates. '''
+    import numpy as np
+    import pandas as pd
+
+    if ofile_fn:
+        station_list.writeStationList(ofile_fn)
+
+    stations = []
+    duplicates = []
+    for seabassDf, chunk_duplicates, chunk_rows in station_list.stationListChunks(field_fn, data_id, datetime, latitude, longitude, \
+                                                                                   datetimeFormats, chunksize, dedupTolerance):
+        if ofile_fn:
+            station_list.writeStationList(ofile_fn, seabassDf)
+        duplicates.append(chunk_duplicates.astype(str))
+
+        lats = seabassDf['lat'].to_numpy(dtype=float)
+        lons = seabassDf['lon'].to_numpy(dtype=float)
+        for lat in lats[np.abs(lats) > 90.0][0:1]:
+            raise ValueError('invalid latitude: all LAT values MUST be between -90/90N deg. Received: ' + str(lat))
+        for lon in lons[np.abs(lons) > 180.0][0:1]:
+            raise ValueError('invalid longitude: all LON values MUST be between -180/180E deg. Received: ' + str(lon))
+
+        dates = pd.to_datetime(seabassDf[['year','month','day','hour','min']].rename(columns={'min':'minute'}))
+        seconds = pd.to_timedelta(np.round(seabassDf['sec'].to_numpy(dtype=float)*1000000), unit='us')
+        datetime64 = (dates + seconds).to_numpy().astype('datetime64[us]')
+
+        stations.append((lats.tolist(), lons.tolist(), datetime64, seabassDf['ID'].astype(str).tolist()))
+
+    return stations, pd.concat(duplicates, ignore_index=True) if duplicates else pd.DataFrame({'station':[], 'kept_station':[]})
+
+if __name__ == "__main__":
+    import telemetry_support
+    telemetry_support.run_main(main)
@@ -0,0 +1,103 @@
+## This script merges the L1a granule links of the delta field file (new and changed stations, see 02a-field-delta.py) into
+## the L1a granule links and download list of the previous run, for the delta mode (01g-delta-submission.sh).
+## The outputs of the previous run that are no longer valid are removed, so the following stages redo only that work:
+## the matchup datarows (and their state) of changed and removed stations, and the L2 files (and their state) of granules
+## whose bounding box must be expanded for the new stations. Everything else is skipped by 06j and 09a as already done.
+
+def main():
+
+    import argparse
+    import os
+    import pandas as pd
+    from table_support import read_table, schemas
+    from workflow_support import load_script, l2_filepath
+
+    edit_L2_urls = load_script('04-edit-L2-urls.py')
+    download_list = load_script('05-create-L1a-download-list.py')
+
+
+    parser = argparse.ArgumentParser(description='''\
+      This script merges the L1a granule links of the new and changed stations into the L1a granule links file of the previous run \
+      (replacing the rows of changed stations and dropping those of removed stations), and rewrites the download list from the merged \
+      links. The matchup datarows of changed and removed stations are deleted, and so are the L2 files of granules whose bounding box \
+      grew, so they are processed again.''')
+
+    parser.add_argument('--L1aGranlinksFile', nargs=1, type=str, required=True, help='''\
+    Full path of the L1a granule links file of the previous run (output of 04-edit-L2-urls.py). Rewritten with the merged links.''')
+
+    parser.add_argument('--L1aGranlinksDelta', nargs=1, type=str, required=True, help='''\
+    Full path of the L1a granule links file of the delta field file.''')
+
+    parser.add_argument('--downloadUrlsFile', nargs=1, type=str, required=True, help='''\
+    Full path of the download list of the previous run (output of 05-create-L1a-download-list.py). Rewritten from the merged links.''')
+
+    parser.add_argument('--stationHashes', nargs=1, type=str, required=True, help='''\
+    Full path of the station hashes file of the previous run.''')
+
+    parser.add_argument('--newStationHashes', nargs=1, type=str, required=True, help='''\
+    Full path of the station hashes file of the current field data file (written by 02a-field-delta.py).''')
+
+    parser.add_argument('--matchupDir', nargs=1, type=str, required=True, help='''\
+    Full path of the parent directory of the satellite specific matchup directories.''')
+
+    parser.add_argument('--satFileDir', nargs=1, type=str, required=True, help='''\
+    Full path of the parent directory in which the satellite specific L2 files are saved.''')
+
+    parser.add_argument('--stateDb', nargs=1, type=str, required=False, help='''\
+    OPTIONAL: Full path of the SQLite run state database (see state_support.py). The state of the removed datarows and L2 files is deleted.''')
+
+    args=parser.parse_args()
+    dict_args=vars(args)
+
+    granlinks_fp = dict_args['L1aGranlinksFile'][0]
+    urls_fp = dict_args['downloadUrlsFile'][0]
+
+    empty = pd.DataFrame({column: pd.Series(dtype=object if dtype == 'str' else dtype) for column,dtype in schemas['L1a-granlinks'].items()})
+    previous_links = read_table(granlinks_fp, 'L1a-granlinks') if os.path.isfile(granlinks_fp) else empty
+    delta_links = read_table(dict_args['L1aGranlinksDelta'][0], 'L1a-granlinks')
+    previous_urls = read_table(urls_fp, 'download-urls') if os.path.isfile(urls_fp) else empty[list(schemas['download-urls'])]
+
+    # Stations whose field data is unchanged keep their links; all other links of the previous run are replaced or dropped:
+    previous_hashes = read_table(dict_args['stationHashes'][0], 'station-hashes') if os.path.isfile(dict_args['stationHashes'][0]) else None
+    current_hashes = read_table(dict_args['newStationHashes'][0], 'station-hashes')
+    unchanged = set()
+    if previous_hashes is not None:
+        merged_hashes = previous_hashes.merge(current_hashes, on='station', suffixes=('_previous',''))
+        unchanged = set(merged_hashes.loc[merged_hashes['hash_previous'] == merged_hashes['hash'], 'station'])
+
+    kept = previous_links['station'].isin(unchanged)
+    links = pd.concat([previous_links.loc[kept], delta_links], ignore_index=True)
+    urls = download_list.unique_granules(links)
+
+    # Matchups of changed and removed stations:
+    satellite_names = {'S':'seawifs','A':'aqua','T':'terra','VS':'snpp','V1J':'jpss1','V2J':'jpss2'}
+    stale_matchups = list(previous_links.loc[~kept, ['station','granid']].itertuples(index=False, name=None))
+    for station, granid in stale_matchups:
+        datarow_fp = os.path.join(dict_args['matchupDir'][0], satellite_names.get(granid[0:-13], ''), station + '_' + granid + '.csv')
+        if os.path.isfile(datarow_fp):
+            os.remove(datarow_fp)
+
+    # Granules already processed whose bounding box grew:
+    bounds = urls.merge(previous_urls, on='granid', suffixes=('','_previous'))
+    expanded = bounds.loc[(bounds['wlon'] < bounds['wlon_previous']) | (bounds['slat'] < bounds['slat_previous']) | \
+                          (bounds['elon'] > bounds['elon_previous']) | (bounds['nlat'] > bounds['nlat_previous']), 'granid'].tolist()
+    for granid in expanded:
+        l2_fp = l2_filepath(dict_args['satFileDir'][0], satellite_names.get(granid[0:-13], ''), granid)
+        if os.path.isfile(l2_fp):
+            os.remove(l2_fp)
+
+    if dict_args['stateDb']:
+        import state_support
+        conn = state_support.connect(dict_args['stateDb'][0])
+        state_support.delete_matchups(conn, stale_matchups)
+        state_support.delete_granules(conn, expanded)
+
+    edit_L2_urls.write_L1a_granlinks(links, granlinks_fp)
+    download_list.write_download_urls(urls, urls_fp)
+
+    print('L1a granule links: ', len(links), ' (', int(kept.sum()), ' kept, ', len(delta_links), ' new), matchups removed: ', len(stale_matchups), \
+          ', granules: ', len(urls), ' (', len(set(urls['granid']) - set(previous_urls['granid'])), ' new, ', len(expanded), ' to reprocess with an expanded bounding box)')
+
+if __name__ == "__main__":
+    import telemetry_support
+    telemetry_support.run_main(main)
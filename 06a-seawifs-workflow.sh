@@ -28,6 +28,20 @@ do
     esac
 done
 
+# Commands are run through telemetry_support.py, which records their timing and resources to the telemetry log
+# if MATCHUP_TELEMETRY is set (see telemetry_support.py). Otherwise they are run directly.
+telemetrySupport=$(cd $(dirname $0) && pwd)/telemetry_support.py
+stage=$(basename $0 .sh)
+step() {
+	local name=$1
+	shift
+	if [[ -n $MATCHUP_TELEMETRY ]]; then
+		python $telemetrySupport --stage $stage --step $name --granid ${granid:-$base} -- "$@"
+	else
+		"$@"
+	fi
+}
+
 #-----------------------------------
 # Downloading file
 #-----------------------------------
@@ -68,7 +82,7 @@ cd $savedir
 #NB: user credentials in ~/.urs_cookies
 if [[ ! -f $savedir$filename ]]; then
 	echo "***** Downloading " $filename " *****"
-	wget --load-cookies=$cookieFile --auth-no-challenge=on \
+	step wget wget --load-cookies=$cookieFile --auth-no-challenge=on \
 	--directory-prefix=$savedir --content-disposition -o $outputlog $granlink
 	wgetL1AStatus=$?
 fi
@@ -80,7 +94,7 @@ if [[ wgetL1AStatus -eq 0 ]]; then
 	echo "***** Processing " $base " *****"
 	
 	#unzip
-	bunzip2 $filename
+	step bunzip2 bunzip2 $filename
 
 		
 	#making par file by combining anc with the defaults and filenames
@@ -96,7 +110,7 @@ if [[ wgetL1AStatus -eq 0 ]]; then
 	cat $tprfile $defaultpar > $parfile
 
 	#L1B to L2
-	l2gen par=$parfile >> $outputlog
+	step l2gen l2gen par=$parfile >> $outputlog
 	l2Status=$?
 
 	#removing unneeded files
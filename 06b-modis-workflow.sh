@@ -15,8 +15,10 @@
 # -S: satellite directory filepath including trailing slash
 # -p: par filepath, name, and extension
 # -c: earth data login cookies file including path and filename
+# -a: OPTIONAL ancillary cache directory written by 06f-prefetch-ancillary.py. If the granule's
+#     .anc fragment is cached there, getanc is not called.
 
-while getopts g:S:p:c:w:s:e:n: flag
+while getopts g:S:p:c:w:s:e:n:a: flag
 do
     case "${flag}" in
         g) granlink=${OPTARG};;
@@ -27,9 +29,24 @@ do
         s) slat=${OPTARG};;
         e) elon=${OPTARG};;
         n) nlat=${OPTARG};;
+        a) ancDir=${OPTARG};;
     esac
 done
 
+# Commands are run through telemetry_support.py, which records their timing and resources to the telemetry log
+# if MATCHUP_TELEMETRY is set (see telemetry_support.py). Otherwise they are run directly.
+telemetrySupport=$(cd $(dirname $0) && pwd)/telemetry_support.py
+stage=$(basename $0 .sh)
+step() {
+	local name=$1
+	shift
+	if [[ -n $MATCHUP_TELEMETRY ]]; then
+		python $telemetrySupport --stage $stage --step $name --granid ${granid:-$base} -- "$@"
+	else
+		"$@"
+	fi
+}
+
 #-----------------------------------
 # Downloading file
 #-----------------------------------
@@ -67,13 +84,22 @@ fi
 
 savedir=$satDir/$satellite/$year/$doy/
 mkdir -p $savedir
+
+#use the prefetched ancillary par fragment if it exists
+ancfile=$ancDir/$satellite/$year/$doy/$base.anc
+if [[ -n $ancDir && -f $ancfile ]]; then
+	ancCached=1
+else
+	ancCached=0
+fi
+
 cd $savedir
 
 #download L1A file if it doesn't already exist
 #NB: user credentials in ~/.urs_cookies
 if [[ ! -f $savedir$filename ]]; then
 	echo "***** Downloading " $filename " *****"  
-	wget --load-cookies=$cookieFile --auth-no-challenge=on \
+	step wget wget --load-cookies=$cookieFile --auth-no-challenge=on \
 	--directory-prefix=$savedir --content-disposition -o $outputlog $granlink
 	wgetL1AStatus=$?
 fi
@@ -85,15 +111,17 @@ if [[ wgetL1AStatus -eq 0 ]]; then
 	echo "***** Processing " $base " *****"
 
 	#unzip
-	bunzip2 $filename
+	step bunzip2 bunzip2 $filename
 
-    getanc $L1Afile > $outputlog ##SRP added this line to help process Terra files
+	if [[ $ancCached -eq 0 ]]; then
+		step getanc getanc $L1Afile > $outputlog ##SRP added this line to help process Terra files
+	fi
 
-	modis_GEO $L1Afile -o $geofile --refreshDB --verbose >> $outputlog
+	step modis_GEO modis_GEO $L1Afile -o $geofile --refreshDB --verbose >> $outputlog
 	geoStatus=$?
 
 	if [[ $geoStatus -eq 0 ]]; then
-		modis_L1A_extract --verbose $L1Afile --geofile=$geofile \
+		step modis_L1A_extract modis_L1A_extract --verbose $L1Afile --geofile=$geofile \
 		-w $wlon -s $slat -e $elon -n $nlat \
 		-o $L1Asubfile --extract_geo=$geosubfile >> $outputlog
 		extractStatus=$?
@@ -102,10 +130,13 @@ if [[ wgetL1AStatus -eq 0 ]]; then
 			echo "successful extraction of " $L1Afile	
 			
 			#L1A to L1B
-			modis_L1B $L1Asubfile $geosubfile --del-hkm --del-qkm --okm=$L1Bfile >> $outputlog
+			step modis_L1B modis_L1B $L1Asubfile $geosubfile --del-hkm --del-qkm --okm=$L1Bfile >> $outputlog
 
 			#getting ancillary data
-			getanc $L1Bfile > $outputlog
+			if [[ $ancCached -eq 0 ]]; then
+				step getanc getanc $L1Bfile > $outputlog
+				ancfile=${L1Bfile}.anc
+			fi
             #getanc T2010285143500.L1A_LAC > $outputlog
 			
 			#making par file by combining anc with the defaults and filenames
@@ -115,15 +146,17 @@ if [[ wgetL1AStatus -eq 0 ]]; then
 				ofile1=$L2file
 			EOF
 			
-			cat $tprfile $defaultpar ${L1Bfile}.anc > $parfile
+			cat $tprfile $defaultpar $ancfile > $parfile
 			
 			#L1B to L2
-			l2gen par=$parfile >> $outputlog
+			step l2gen l2gen par=$parfile >> $outputlog
 			l2Status=$?
 
 			#removing unneeded files
 			rm $tprfile
-			rm $L1Bfile.anc
+			if [[ $ancCached -eq 0 ]]; then
+				rm $L1Bfile.anc
+			fi
 			rm $L1Afile
 			rm $geofile
 			rm $L1Bfile
@@ -146,7 +179,9 @@ if [[ wgetL1AStatus -eq 0 ]]; then
 		rm $L1Afile
 		echo "ERROR: GEO errors for " $L1Afile
 	fi
-    rm $L1Afile.anc #SRP added this line
+	if [[ $ancCached -eq 0 ]]; then
+		rm $L1Afile.anc #SRP added this line
+	fi
 else
 	echo "ERROR: wget fail for " $filename
 fi
@@ -0,0 +1,121 @@
+## This script prefetches the ancillary (met/ozone) data for every MODIS granule in a satellite specific download list.
+## Granules acquired close together in time share the same ancillary files, so getanc is called once per time bucket
+## (default one hour) rather than twice per granule inside 06b-modis-workflow.sh.
+## The resulting .anc par fragments are cached as: ancCacheDir/satellite/year/doy/granid.anc
+## 06b-modis-workflow.sh uses the cached fragment when it is given the cache directory (-a flag) and it exists.
+
+def main():
+
+    import argparse
+    import os
+    from collections import OrderedDict
+    from table_support import read_table
+
+
+    parser = argparse.ArgumentParser(description='''\
+      This script reads a satellite specific list of unique L1a granules (output of 05-create-L1a-download-list.py), groups the granules \
+      by day and by time bucket, calls getanc once per bucket and writes one .anc par fragment per granule into the ancillary cache directory. \
+      Granules that straddle a bucket boundary are resolved individually. Only MODIS (aqua, terra) granules are supported, since they are \
+      the only granules processed with getanc in this workflow.''')
+
+    parser.add_argument('--downloadUrlsFile', nargs=1, type=str, required=True, help='''\
+    Full path, name, and extension of the satellite specific csv containing unique L1a granules.''')
+
+    parser.add_argument('--satellite', nargs=1, type=str, required=True, choices=['aqua','terra'], help='''\
+    Name of the satellite the download list belongs to.''')
+
+    parser.add_argument('--ancCacheDir', nargs=1, type=str, required=True, help='''\
+    Full path of the directory in which to cache the ancillary par fragments. Created if it does not already exist.''')
+
+    parser.add_argument('--bucketMinutes', nargs=1, type=int, default=([60]), help='''\
+    OPTIONAL: Length of the time bucket, in minutes, over which granules share one getanc lookup. Default is 60 minutes, which matches \
+    the hourly GMAO MERRA2 met/ozone files used by current ocssw versions.''')
+
+    parser.add_argument('--granuleMinutes', nargs=1, type=int, default=([5]), help='''\
+    OPTIONAL: Duration of a granule in minutes. Default is 5 minutes (MODIS).''')
+
+    args=parser.parse_args()
+    dict_args=vars(args)
+
+    urls_fp = dict_args['downloadUrlsFile'][0]
+    satellite = dict_args['satellite'][0]
+    cacheDir = dict_args['ancCacheDir'][0]
+    bucket_minutes = dict_args['bucketMinutes'][0]
+    granule_minutes = dict_args['granuleMinutes'][0]
+
+    urls = read_table(urls_fp, 'download-urls')
+
+    # Group granules by bucket. Granules that cross a bucket boundary get a bucket of their own.
+    buckets = OrderedDict()
+    for granid in urls['granid'].unique():
+        start, stop = granule_times(granid, granule_minutes)
+        bucket_start, bucket_stop = time_bucket(start, bucket_minutes)
+        if stop > bucket_stop:
+            bucket_start, bucket_stop = start, stop
+        buckets.setdefault((bucket_start, bucket_stop), []).append(granid)
+
+    print('Number of granules: ', len(urls['granid'].unique()), ' Number of getanc lookups: ', len(buckets))
+
+    for (bucket_start, bucket_stop), granids in buckets.items():
+
+        # Skip the lookup entirely if every granule in the bucket is already cached:
+        if all(os.path.isfile(anc_cache_path(cacheDir, satellite, granid)) for granid in granids):
+            continue
+
+        anc_fragment = run_getanc(bucket_start, bucket_stop, satellite)
+        if anc_fragment is None:
+            print('ERROR: getanc failed for ', satellite, bucket_start.strftime('%Y%j%H%M%S'), '. Granules will fall back to getanc during processing.')
+            continue
+
+        for granid in granids:
+            anc_fp = anc_cache_path(cacheDir, satellite, granid)
+            os.makedirs(os.path.dirname(anc_fp), exist_ok=True)
+            with open(anc_fp, 'w') as file:
+                file.write(anc_fragment)
+
+
+def granule_times(granid, granule_minutes):
+    ''' Return the start and stop datetimes of a granule given its granule id, i.e. A2010285143500 '''
+    from datetime import datetime, timedelta
+    start = datetime.strptime(granid[-13:], '%Y%j%H%M%S')
+    stop = start + timedelta(minutes=granule_minutes)
+    return start, stop
+
+def time_bucket(dt, bucket_minutes):
+    ''' Return the start and stop datetimes of the bucket of length bucket_minutes containing dt. Buckets are aligned to midnight. '''
+    from datetime import timedelta
+    midnight = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    bucket_idx = int((dt - midnight).total_seconds() // (bucket_minutes*60))
+    bucket_start = midnight + timedelta(minutes=bucket_idx*bucket_minutes)
+    bucket_stop = bucket_start + timedelta(minutes=bucket_minutes)
+    return bucket_start, bucket_stop
+
+def anc_cache_path(cacheDir, satellite, granid):
+    ''' Path of the cached .anc par fragment for a granule: cacheDir/satellite/year/doy/granid.anc '''
+    year = granid[-13:-9]
+    doy = granid[-9:-6]
+    return cacheDir + '/' + satellite + '/' + year + '/' + doy + '/' + granid + '.anc'
+
+def run_getanc(start, stop, satellite):
+    ''' Run getanc for the time range start-stop within a scratch directory and return the contents of the .anc file it writes,
+    or None if no .anc file was written. As in 06b-modis-workflow.sh, the getanc exit status is not checked, since a non-zero status
+    only reports which ancillary files fell back to climatology. getanc downloads the ancillary files themselves into the ocssw ancillary directory, so the paths
+    listed in the returned fragment remain valid for later l2gen runs. '''
+    import os
+    import subprocess
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cmd = ['getanc', '--start', start.strftime('%Y%j%H%M%S'), '--stop', stop.strftime('%Y%j%H%M%S'), '--mission', satellite]
+        subprocess.run(cmd, cwd=tmpdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        anc_files = [f for f in os.listdir(tmpdir) if f.endswith('.anc')]
+        if len(anc_files) != 1:
+            return None
+        with open(tmpdir + '/' + anc_files[0], 'r') as file:
+            anc_fragment = file.read()
+
+    return anc_fragment
+
+if __name__ == "__main__":
+    import telemetry_support
+    telemetry_support.run_main(main)
@@ -0,0 +1,46 @@
+## This script writes an l2gen par file for a processing run. It copies a default par file (06d-pardefaults-sst.par or
+## 06e-pardefaults.par) and replaces its l2prod1 list with only the products requested in the product manifest.
+
+def main():
+
+    import argparse
+    from product_support import read_product_manifest, l2prod_list
+
+
+    parser = argparse.ArgumentParser(description='''\
+      This script generates the l2gen par file for a processing run from a default par file and the product manifest \
+      (06g-product-manifest.txt). The l2prod1 entry of the default par file is replaced by the manifest products. SST products \
+      are dropped if the default par file sets proc_sst=0. All other par entries are copied unchanged.''')
+
+    parser.add_argument('--defaultPar', nargs=1, type=str, required=True, help='''\
+    Full path, name, and extension of the default par file.''')
+
+    parser.add_argument('--productManifest', nargs=1, type=str, required=True, help='''\
+    Full path, name, and extension of the product manifest.''')
+
+    parser.add_argument('--ofile', nargs=1, type=str, required=True, help='''\
+    Full path, name, and extension of the par file to write.''')
+
+    args=parser.parse_args()
+    dict_args=vars(args)
+
+    with open(dict_args['defaultPar'][0], 'r') as file:
+        par_lines = [line.strip() for line in file if line.strip()]
+
+    par = dict(line.split('=', 1) for line in par_lines if '=' in line)
+    proc_sst = par.get('proc_sst', '0').strip() == '1'
+
+    products = read_product_manifest(dict_args['productManifest'][0])
+    l2prod1 = l2prod_list(products, proc_sst)
+
+    with open(dict_args['ofile'][0], 'w') as file:
+        file.write('l2prod1=' + l2prod1 + '\n')
+        for line in par_lines:
+            if line.split('=', 1)[0].strip() != 'l2prod1':
+                file.write(line + '\n')
+
+    print('l2prod1=' + l2prod1)
+
+if __name__ == "__main__":
+    import telemetry_support
+    telemetry_support.run_main(main)
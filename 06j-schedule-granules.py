@@ -0,0 +1,184 @@
+## This script processes the L1a granules of all satellites to L2 from a single queue.
+## Rather than processing all seawifs granules, then all aqua granules, etc., each capped at a fixed number of jobs,
+## granules from every satellite are interleaved and packed against the cpu and memory of the PBS allocation using the
+## per-satellite costs declared in 06i-sensor-costs.csv. Granules matched up to the most field records are processed first.
+## If a state database is given, each granule's status, timings, failure reason, and L2 path are recorded in it, and granules
+## already recorded as done are skipped without checking the filesystem.
+
+def main():
+
+    import argparse
+    import os
+    import subprocess
+    import tempfile
+    import time
+    from datetime import datetime
+    import pandas as pd
+    from table_support import read_table, satellite_path
+    from workflow_support import l2_filepath
+
+
+    parser = argparse.ArgumentParser(description='''\
+      This script schedules the satellite specific workflow scripts (06a-06c) for every granule in the satellite specific download lists \
+      from one queue. Jobs are started whenever the cpus and memory they declare in the sensor costs file fit within the remaining allocation. \
+      Granules are prioritized by the number of field records they match up to, and granules whose L2 file already exists are skipped.''')
+
+    parser.add_argument('--downloadUrlsFile', nargs=1, type=str, required=True, help='''\
+    Full path, name, and extension of csv containing unique L1a granules for all satellites (output of 05-create-L1a-download-list.py). \
+    The satellite specific files are located by appending the satellite name to this file name, as done by 05-create-L1a-download-list.py.''')
+
+    parser.add_argument('--L1aGranlinksFile', nargs=1, type=str, required=True, help='''\
+    Full path of file that contains the field records matched up to the L1a granules (output of 04-edit-L2-urls.py). Used to prioritize granules.''')
+
+    parser.add_argument('--sensorCosts', nargs=1, type=str, required=True, help='''\
+    Full path, name, and extension of the sensor costs csv (06i-sensor-costs.csv) declaring the workflow script, sst usage, cpus, and memory (gb) of one job per satellite. \
+    Only the satellites listed in this file are processed.''')
+
+    parser.add_argument('--scriptDir', nargs=1, type=str, required=True, help='''\
+    Full path of the directory containing the satellite workflow scripts.''')
+
+    parser.add_argument('--satFileDir', nargs=1, type=str, required=True, help='''\
+    Full path of the parent directory in which the satellite specific L2 files are saved.''')
+
+    parser.add_argument('--parFile', nargs=1, type=str, required=True, help='''\
+    Full path of the par file for satellites processed without sst.''')
+
+    parser.add_argument('--parFileSST', nargs=1, type=str, required=True, help='''\
+    Full path of the par file for satellites processed with sst.''')
+
+    parser.add_argument('--cookieFile', nargs=1, type=str, required=True, help='''\
+    Full path of the earthdata login cookies file.''')
+
+    parser.add_argument('--ancCacheDir', nargs=1, type=str, required=False, help='''\
+    OPTIONAL: Ancillary cache directory written by 06f-prefetch-ancillary.py, passed on to the modis workflow.''')
+
+    parser.add_argument('--ncpus', nargs=1, type=int, default=([40]), help='''\
+    OPTIONAL: Number of cpus in the allocation. Make sure this agrees with the submission script. Default is 40.''')
+
+    parser.add_argument('--mem', nargs=1, type=float, default=([512]), help='''\
+    OPTIONAL: Memory of the allocation in gb. Make sure this agrees with the submission script. Default is 512.''')
+
+    parser.add_argument('--stateDb', nargs=1, type=str, required=False, help='''\
+    OPTIONAL: Full path of the SQLite run state database (see state_support.py). Granules recorded as done are skipped, and the outcome of every job is recorded.''')
+
+    args=parser.parse_args()
+    dict_args=vars(args)
+
+    urls_fp = dict_args['downloadUrlsFile'][0]
+    scriptDir = dict_args['scriptDir'][0]
+    satFileDir = dict_args['satFileDir'][0]
+    ancCacheDir = dict_args['ancCacheDir'][0] if dict_args['ancCacheDir'] else None
+    ncpus = dict_args['ncpus'][0]
+    mem = dict_args['mem'][0]
+
+    conn = None
+    done_granids = set()
+    known_granids = set()
+    if dict_args['stateDb']:
+        import state_support
+        conn = state_support.connect(dict_args['stateDb'][0])
+        done_granids = state_support.granules_with_status(conn, ['done'])
+        known_granids = state_support.granules_with_status(conn, ['running','done','failed'])
+
+    costs = pd.read_csv(dict_args['sensorCosts'][0])
+    granlinks = read_table(dict_args['L1aGranlinksFile'][0], 'L1a-granlinks')
+    num_matchups = granlinks['granid'].value_counts()
+
+    # Build one queue of jobs for all satellites:
+    queue = []
+    for _, cost in costs.iterrows():
+        sat_urls_fp = satellite_path(urls_fp, cost['satellite'])
+        if not os.path.isfile(sat_urls_fp) or os.path.getsize(sat_urls_fp) == 0:
+            continue
+        urls = read_table(sat_urls_fp, 'download-urls')
+
+        for sat_idx, granule in enumerate(urls.itertuples(index=False)):
+            # Only granules unknown to the state database are checked on the filesystem:
+            l2_fp = l2_filepath(satFileDir, cost['satellite'], granule.granid)
+            if granule.granid in done_granids:
+                continue
+            if granule.granid not in known_granids and os.path.isfile(l2_fp):
+                print(granule.granid + '.L2 already exists')
+                if conn is not None:
+                    state_support.set_granule(conn, granule.granid, cost['satellite'], 'done', output_path=l2_fp)
+                continue
+
+            parFile = dict_args['parFileSST'][0] if cost['sst'] == 1 else dict_args['parFile'][0]
+            cmd = [scriptDir + '/' + cost['workflow'], '-g', granule.granurl, '-S', satFileDir, '-p', parFile, '-c', dict_args['cookieFile'][0], \
+                   '-w', str(granule.wlon), '-s', str(granule.slat), '-e', str(granule.elon), '-n', str(granule.nlat)]
+            if 'viirs' in cost['workflow']:
+                cmd = cmd[0:1] + ['-i', granule.granid] + cmd[1:]
+            if 'modis' in cost['workflow'] and ancCacheDir:
+                cmd = cmd + ['-a', ancCacheDir]
+
+            queue.append({'granid':granule.granid, 'satellite':cost['satellite'], 'cmd':cmd, 'ncpus':cost['ncpus'], 'mem':cost['mem_gb'], \
+                          'priority':(-num_matchups.get(granule.granid, 0), sat_idx)})
+
+    # Most matchups first. Ties are broken by position within the satellite's list, which interleaves the satellites.
+    queue.sort(key=lambda job: job['priority'])
+    print('Number of granules to process: ', len(queue))
+
+    running = []
+    free_cpus = ncpus
+    free_mem = mem
+    while queue or running:
+
+        # Collect finished jobs and release their resources:
+        for job in [job for job in running if job['proc'].poll() is not None]:
+            running.remove(job)
+            free_cpus += job['ncpus']
+            free_mem += job['mem']
+            job['log'].seek(0)
+            output = job['log'].read().decode(errors='replace')
+            job['log'].close()
+            print(output, end='')
+            if conn is not None:
+                record_granule(conn, job, output, satFileDir)
+
+        # Start jobs in priority order. When the head of the queue does not fit, its resources are reserved
+        # and only jobs that fit alongside the reservation are backfilled, so large jobs are not starved.
+        reserved = False
+        reserved_cpus, reserved_mem = 0, 0
+        for job in list(queue):
+            if free_cpus - reserved_cpus <= 0:
+                break
+            if job['ncpus'] > ncpus or job['mem'] > mem:
+                print('ERROR: ', job['granid'], ' requires more resources than the allocation. Skipping...')
+                queue.remove(job)
+                continue
+            if job['ncpus'] <= free_cpus - reserved_cpus and job['mem'] <= free_mem - reserved_mem:
+                job['log'] = tempfile.TemporaryFile()
+                job['started'] = datetime.now()
+                job['proc'] = subprocess.Popen(job['cmd'], stdout=job['log'], stderr=subprocess.STDOUT)
+                if conn is not None:
+                    state_support.set_granule(conn, job['granid'], job['satellite'], 'running', started=job['started'])
+                running.append(job)
+                queue.remove(job)
+                free_cpus -= job['ncpus']
+                free_mem -= job['mem']
+            elif not reserved:
+                reserved = True
+                reserved_cpus, reserved_mem = job['ncpus'], job['mem']
+
+        time.sleep(1)
+
+
+def record_granule(conn, job, output, satFileDir):
+    ''' Record the outcome of a finished workflow job in the state database. The workflow scripts do not return a failure exit status,
+    so a granule is done if its L2 file was produced; otherwise the last ERROR line of the job output is recorded as the failure reason. '''
+    import os
+    from datetime import datetime
+    import state_support
+    from workflow_support import l2_filepath
+
+    l2_fp = l2_filepath(satFileDir, job['satellite'], job['granid'])
+    if os.path.isfile(l2_fp):
+        state_support.set_granule(conn, job['granid'], job['satellite'], 'done', started=job['started'], finished=datetime.now(), output_path=l2_fp)
+    else:
+        errors = [line.strip() for line in output.splitlines() if 'ERROR' in line]
+        failure_reason = errors[-1] if errors else 'L2 file not produced. Exit status: ' + str(job['proc'].returncode)
+        state_support.set_granule(conn, job['granid'], job['satellite'], 'failed', started=job['started'], finished=datetime.now(), failure_reason=failure_reason)
+
+if __name__ == "__main__":
+    import telemetry_support
+    telemetry_support.run_main(main)
@@ -0,0 +1,91 @@
+## This script splits the satellite processing (06) and matchup (09) workload into N balanced shards for a PBS array job.
+## Granules are assigned to shards as a whole: a shard's download list and its matchup granule links refer to the same granules,
+## so each array index can process its L2 files and then its matchups without waiting on any other index.
+
+def main():
+
+    import argparse
+    import heapq
+    import os
+    import pandas as pd
+    from table_support import read_table, write_table
+
+
+    parser = argparse.ArgumentParser(description='''\
+      This script splits the unique L1a download list and the L1a granule links into N shards for the PBS array job submission \
+      (01b-shard-submission.sh). Each granule is weighted by the expected download size of its satellite (l1a_mb in 06i-sensor-costs.csv: one \
+      value per satellite, as the download list holds no file sizes, so this term only differs between satellites) and by the number of field \
+      records matched up to it. Granules are assigned, largest first, to the shard with the lowest load, where the load \
+      sums each granule's share of the total download size and its share of the total number of matchups. The output files mirror the \
+      05-download-urls and 04-L1a-granlinks files (including the satellite specific files) with a -shardK suffix.''')
+
+    parser.add_argument('--downloadUrlsFile', nargs=1, type=str, required=True, help='''\
+    Full path, name, and extension of csv containing unique L1a granules for all satellites (output of 05-create-L1a-download-list.py).''')
+
+    parser.add_argument('--L1aGranlinksFile', nargs=1, type=str, required=True, help='''\
+    Full path of file that contains the field records matched up to the L1a granules (output of 04-edit-L2-urls.py).''')
+
+    parser.add_argument('--sensorCosts', nargs=1, type=str, required=True, help='''\
+    Full path, name, and extension of the sensor costs csv (06i-sensor-costs.csv).''')
+
+    parser.add_argument('--nshards', nargs=1, type=int, required=True, help='''\
+    Number of shards. Must agree with the size of the PBS array (-J 0-nshards-1).''')
+
+    parser.add_argument('--shardDir', nargs=1, type=str, required=True, help='''\
+    Full path of the directory in which to write the shard files. Created if it does not already exist.''')
+
+    args=parser.parse_args()
+    dict_args=vars(args)
+
+    nshards = dict_args['nshards'][0]
+    shardDir = dict_args['shardDir'][0]
+    urls_fn = os.path.splitext(os.path.basename(dict_args['downloadUrlsFile'][0]))[0]
+    granlinks_fn = os.path.splitext(os.path.basename(dict_args['L1aGranlinksFile'][0]))[0]
+
+    if nshards < 1:
+        parser.error('--nshards must be at least 1. Received --nshards = ' + str(nshards))
+    os.makedirs(shardDir, exist_ok=True)
+
+    satellite_names = {'S':'seawifs','A':'aqua','T':'terra','VS':'snpp','V1J':'jpss1','V2J':'jpss2'}
+
+    costs = pd.read_csv(dict_args['sensorCosts'][0]).set_index('satellite')
+    urls = read_table(dict_args['downloadUrlsFile'][0], 'download-urls')
+    granlinks = read_table(dict_args['L1aGranlinksFile'][0], 'L1a-granlinks')
+
+    urls['satellite'] = urls['granid'].str[0:-13].map(satellite_names)
+    urls['size'] = urls['satellite'].map(costs['l1a_mb']).fillna(costs['l1a_mb'].max())
+    urls['matchups'] = urls['granid'].map(granlinks['granid'].value_counts()).fillna(0)
+    urls['cost'] = urls['size']/max(urls['size'].sum(),1) + urls['matchups']/max(urls['matchups'].sum(),1)
+
+    # Longest processing time first: assign each granule to the currently least loaded shard.
+    loads = [(0.0, shard) for shard in range(nshards)]
+    heapq.heapify(loads)
+    shard_of = {}
+    for granid, cost in urls.sort_values('cost', ascending=False)[['granid','cost']].itertuples(index=False):
+        load, shard = heapq.heappop(loads)
+        shard_of[granid] = shard
+        heapq.heappush(loads, (load + cost, shard))
+
+    urls['shard'] = urls['granid'].map(shard_of)
+    granlinks['shard'] = granlinks['granid'].map(shard_of)
+
+    for shard in range(nshards):
+        shard_urls = urls.loc[urls['shard']==shard, ['granid','granurl','wlon','slat','elon','nlat']]
+        shard_granlinks = granlinks.loc[granlinks['shard']==shard, ['station','granid','granurl','wlon','slat','elon','nlat']]
+
+        urls_base = shardDir + '/' + urls_fn + '-shard' + str(shard)
+        granlinks_base = shardDir + '/' + granlinks_fn + '-shard' + str(shard)
+        # The shard files are read line by line by the array job script, so they are always written as csv:
+        write_table(shard_urls, urls_base + '.csv', 'download-urls')
+        write_table(shard_granlinks, granlinks_base + '.csv', 'L1a-granlinks')
+
+        for key in satellite_names:
+            write_table(shard_urls.loc[shard_urls['granid'].str[0:-13]==key], urls_base + '-' + satellite_names[key] + '.csv', 'download-urls')
+            write_table(shard_granlinks.loc[shard_granlinks['granid'].str[0:-13]==key], granlinks_base + '-' + satellite_names[key] + '.csv', 'L1a-granlinks')
+
+        print('Shard ', shard, ': ', len(shard_urls), ' granules, ', len(shard_granlinks), ' matchups, ', \
+              urls.loc[urls['shard']==shard, 'size'].sum(), ' MB expected download')
+
+if __name__ == "__main__":
+    import telemetry_support
+    telemetry_support.run_main(main)
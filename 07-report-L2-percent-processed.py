@@ -1,9 +1,9 @@
 def main():
     
     import argparse
-    import pandas as pd
     import numpy as np
     import os
+    from table_support import read_table
     
     
     parser = argparse.ArgumentParser(description='''\
@@ -15,23 +15,32 @@ def main():
     parser.add_argument('--satelliteFileDirectory', nargs=1, type=str, required=True, help='''\
     Full path and name of parent directory containing satellite specific subdirectories in which L2 files have been saved.''')
     
+    parser.add_argument('--stateDb', nargs=1, type=str, required=False, help='''\
+    OPTIONAL: Full path of the SQLite run state database (see state_support.py). If given, the processed granules are read from the database instead of walking the satellite file directory, and the failure reasons are summarized.''')
+    
     args=parser.parse_args()
     dict_args=vars(args)
     
     urls_fp = dict_args['downloadUrlsFile'][0]
     satDir = dict_args['satelliteFileDirectory'][0]
     
-    urls = pd.read_csv(urls_fp, names=['granid','granurl','wlon','slat','elon','nlat'])
+    urls = read_table(urls_fp, 'download-urls')
     
     num_urls = len(urls)
     
     unique_sats = np.unique([gid[0:-13] for gid in urls['granid']])
     
     l2_files = []
-    for root, dirs, files in os.walk(satDir):
-        for file in files:
-            if file.endswith('.L2'):
-                l2_files.append(file)
+    if dict_args['stateDb']:
+        import state_support
+        conn = state_support.connect(dict_args['stateDb'][0])
+        done_granids = state_support.granules_with_status(conn, ['done'])
+        l2_files = [gid + '.L2' for gid in urls['granid'] if gid in done_granids]
+    else:
+        for root, dirs, files in os.walk(satDir):
+            for file in files:
+                if file.endswith('.L2'):
+                    l2_files.append(file)
                 
     tot_percent_processed = len(l2_files)*100/num_urls
     
@@ -42,5 +51,11 @@ def main():
         sat_l2_files = [f for f in l2_files if sat in f]
         sat_percent_processed = len(sat_l2_files)*100/num_sat_urls
         print('Percentage of ', sat, ' files that successfully processed to L2: ', sat_percent_processed)
+    
+    if dict_args['stateDb']:
+        for failure_reason, count in conn.execute('SELECT failure_reason, COUNT(*) FROM granules WHERE status = ? GROUP BY failure_reason ORDER BY COUNT(*) DESC', ['failed']):
+            print('Failed granules: ', count, ' Reason: ', failure_reason)
         
-if __name__ == "__main__": main()
\ No newline at end of file
+if __name__ == "__main__":
+    import telemetry_support
+    telemetry_support.run_main(main)
@@ -1,8 +1,7 @@
 def main():
     
     import argparse
-    import pandas as pd
-    import numpy as np
+    from table_support import read_table, write_table, write_field_index
     
     
     parser = argparse.ArgumentParser(description='''\
@@ -22,6 +21,15 @@ def main():
     File path and name (excluding extension) for the output files. The satellite name will be appended to this filepath \
       and base name.''')
 
+    parser.add_argument('--no_index', default=False, action='store_true', help='''\
+    OPTIONAL: Do not write the ID index of the output files (<output file>.idx.arrow and .idx.npy, see table_support.py), through which \
+    09-matchup-datarows.py reads the rows of one station without reading the whole file. The index requires pyarrow: without it, \
+    no index is written (with a warning), as with --no_index.''')
+
+    parser.add_argument('--ofile_extension', nargs=1, type=str, default=(['.csv']), choices=['.csv','.parquet'], help='''\
+    OPTIONAL: Extension, and so format, of the output files (see table_support.py). Default is .csv. Parquet files keep the field data types, \
+      so the many 09-matchup-datarows.py invocations read them without re-parsing the field data.''')
+
     args=parser.parse_args()
     dict_args=vars(args)
     
@@ -31,15 +39,26 @@ def main():
     ofile_base = dict_args['ofile_base_name'][0]
     
     # Read in data files:
-    field = pd.read_csv(field_fp)
-    granfile = pd.read_csv(granfile_fp, names=['station','granid','granurl','wlon','slat','elon','nlat'])
+    field = read_table(field_fp, 'field')
+    granfile = read_table(granfile_fp, 'L1a-granlinks')
+
+    # 09-matchup-datarows.py expects one field row per id:
+    duplicated = field.loc[field[id_col].astype(str).duplicated(), id_col].astype(str).unique()
+    if len(duplicated) > 0:
+        print('WARNING: ', len(duplicated), ' ids are on more than one row of ', field_fp, ', e.g. ', ', '.join(duplicated[0:10]))
     
     # Per Satellite, generate a list of stations in the l2file. Then find the corresponding rows in the field dataframe.
     satellite_names = {'S':'seawifs','A':'aqua','T':'terra','VS':'snpp','V1J':'jpss1','V2J':'jpss2'}
     
     for key in satellite_names:
         sat_stations = granfile.loc[granfile['granid'].str[0:-13]==key, 'station']
-        sat_df = field.loc[field[id_col].isin(sat_stations)]
-        sat_df.to_csv(ofile_base+'-'+satellite_names[key]+'.csv', index=False)
+        # Station ids are read as text; compare them as text to the field ids:
+        sat_df = field.loc[field[id_col].astype(str).isin(sat_stations)]
+        ofile = ofile_base+'-'+satellite_names[key]+dict_args['ofile_extension'][0]
+        write_table(sat_df, ofile, 'field')
+        if not dict_args['no_index']:
+            write_field_index(sat_df, ofile, id_col)
         
-if __name__ == "__main__": main()
\ No newline at end of file
+if __name__ == "__main__":
+    import telemetry_support
+    telemetry_support.run_main(main)
@@ -2,13 +2,19 @@
 ## For a single matchup, it combines the field data with the corresponding satellite data in a single row.
 ## Each matchup is output to a single line csv.
 ## Additionally, for the satellite data, 'pixel grid statistics' are calculated.  A 5x5 grid is drawn around the pixel that nearest matches the field data point by location. The mean, median, standard deviation, and filtered mean and filtered median are reported for the 25 pixels in the grid.
+## Statistics of other window sizes (e.g. 1x1, 3x3, 7x7) can be added to the 5x5 ones with --windows.
+
+# Sampling stride of the coarse nearest pixel search (--navSearch coarse)
+COARSE_STRIDE = 8
 
 def main():
 
     import xarray as xr
-    import numpy as np
     import pandas as pd
     import argparse
+    from datetime import datetime
+    from table_support import read_field_rows
+    from telemetry_support import step
 
 
     parser = argparse.ArgumentParser(description='''\
@@ -25,15 +31,35 @@ def main():
     Full path to the directory where the satellite files are stored.''')
     parser.add_argument('--ofile_excludedMatchupLog', nargs=1, type=str, required=True, help='''\
     Full path and .txt extension of file in which to record matchups excluded due to satellite file import errors or 1km distance.''')
+    parser.add_argument('--productManifest', nargs=1, type=str, required=False, help='''\
+    OPTIONAL: Full path to the product manifest (06g-product-manifest.txt). If given, pixel grid statistics are only calculated for the listed products. By default, statistics are calculated for every variable in the L2 file.''')
+    parser.add_argument('--stateDb', nargs=1, type=str, required=False, help='''\
+    OPTIONAL: Full path of the SQLite run state database (see state_support.py) in which to record the outcome, timing, and output path of this matchup.''')
+    parser.add_argument('--navCache', nargs=1, type=str, required=False, help='''\
+    OPTIONAL: Full path to the directory of the per-granule navigation caches (see nav_cache_support.py). The navigation of each granule is decoded once \
+    into memory-mapped arrays shared by the matchups of the granule, and the nearest pixel search only visits the blocks of pixels near the field point. \
+    By default, every matchup reads the navigation of the L2 file and computes the distance to every pixel.''')
+    parser.add_argument('--windows', nargs='+', type=int, default=[5], help='''\
+    OPTIONAL: Sizes (odd numbers of pixels, e.g. 1 3 5 7) of the square windows over which pixel grid statistics are calculated, in one \
+    pass over the block of the largest window. The 5x5 window is always calculated, and keeps the <variable>_<statistic> column names; \
+    the other windows add <variable>_<statistic>_<size>x<size> columns. Default is 5.''')
+    parser.add_argument('--navSearch', nargs=1, type=str, default=(['full']), choices=['full','coarse'], help='''\
+    OPTIONAL: Nearest pixel search without --navCache. full computes the distance to every pixel of the granule; coarse computes it on every \
+    COARSE_STRIDE-th row and column, then on the window that can hold the nearest pixel (see coarse_pixel_location), and finds the same pixel. \
+    coarse is faster on large granules (full swaths). Default is full.''')
 
     args=parser.parse_args()
     dict_args=vars(args)
-
-    # read in field df and locate the single row containing the unique id read in this iteration/row of the granule-links-full file
-    field = pd.read_csv(dict_args['fieldDf'][0])
-    #field.drop(columns='Unnamed: 0', inplace=True)
-    datarow = field.loc[field['ID']==dict_args['id'][0]].reset_index(drop=True)
-    #maybe put a check here to ensure we only pulled out one row, not more than one
+    started = datetime.now()
+    windows = sorted(set(dict_args['windows']) | {5})
+    if any(size < 1 or size % 2 == 0 for size in windows):
+        parser.error('--windows sizes must be odd and positive')
+
+    # read in the field row containing the unique id read in this iteration/row of the granule-links-full file, through the
+    # ID index written by 08-partition-field-by-satellite.py if there is one (see table_support.py)
+    datarow = read_field_rows(dict_args['fieldDf'][0], dict_args['id'][0])
+    if len(datarow) > 1:
+        print('WARNING: ', len(datarow), ' field rows with ID ', dict_args['id'][0], ' in ', dict_args['fieldDf'][0])
     datarow['granid'] = dict_args['granid'][0]
 
 
@@ -48,38 +74,47 @@ def main():
    
 
     try:
-        satData, satNav = import_satfile(satfiledir)
+        with step('netcdf_open', items=1, granid=granid):
+            if dict_args['navCache']:
+                import nav_cache_support
+                satData = import_satfile(satfiledir, navigation=False)
+                satNav = nav_cache_support.load_nav(dict_args['navCache'][0], granid, satfiledir)
+            else:
+                satData, satNav = import_satfile(satfiledir)
     except (FileNotFoundError, KeyError, AttributeError, OSError):
         print('File import error. Granid: ', granid)
         #print(satfiledir)
         file = open(dict_args['ofile_excludedMatchupLog'][0], 'a+')
         file.write(datarow.ID[0]+','+granid+','+'FIE \n')
         file.close()
+        record_matchup(dict_args, datarow.ID[0], granid, 'excluded', started, failure_reason='FIE')
 
     else:
-        lat_sat, lon_sat = sat_lon_lat(satNav)
-
-        dist_array = haversine(field_lon, field_lat, lon_sat, lat_sat)
-
-        num_rows = dist_array.shape[0]
-        num_cols = dist_array.shape[1]
-        pixel_grid_row_max = num_rows-3
-        pixel_grid_col_max = num_cols-3
-        
-        #check to make sure sat nav is not entirely nan:
+        #nanargmin raises a ValueError if sat nav is entirely nan:
         try:
-            idx = np.nanargmin(dist_array.values)
+            with step('nav_search', items=1, granid=granid):
+                if dict_args['navCache']:
+                    num_rows, num_cols = satNav['latitude'].shape
+                    row, col, idx, min_dist = cached_pixel_location(satNav, field_lat, field_lon)
+                else:
+                    lat_sat, lon_sat = sat_lon_lat(satNav)
+                    num_rows, num_cols = lat_sat.shape
+                    if dict_args['navSearch'][0] == 'coarse':
+                        row, col, idx, min_dist = coarse_pixel_location(lat_sat, lon_sat, field_lat, field_lon)
+                    else:
+                        dist_array = haversine(field_lon, field_lat, lon_sat, lat_sat)
+                        row, col, idx, min_dist = pixel_location(dist_array)
         except (ValueError):
             print('Value Error. SatNav contains only nans. Granid: ', granid)
             file = open(dict_args['ofile_excludedMatchupLog'][0], 'a+')
             file.write(datarow.ID[0]+','+granid+','+'Nav \n')
             file.close()
+            record_matchup(dict_args, datarow.ID[0], granid, 'excluded', started, failure_reason='Nav')
 
         else:
-            row, col, idx, min_dist = pixel_location(dist_array)
-            
             if min_dist<=1: #limit matchups by 1km distance
 
+                # The location flag is set from the 5x5 window
                 grid_idx, location_flag = loc_flag(min_dist, row, col, num_rows, num_cols)
 
                 variable_dict = {'ID':datarow.ID[0]}
@@ -87,49 +122,102 @@ def main():
                 variable_dict['pixel_col'] = col
                 variable_dict['pixel_idx'] = idx
 
-                for var_name in satData.data_vars:
-                    if var_name == 'l2_flags':
-                        continue
-
-                    var_data = satData[var_name]  #Are SST and TOA RRS stored in satData.data_vars?
-                    num_nans, variable_grid = grid_nans(var_data, grid_idx) 
-
-                    num_grid_elem = np.size(variable_grid)  
-
-                    var_flag = variable_flag(num_nans.values, num_grid_elem)
-                    mean, stdev, median = grid_stats(variable_grid, var_flag)
-
-                    filtered_pixels = filter_pixels(variable_grid, mean, stdev)
-                    filtered_mean, filtered_stdev, filtered_pixel_count = filtered_stats(filtered_pixels)
-
-                    variable_dict[var_name + '_mean'] = mean
-                    variable_dict[var_name + '_stdev'] = stdev
-                    variable_dict[var_name + '_median'] = median
-
-                    variable_dict[var_name + '_filtered_mean'] = filtered_mean
-                    variable_dict[var_name + '_filtered_stdev'] = filtered_stdev
+                var_names = list(satData.data_vars)
+                if dict_args['productManifest']:
+                    from product_support import read_product_manifest, select_products
+                    var_names = select_products(var_names, read_product_manifest(dict_args['productManifest'][0]))
 
-                    variable_dict[var_name + '_grid_size'] = num_grid_elem
-                    variable_dict[var_name + '_valid_pixel_count'] = num_grid_elem - num_nans.values
-                    variable_dict[var_name + '_filtered_pixel_count'] = filtered_pixel_count
-
-                    variable_dict[var_name + '_nan_flag'] = var_flag
-                
-                median_cv, cv_flag = Rrs_cv_flag(variable_dict, 0.15)
-                variable_dict['Rrs_410_556_median_cv'] = median_cv
-                variable_dict['cv_flag'] = cv_flag
+                # The Rrs coefficient of variation flag is computed over the merged matchup dataframe (see flag_support.py)
+                with step('stats_kernel', items=len(var_names), granid=granid):
+                    variable_dict.update(pixel_window_stats(satData, var_names, row, col, num_rows, num_cols, windows))
                 variable_dict['location_flag'] = location_flag
                 var_row = pd.DataFrame([variable_dict])
                 compiled_row = datarow.merge(var_row, how = 'outer')
-                compiled_row.to_csv(outputdir + '/' + datarow.ID[0] + '_' + granid + '.csv',index = False)
+                with step('csv_write', items=1, granid=granid):
+                    compiled_row.to_csv(outputdir + '/' + datarow.ID[0] + '_' + granid + '.csv',index = False)
+                record_matchup(dict_args, datarow.ID[0], granid, 'done', started, output_path=outputdir + '/' + datarow.ID[0] + '_' + granid + '.csv')
             else:
                 print('>1km: ID:', datarow.ID[0], 'Granid:', granid)
                 file = open(dict_args['ofile_excludedMatchupLog'][0], 'a+')
                 file.write(datarow.ID[0]+','+granid+','+'1km \n')
                 file.close()
+                record_matchup(dict_args, datarow.ID[0], granid, 'excluded', started, failure_reason='1km')
                 
 
 
+def pixel_window_stats(satData, var_names, row, col, num_rows, num_cols, windows=(5,)):
+    ''' Calculate the pixel grid statistics of each variable in var_names (except l2_flags) over the square windows of the given
+    (odd) sizes centred on the pixel (row, col), clipped at the edges of the granule. The block of the largest window is extracted
+    once per variable, the blocks of the variables of the same type are stacked, and the statistics of each window (nested in the
+    block) are calculated for all of them at once. Returns a dictionary of the statistics, keyed <var_name>_<statistic> for the 5x5
+    window and <var_name>_<statistic>_<size>x<size> for the others. '''
+    import numpy as np
+
+    block_idx = pixel_side_grid(row, col, num_rows, num_cols, max(windows))
+    var_names = [var_name for var_name in var_names if var_name != 'l2_flags']
+
+    # Float variables keep their type, as in the per variable statistics; others are calculated in float64
+    groups = {}
+    for var_name in var_names:
+        block = satData[var_name].values[block_idx[0]:block_idx[1], block_idx[2]:block_idx[3]]
+        groups.setdefault(block.dtype if block.dtype.kind == 'f' else np.dtype('float64'), []).append((var_name, block))
+
+    window_stats = {}
+    for dtype, blocks in groups.items():
+        stacked = np.stack([block for var_name, block in blocks]).astype(dtype, copy=False)
+        for size in windows:
+            grid_idx = pixel_side_grid(row, col, num_rows, num_cols, size)
+            window = stacked[:, grid_idx[0]-block_idx[0]:grid_idx[1]-block_idx[0], grid_idx[2]-block_idx[2]:grid_idx[3]-block_idx[2]]
+            statistics = grid_window_stats(window.reshape(len(blocks), -1))
+            for i, (var_name, block) in enumerate(blocks):
+                window_stats[(var_name, size)] = {statistic: values[i] for statistic, values in statistics.items()}
+
+    stats = {}
+    for var_name in var_names:
+        for size in windows:
+            suffix = '' if size == 5 else '_' + str(size) + 'x' + str(size)
+            for statistic, value in window_stats[(var_name, size)].items():
+                stats[var_name + '_' + statistic + suffix] = value
+
+    return stats
+
+def grid_window_stats(variable_grids):
+    ''' Pixel grid statistics (as described in Bailey and Werdell) of the windows of several variables, one row of pixels per
+    variable. Returns a dictionary of arrays of the statistics, one value per variable. '''
+    import numpy as np
+
+    num_nans = np.sum(np.isnan(variable_grids), axis=1)
+    num_grid_elem = variable_grids.shape[1]
+
+    var_flag = variable_flag(num_nans, num_grid_elem)
+    mean, stdev, median = grid_stats(variable_grids, var_flag)
+    filtered_mean, filtered_stdev, filtered_pixel_count = filtered_stats(variable_grids, mean, stdev)
+
+    return {'mean':mean, 'stdev':stdev, 'median':median, 'filtered_mean':filtered_mean, 'filtered_stdev':filtered_stdev, \
+            'grid_size':np.full(len(variable_grids), num_grid_elem), 'valid_pixel_count':num_grid_elem - num_nans, \
+            'filtered_pixel_count':filtered_pixel_count, 'nan_flag':var_flag}
+
+def record_matchup(dict_args, matchup_id, granid, status, started, failure_reason=None, output_path=None):
+    ''' Record the outcome of the matchup in the state database, if one was given. The outcome is already written (datarow or
+    excluded matchup log), so a database that stays locked past the timeout only gives a warning: 09a-list-pending-matchups.py
+    records matchups missing from the database whose datarow exists as done, and lists the others again. '''
+    if not dict_args['stateDb']:
+        return
+    import sqlite3
+    from datetime import datetime
+    import state_support
+    satellite_names = {'S':'seawifs','A':'aqua','T':'terra','VS':'snpp','V1J':'jpss1','V2J':'jpss2'}
+    conn = None
+    try:
+        conn = state_support.connect(dict_args['stateDb'][0])
+        state_support.set_matchup(conn, matchup_id, granid, satellite_names.get(granid[0:-13]), status, started=started, finished=datetime.now(), \
+                                  failure_reason=failure_reason, output_path=output_path)
+    except sqlite3.OperationalError as e:
+        print('WARNING: matchup ', matchup_id, '/', granid, ' (', status, ') not recorded in the state database ', dict_args['stateDb'][0], ': ', e)
+    finally:
+        if conn is not None:
+            conn.close()
+
 def sat_filepath(granid, filepath_starter):
     sat = granid[0]
     year = granid[1:5]
@@ -138,9 +226,11 @@ def sat_filepath(granid, filepath_starter):
     satfiledir = filepath_starter + '/' + satLUT[sat]+'/'+year+'/'+doy+'/'+granid+'.L2'
     return satfiledir
 
-def import_satfile(satfiledir):
+def import_satfile(satfiledir, navigation=True):
     import xarray as xr
     satData = xr.load_dataset(satfiledir, group='geophysical_data')
+    if not navigation:
+        return satData
     satNav = xr.load_dataset(satfiledir, group='navigation_data')
     return satData, satNav
 
@@ -167,64 +257,72 @@ def pixel_location(dist_array):
     row, col = np.unravel_index(idx, dist_array.shape)
     return row, col, idx, min_dist
 
-def pixel_grid(row,col):
-    grid_idx = [row-2, row+3, col-2, col+3]
+def coarse_pixel_location(lat_sat, lon_sat, field_lat, field_lon, stride=None):
+    ''' pixel_location found coarse to fine. The distance is first computed on every stride-th row and column of the swath (and
+    its last row and column), whose samples cut the swath into cells. Any pixel of a cell is within reach (twice the largest
+    spacing of neighbouring samples) of a valid corner of the cell, so only the cells with a corner within reach of the nearest
+    sample can hold the nearest pixel, and the distance is then computed on the window of these cells. The whole granule is
+    searched instead if a cell has no valid corner (missing scans, NaN-heavy navigation), or if the window would cover half of
+    it (e.g. near swath edges folding over the field point). Returns the same pixel and distance as pixel_location. '''
+    import numpy as np
+
+    stride = stride or COARSE_STRIDE
+    num_rows, num_cols = lat_sat.shape
+    sample_rows = np.unique(np.r_[0:num_rows:stride, num_rows-1])
+    sample_cols = np.unique(np.r_[0:num_cols:stride, num_cols-1])
+    lat = lat_sat.values[np.ix_(sample_rows, sample_cols)]
+    lon = lon_sat.values[np.ix_(sample_rows, sample_cols)]
+    valid = ~(np.isnan(lat) | np.isnan(lon))
+    has_corner = valid[:-1,:-1] | valid[1:,:-1] | valid[:-1,1:] | valid[1:,1:]
+    if len(sample_rows) < 3 or len(sample_cols) < 3 or not has_corner.all():
+        return pixel_location(haversine(field_lon, field_lat, lon_sat, lat_sat))
+
+    spacing = np.nanmax(np.r_[haversine(lon[1:], lat[1:], lon[:-1], lat[:-1]).ravel(), haversine(lon[:,1:], lat[:,1:], lon[:,:-1], lat[:,:-1]).ravel(), np.nan])
+    dist = haversine(field_lon, field_lat, lon, lat)
+    if np.isnan(spacing) or np.isnan(dist).all():
+        return pixel_location(haversine(field_lon, field_lat, lon_sat, lat_sat))
+
+    near_rows, near_cols = np.nonzero(dist <= np.nanmin(dist) + 2*spacing)
+    row_min = sample_rows[max(near_rows.min() - 1, 0)]
+    row_max = sample_rows[min(near_rows.max() + 1, len(sample_rows) - 1)] + 1
+    col_min = sample_cols[max(near_cols.min() - 1, 0)]
+    col_max = sample_cols[min(near_cols.max() + 1, len(sample_cols) - 1)] + 1
+    if (row_max - row_min)*(col_max - col_min) > num_rows*num_cols/2:
+        return pixel_location(haversine(field_lon, field_lat, lon_sat, lat_sat))
+
+    row, col, idx, min_dist = pixel_location(haversine(field_lon, field_lat, lon_sat[row_min:row_max, col_min:col_max], lat_sat[row_min:row_max, col_min:col_max]))
+    row, col = row + row_min, col + col_min
+    return row, col, row*num_cols + col, min_dist
+
+def cached_pixel_location(nav, field_lat, field_lon):
+    ''' pixel_location for a navigation cache (see nav_cache_support.py). The haversine distance is only computed for the pixels
+    of the blocks that can hold the nearest pixel, which gives the same pixel and distance as the search of the whole granule. '''
+    import numpy as np
+    import nav_cache_support
+    candidates = nav_cache_support.candidate_pixels(nav, field_lat, field_lon)
+    if len(candidates) == 0:
+        raise ValueError('SatNav contains only nans')
+    dist = haversine(field_lon, field_lat, nav['longitude'].ravel()[candidates], nav['latitude'].ravel()[candidates])
+    nearest = np.nanargmin(dist)
+    idx = candidates[nearest]
+    row, col = np.unravel_index(idx, nav['latitude'].shape)
+    return row, col, idx, dist[nearest]
+
+def pixel_grid(row, col, size=5):
+    half = size//2
+    grid_idx = [row-half, row+half+1, col-half, col+half+1]
     return grid_idx
 
-def pixel_side_grid(row, col, num_rows, num_cols):
-    last_row_idx = num_rows -1
-    last_col_idx = num_cols -1
-    
-    if row <2:
-        row_min = 0
-    else:
-        row_min = row -2
-    
-    if row > num_rows -3:
-        row_max = num_rows  #careful on indexing
-    else:
-        row_max = row + 3
-    
-    if col < 2:
-        col_min = 0
-    else: 
-        col_min = col - 2
-    
-    if col > num_cols -3:
-        col_max = num_cols
-    else:
-        col_max = col + 3
-        
+def pixel_side_grid(row, col, num_rows, num_cols, size=5):
+    # window of the given size, clipped at the edges of the granule
+    half = size//2
+    row_min = max(row - half, 0)
+    row_max = min(row + half + 1, num_rows)  #careful on indexing
+    col_min = max(col - half, 0)
+    col_max = min(col + half + 1, num_cols)
     grid_idx = [row_min, row_max, col_min, col_max]
-
     return grid_idx
 
-def Rrs_cv_flag(variable_dict, cv_max):
-    import numpy as np
-    filtered_mean_keys = [key for key in variable_dict.keys() if ('Rrs' in key)&('_filtered_mean' in key)]
-    
-    rrs_filtered_cvs = []
-    for key in filtered_mean_keys:
-        wvl_str = key.split('_')[1]
-        wvl_flt = float(wvl_str)
-        
-        if (wvl_flt>=410)&(wvl_flt<=556):        
-            mean = variable_dict[key]
-            sd = variable_dict['Rrs_' + wvl_str + '_filtered_stdev']
-            cv = sd/mean
-            rrs_filtered_cvs.append(cv)
-        else:
-            continue
-    
-    if all(np.isnan(rrs_filtered_cvs)):
-        median_cv = np.nan
-        cv_flag = 2
-    else:
-        median_cv = np.nanmedian(rrs_filtered_cvs)
-        cv_flag = int(median_cv > cv_max)
-    
-    return median_cv, cv_flag
-
 def loc_flag(min_dist, row, col, num_rows, num_cols):
     location_flag = 0
     
@@ -240,58 +338,49 @@ def loc_flag(min_dist, row, col, num_rows, num_cols):
     
     return grid_idx, location_flag
 
-def grid_nans(satData_column, grid_idx):
+def variable_flag(num_nans, num_grid_elem):
+    # 1: every pixel is nan, 2: at least half of the pixels are nan, 0: otherwise
     import numpy as np
-    variable_grid = satData_column[grid_idx[0]:grid_idx[1], grid_idx[2]:grid_idx[3]]
-    num_nans = np.sum(np.isnan(variable_grid))
-    return num_nans, variable_grid
-
-def variable_flag(num_nans_values, num_grid_elem):  #careful of num_nans formatting, do I need num_nans.values
-    
-    if num_nans_values == num_grid_elem:
-        var_flag = 1    
-    elif num_nans_values >= num_grid_elem/2:
-        var_flag = 2    
-    else:
-        var_flag = 0
-        
-    return var_flag
+    return np.where(num_nans == num_grid_elem, 1, np.where(num_nans >= num_grid_elem/2, 2, 0))
 
-def grid_stats(variable_grid, var_flag):
+def grid_stats(variable_grids, var_flag):
     import numpy as np
-    if var_flag == 1:
-        mean, stdev, median = np.nan, np.nan, np.nan
-    else: 
-        mean = np.nanmean(variable_grid)
-        stdev = np.nanstd(variable_grid)
-        median = np.nanmedian(variable_grid)
+    mean, stdev, median = (np.full(len(variable_grids), np.nan, dtype=variable_grids.dtype) for i in range(3))
+    valid = var_flag != 1
+    if valid.any():
+        grids = variable_grids[valid]
+        mean[valid] = np.nanmean(grids, axis=1)
+        stdev[valid] = np.nanstd(grids, axis=1)
+        median[valid] = grid_medians(grids)
     return mean, stdev, median
 
-def filter_pixels(variable_grid, mean, stdev): # how will this deal with nans???
+def grid_medians(grids):
+    # nanmedian of each row (with at least one valid pixel): nans are sorted last, so the middle of the valid pixels is taken
     import numpy as np
-    import pandas as pd
-    filtered_pixels = []
+    sorted_grids = np.sort(grids, axis=1)
+    num_valid = np.sum(~np.isnan(grids), axis=1)
+    rows = np.arange(len(grids))
+    lower, upper = sorted_grids[rows, (num_valid - 1)//2], sorted_grids[rows, num_valid//2]
+    return np.where(num_valid % 2 == 1, lower, (lower + upper)/2)
+
+def filter_pixels(variable_grids, mean, stdev): # nans fail both comparisons, so are never kept
     lower_bound = 1.5*stdev - mean
     upper_bound = 1.5*stdev + mean
-    flattened_var_grid = variable_grid.values.flatten()
-    
-    for element in flattened_var_grid:
-        if np.isnan(element)==True:
-            continue
-        if lower_bound < element < upper_bound:
-            filtered_pixels.append(element)
-    return filtered_pixels
-
-def filtered_stats(filtered_pixels):
+    return (lower_bound[:, None] < variable_grids) & (variable_grids < upper_bound[:, None])
+
+def filtered_stats(variable_grids, mean, stdev):
     import numpy as np
-    if len(filtered_pixels)>0:
-        filtered_mean = np.mean(filtered_pixels)
-        filtered_stdev = np.std(filtered_pixels)
-        filtered_pixel_count = len(filtered_pixels)
-    else:
-        filtered_mean = np.nan
-        filtered_stdev = np.nan
-        filtered_pixel_count = 0
+    filtered = filter_pixels(variable_grids, mean, stdev)
+    filtered_pixel_count = np.sum(filtered, axis=1)
+    filtered_mean, filtered_stdev = (np.full(len(variable_grids), np.nan, dtype=variable_grids.dtype) for i in range(2))
+    # Rows with the same number of filtered pixels are calculated together, so each is summed as the pixels alone would be
+    for count in np.unique(filtered_pixel_count[filtered_pixel_count > 0]):
+        rows = np.flatnonzero(filtered_pixel_count == count)
+        filtered_pixels = variable_grids[rows][filtered[rows]].reshape(len(rows), count)
+        filtered_mean[rows] = np.mean(filtered_pixels, axis=1)
+        filtered_stdev[rows] = np.std(filtered_pixels, axis=1)
     return filtered_mean, filtered_stdev, filtered_pixel_count
 
-if __name__ == "__main__": main()
\ No newline at end of file
+if __name__ == "__main__":
+    import telemetry_support
+    telemetry_support.run_main(main)
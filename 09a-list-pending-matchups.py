@@ -0,0 +1,64 @@
+## This script uses the run state database to list the matchups of a satellite specific granule links file that still need to be run
+## through 09-matchup-datarows.py. The main script loops over this list instead of checking for every matchup datarow on the filesystem.
+
+def main():
+
+    import argparse
+    import os
+    import state_support
+    from table_support import read_table, write_table
+
+
+    parser = argparse.ArgumentParser(description='''\
+      This script writes the rows of a satellite specific L1a granule links file whose matchups are not recorded as done in the run state \
+      database. Matchups excluded for reasons that do not change on a rerun (Nav: satellite navigation is all nans, 1km: no pixel within 1km) \
+      are also left out. Matchups unknown to the database whose datarow already exists in the matchup directory are recorded as done.''')
+
+    parser.add_argument('--granlinksFile', nargs=1, type=str, required=True, help='''\
+    Full path of the satellite specific L1a granule links file (output of 04-edit-L2-urls.py).''')
+
+    parser.add_argument('--matchupDir', nargs=1, type=str, required=True, help='''\
+    Full path to the directory in which the matchup datarows are saved.''')
+
+    parser.add_argument('--stateDb', nargs=1, type=str, required=True, help='''\
+    Full path of the SQLite run state database (see state_support.py).''')
+
+    parser.add_argument('--ofile', nargs=1, type=str, required=True, help='''\
+    Full path, name, and extension of the pending granule links file to write. Same columns as the input granule links file.''')
+
+    args=parser.parse_args()
+    dict_args=vars(args)
+
+    matchupDir = dict_args['matchupDir'][0]
+    granlinks_fp = dict_args['granlinksFile'][0]
+    conn = state_support.connect(dict_args['stateDb'][0])
+
+    if os.path.getsize(granlinks_fp) == 0:
+        open(dict_args['ofile'][0], 'w').close()
+        return
+
+    granlinks = read_table(granlinks_fp, 'L1a-granlinks')
+
+    skip = state_support.matchups_with_status(conn, ['done']) | state_support.matchups_with_status(conn, ['excluded'], ['Nav','1km'])
+    known = state_support.matchups_with_status(conn, ['done','excluded','failed'])
+
+    satellite_names = {'S':'seawifs','A':'aqua','T':'terra','VS':'snpp','V1J':'jpss1','V2J':'jpss2'}
+    pending = []
+    for row in granlinks.itertuples(index=False):
+        key = (str(row.station), row.granid)
+        if key in skip:
+            pending.append(False)
+            continue
+        datarow_fp = matchupDir + '/' + str(row.station) + '_' + row.granid + '.csv'
+        if key not in known and os.path.isfile(datarow_fp):
+            state_support.set_matchup(conn, key[0], key[1], satellite_names.get(row.granid[0:-13]), 'done', output_path=datarow_fp)
+            pending.append(False)
+            continue
+        pending.append(True)
+
+    write_table(granlinks.loc[pending], dict_args['ofile'][0], 'L1a-granlinks')
+    print('Pending matchups: ', sum(pending), ' of ', len(granlinks))
+
+if __name__ == "__main__":
+    import telemetry_support
+    telemetry_support.run_main(main)
@@ -0,0 +1,204 @@
+## This script generates synthetic L2 granules, with the layout of the OB.DAAC L2 files read by 09-matchup-datarows.py, together with
+## a field data file and an L1a granule links file of stations matched up to them. It makes stage 09 runnable and measurable without
+## real L2 files or an ocssw install (see 09c-benchmark-matchups.py).
+
+# Sensor presets: granid prefix, full granule size (lines, pixels), pixel size (km) at nadir, and bands.
+SENSORS = {'modis'  : {'prefix':'A', 'lines':2030, 'pixels':1354, 'res_km':1.0,
+                       'bands':[412,443,469,488,531,547,555,645,667,678], 'nir_bands':[748,859,869,1240,1640,2130]},
+           'viirs'  : {'prefix':'VS', 'lines':3232, 'pixels':3200, 'res_km':0.75,
+                       'bands':[410,443,486,551,671], 'nir_bands':[745,862,1238,1601,2257]},
+           'seawifs': {'prefix':'S', 'lines':3700, 'pixels':1285, 'res_km':1.1,
+                       'bands':[412,443,490,510,555,670], 'nir_bands':[765,865]}}
+
+def main():
+
+    import argparse
+    import os
+    import numpy as np
+    import pandas as pd
+    from datetime import datetime, timedelta
+    from table_support import write_table
+    from workflow_support import load_script
+
+    matchups = load_script('09-matchup-datarows.py')
+
+
+    parser = argparse.ArgumentParser(description='''\
+      This script writes synthetic L2 granules (geophysical_data and navigation_data groups) in the directory layout read by \
+      09-matchup-datarows.py, with realistic swath geometry (pixels growing towards the swath edges), cloud, swath edge and missing scan \
+      line NaN patterns, and the sensor's bands and products. It also writes a field data file of stations matched up to the granules \
+      (most within a pixel, some more than 1 km outside the swath) and the corresponding L1a granule links file.''')
+
+    parser.add_argument('--sensor', nargs=1, type=str, required=True, choices=sorted(SENSORS), help='''\
+    Sensor preset: modis, viirs, or seawifs.''')
+
+    parser.add_argument('--satDir', nargs=1, type=str, required=True, help='''\
+    Full path of the directory in which to write the granules (as --satDir of 09-matchup-datarows.py).''')
+
+    parser.add_argument('--ofile_field', nargs=1, type=str, required=True, help='''\
+    Full path, name, and extension of the field data file to write (.csv or .parquet).''')
+
+    parser.add_argument('--ofile_granlinks', nargs=1, type=str, required=True, help='''\
+    Full path, name, and extension of the L1a granule links file to write (.csv or .parquet).''')
+
+    parser.add_argument('--ngranules', nargs=1, type=int, default=([1]), help='''\
+    OPTIONAL: Number of granules. Default is 1.''')
+
+    parser.add_argument('--nstations', nargs=1, type=int, default=([100]), help='''\
+    OPTIONAL: Number of stations matched up to each granule. Default is 100.''')
+
+    parser.add_argument('--nvars', nargs=1, type=int, default=([120]), help='''\
+    OPTIONAL: Number of geophysical variables (besides l2_flags). The sensor's Rrs, rhos, rhot, and giop bands and the usual products \
+    are written first, then filler products. Default is 120.''')
+
+    parser.add_argument('--size', nargs=1, type=str, default=(['extract']), choices=['extract','full'], help='''\
+    OPTIONAL: full writes whole granules of the sensor's size; extract (default) writes the region extracted around the stations \
+    by the satellite workflow (--extractDeg degrees wide).''')
+
+    parser.add_argument('--extractDeg', nargs=1, type=float, default=([2.5]), help='''\
+    OPTIONAL: Width in degrees of the extracted region written with --size extract. Default is 2.5.''')
+
+    parser.add_argument('--cloudFraction', nargs=1, type=float, default=([0.3]), help='''\
+    OPTIONAL: Fraction of the pixels masked as cloud (NaN in every geophysical variable). Default is 0.3.''')
+
+    parser.add_argument('--outsideFraction', nargs=1, type=float, default=([0.1]), help='''\
+    OPTIONAL: Fraction of the stations placed more than 1 km outside the granule (excluded as 1km by 09). Default is 0.1.''')
+
+    parser.add_argument('--seed', nargs=1, type=int, default=([0]), help='''\
+    OPTIONAL: Random seed. Default is 0.''')
+
+    args=parser.parse_args()
+    dict_args=vars(args)
+
+    sensor = SENSORS[dict_args['sensor'][0]]
+    rng = np.random.default_rng(dict_args['seed'][0])
+    var_names = product_names(sensor, dict_args['nvars'][0])
+
+    if dict_args['size'][0] == 'full':
+        lines, pixels = sensor['lines'], sensor['pixels']
+    else:
+        lines = pixels = int(round(dict_args['extractDeg'][0]*111.2/sensor['res_km']))
+
+    fields = []
+    granlinks = []
+    for g in range(dict_args['ngranules'][0]):
+        start = datetime(2019,1,1) + timedelta(days=int(rng.integers(0,365)), hours=int(rng.integers(0,24)), minutes=5*int(rng.integers(0,12)))
+        granid = sensor['prefix'] + start.strftime('%Y%j%H%M%S')
+        lat0, lon0 = rng.uniform(-60,60), rng.uniform(-180,180)
+
+        lat, lon = swath_geometry(lines, pixels, sensor['res_km'], lat0, lon0, rng.uniform(-20,20) + rng.choice([0,180]), full=dict_args['size'][0]=='full')
+        # Missing scan lines in the navigation:
+        lat[rng.random(lines) < 0.002, :] = np.nan
+        lon[np.isnan(lat)] = np.nan
+
+        sat_fp = matchups.sat_filepath(granid, dict_args['satDir'][0])
+        os.makedirs(os.path.dirname(sat_fp), exist_ok=True)
+        write_granule(sat_fp, lat, lon, var_names, sensor, dict_args['cloudFraction'][0], rng)
+
+        # Stations at random valid pixels, within a fraction of a pixel of the pixel center, or well outside the granule:
+        n = dict_args['nstations'][0]
+        valid = np.flatnonzero(~np.isnan(lat).ravel())
+        idx = rng.choice(valid, size=n)
+        st_lat = lat.ravel()[idx] + rng.uniform(-0.25,0.25,n)*sensor['res_km']/111.2
+        st_lon = lon.ravel()[idx] + rng.uniform(-0.25,0.25,n)*sensor['res_km']/111.2/np.cos(np.radians(lat.ravel()[idx]))
+        outside = rng.random(n) < dict_args['outsideFraction'][0]
+        st_lat[outside] = np.clip(np.nanmax(lat) + rng.uniform(0.5,1,outside.sum()), -90, 90)
+
+        ids = ['syn' + str(g) + '-' + str(i) for i in range(n)]
+        times = [start + timedelta(minutes=float(m)) for m in rng.uniform(-60,60,n)]
+        fields.append(pd.DataFrame({'ID':ids, 'yyyy-mm-ddThh:mm:ss':[t.strftime('%Y-%m-%dT%H:%M:%S') for t in times], 'Latitude':st_lat, 'Longitude':st_lon, \
+                                    'pic':rng.lognormal(-7,1,n), 'chl':rng.lognormal(0,1,n), 'sst':rng.uniform(0,30,n)}))
+        granlinks.append(pd.DataFrame({'station':ids, 'granid':granid, 'granurl':'https://example.invalid/' + granid + '.L1A', \
+                                       'wlon':st_lon-1, 'slat':st_lat-1, 'elon':st_lon+1, 'nlat':st_lat+1}))
+        print('Granule ', granid, ': ', lines, ' x ', pixels, ', ', len(var_names), ' variables, ', n, ' stations (', int(outside.sum()), ' outside)')
+
+    write_table(pd.concat(fields, ignore_index=True), dict_args['ofile_field'][0], 'field')
+    write_table(pd.concat(granlinks, ignore_index=True), dict_args['ofile_granlinks'][0], 'L1a-granlinks')
+
+def product_names(sensor, nvars):
+    ''' Names of the nvars geophysical variables of a synthetic granule of the sensor. '''
+    bands = sensor['bands']
+    names = ['Rrs_' + str(b) for b in bands] + ['rhos_' + str(b) for b in bands + sensor['nir_bands']] + ['rhot_' + str(b) for b in bands + sensor['nir_bands']] + \
+            [p + '_' + str(b) + '_giop' for p in ['adg','a','aph','bb'] for b in bands] + \
+            ['chlor_a','pic','poc','calcite_ci2','calcite_2b','calcite_3b','Kd_490','par','ipar','nflh','aot_869','angstrom','sst']
+    names += ['product_' + str(i) for i in range(max(0, nvars - len(names)))]
+    return names[0:nvars]
+
+def swath_geometry(lines, pixels, res_km, lat0, lon0, heading, full=True):
+    ''' Latitude and longitude of the pixels of a swath centered on lat0, lon0, with the along track direction heading (degrees
+    from north). Across track, full granules have pixels growing to about three times their nadir size at the swath edges. '''
+    import numpy as np
+
+    along = (np.arange(lines) - lines/2)*res_km
+    x = (np.arange(pixels) - pixels/2)/(pixels/2)
+    across = x*pixels/2*res_km*(1 + (2*x**2/3 if full else 0))
+    a, c = np.meshgrid(along, across, indexing='ij')
+    h = np.radians(heading)
+    north = a*np.cos(h) - c*np.sin(h)
+    east = a*np.sin(h) + c*np.cos(h)
+    lat = np.clip(lat0 + north/111.2, -89.9, 89.9)
+    lon = lon0 + east/(111.2*np.cos(np.radians(lat)))
+    lon = (lon + 180) % 360 - 180
+    return lat.astype(np.float32), lon.astype(np.float32)
+
+def write_granule(sat_fp, lat, lon, var_names, sensor, cloud_fraction, rng):
+    ''' Write a synthetic L2 file. Reflectances are packed as scaled int16, as in OB.DAAC files (Rrs with a finer scale than rhos and rhot), other products as float32.
+    Clouds (smooth random field), swath edges and the missing navigation lines are NaN in every geophysical variable, and
+    each variable has a few extra NaN pixels of its own. '''
+    import numpy as np
+    import netCDF4
+
+    lines, pixels = lat.shape
+    cloud = smooth_field(lines, pixels, rng)
+    cloud = cloud > np.quantile(cloud, 1 - cloud_fraction)
+    cloud[:, 0:max(1, pixels//200)] = True
+    cloud[:, pixels - max(1, pixels//200):] = True
+    cloud |= np.isnan(lat)
+    base = smooth_field(lines, pixels, rng)
+
+    with netCDF4.Dataset(sat_fp, 'w') as nc:
+        nc.createDimension('number_of_lines', lines)
+        nc.createDimension('pixels_per_line', pixels)
+        dims = ('number_of_lines', 'pixels_per_line')
+
+        nav = nc.createGroup('navigation_data')
+        for name, values in [('latitude', lat), ('longitude', lon)]:
+            var = nav.createVariable(name, 'f4', dims, zlib=True, complevel=1, fill_value=-999.0)
+            var[:] = np.where(np.isnan(values), -999.0, values)
+
+        geo = nc.createGroup('geophysical_data')
+        for i, name in enumerate(var_names):
+            wavelength = name.split('_')[1] if name.startswith(('Rrs','rhos','rhot')) or name.endswith('_giop') else None
+            if name.startswith('Rrs'):
+                level = 0.008*(443/float(wavelength))**3
+            elif wavelength:
+                level = 0.1*(443/float(wavelength))
+            else:
+                level = 10**rng.uniform(-2,1)
+            values = level*(1 + 0.3*base + 0.05*rng.standard_normal((lines, pixels)))
+            mask = cloud | (rng.random((lines, pixels)) < 0.01)
+            if name.startswith(('Rrs','rhos','rhot')):
+                var = geo.createVariable(name, 'i2', dims, zlib=True, complevel=1, fill_value=-32767)
+                scale, offset = (2e-6, 0.05) if name.startswith('Rrs') else (2e-5, 0.5)
+                var.scale_factor, var.add_offset = np.float32(scale), np.float32(offset)
+                values = np.clip(values, offset - 32766*scale, offset + 32767*scale)
+            else:
+                var = geo.createVariable(name, 'f4', dims, zlib=True, complevel=1, fill_value=-32767.0)
+            var[:] = np.ma.masked_array(values, mask=mask)
+
+        flags = geo.createVariable('l2_flags', 'i4', dims, zlib=True, complevel=1)
+        flags[:] = np.where(cloud, 1 << 9, 0).astype(np.int32)
+
+def smooth_field(lines, pixels, rng, scale=32):
+    ''' Spatially smooth random field of zero mean and unit variance: coarse noise interpolated to the pixel grid. '''
+    import numpy as np
+
+    coarse = rng.standard_normal((lines//scale + 2, pixels//scale + 2))
+    rows = np.arange(lines)/scale
+    cols = np.arange(pixels)/scale
+    r0, c0 = rows.astype(int), cols.astype(int)
+    fr, fc = (rows - r0)[:, None], (cols - c0)[None, :]
+    field = coarse[r0][:, c0]*(1-fr)*(1-fc) + coarse[r0+1][:, c0]*fr*(1-fc) + coarse[r0][:, c0+1]*(1-fr)*fc + coarse[r0+1][:, c0+1]*fr*fc
+    return (field - field.mean())/field.std()
+
+if __name__ == "__main__": main()
@@ -0,0 +1,145 @@
+## This script times the stages of 09-matchup-datarows.py (L2 file import, nearest pixel search, and pixel grid statistics) on the
+## granules and stations of a granule links file, typically the synthetic ones written by 09b-generate-synthetic-L2.py, at several
+## station densities (stations matched up per granule). The timings are written as a machine-readable baseline (JSON), and can be
+## compared to a previous baseline to catch performance regressions.
+
+def main():
+
+    import argparse
+    import json
+    import sys
+    from table_support import read_table
+    from workflow_support import load_script
+
+    matchups = load_script('09-matchup-datarows.py')
+
+
+    parser = argparse.ArgumentParser(description='''\
+      This script times import_satfile, haversine and pixel_location, and pixel_window_stats of 09-matchup-datarows.py \
+      for each granule of the granule links file, with 1, 10, 100 (or --densities) of its stations. Each stage is timed per call, as \
+      09 runs it for a single matchup, and summarised (mean, median, 95th percentile, minimum) per granule size and station density.''')
+
+    parser.add_argument('--granlinksFile', nargs=1, type=str, required=True, help='''\
+    Full path of the L1a granule links file (station, granid) of the matchups to time.''')
+
+    parser.add_argument('--fieldDf', nargs=1, type=str, required=True, help='''\
+    Full path of the field data file of the stations (ID, Latitude, Longitude).''')
+
+    parser.add_argument('--satDir', nargs=1, type=str, required=True, help='''\
+    Full path to the directory where the satellite files are stored.''')
+
+    parser.add_argument('--densities', nargs='+', type=int, default=[1,10,100], help='''\
+    OPTIONAL: Station densities (number of stations matched up per granule) to time. Default is 1 10 100.''')
+
+    parser.add_argument('--repeat', nargs=1, type=int, default=([3]), help='''\
+    OPTIONAL: Number of times each granule is imported at each density. Default is 3.''')
+
+    parser.add_argument('--navSearch', nargs=1, type=str, default=(['full']), choices=['full','coarse'], help='''\
+    OPTIONAL: Nearest pixel search timed as the locate stage: full (haversine and pixel_location), or coarse (coarse_pixel_location, \
+    as 09-matchup-datarows.py --navSearch coarse). Default is full.''')
+
+    parser.add_argument('--windows', nargs='+', type=int, default=[5], help='''\
+    OPTIONAL: Pixel grid statistics window sizes timed as the stats stage (as 09-matchup-datarows.py --windows). Default is 5.''')
+
+    parser.add_argument('--ofile', nargs=1, type=str, required=True, help='''\
+    Full path and .json extension of the baseline file to write.''')
+
+    parser.add_argument('--compare', nargs=1, type=str, required=False, help='''\
+    OPTIONAL: Full path of a previous baseline file. Stages whose median time increased by more than --tolerance are reported \
+    as regressions, and the script exits with status 1.''')
+
+    parser.add_argument('--tolerance', nargs=1, type=float, default=([0.2]), help='''\
+    OPTIONAL: Relative increase of the median time above which a stage is a regression. Default is 0.2 (20%%).''')
+
+    args=parser.parse_args()
+    dict_args=vars(args)
+
+    field = read_table(dict_args['fieldDf'][0], 'field').set_index('ID')
+    granlinks = read_table(dict_args['granlinksFile'][0], 'L1a-granlinks')
+
+    results = []
+    for granid, links in granlinks.groupby('granid', sort=False):
+        stations = field.loc[links['station']]
+        for density in dict_args['densities']:
+            if density > len(stations):
+                print('Granule ', granid, ' has only ', len(stations), ' stations, density ', density, ' skipped')
+                continue
+            results.extend(time_matchups(matchups, matchups.sat_filepath(granid, dict_args['satDir'][0]), stations.iloc[0:density], dict_args['repeat'][0], \
+                                          dict_args['navSearch'][0], sorted(set(dict_args['windows']) | {5})))
+
+    baseline = {'meta':environment(), 'results':results}
+    with open(dict_args['ofile'][0], 'w') as f:
+        json.dump(baseline, f, indent=1)
+
+    for result in results:
+        print(result['granid'], result['shape'], result['nvars'], 'vars,', result['stations'], 'stations,', result['stage'] + ':', \
+              'median', '%.4f' % result['median'], 's, p95', '%.4f' % result['p95'], 's, n', result['n'])
+
+    if dict_args['compare']:
+        with open(dict_args['compare'][0]) as f:
+            previous = json.load(f)
+        regressions = compare_baselines(previous['results'], results, dict_args['tolerance'][0])
+        for regression in regressions:
+            print('REGRESSION', regression['granid'], regression['stations'], 'stations,', regression['stage'] + ':', \
+                  'median', '%.4f' % regression['previous_median'], 's ->', '%.4f' % regression['median'], 's')
+        if regressions:
+            sys.exit(1)
+
+def time_matchups(matchups, sat_fp, stations, repeat, nav_search='full', windows=(5,)):
+    ''' Time the stages of the matchups of the stations with the granule sat_fp. Returns one result per stage. '''
+    import time
+
+    timings = {'import':[], 'locate':[], 'stats':[], 'granule':[]}
+    for r in range(repeat):
+        started = time.perf_counter()
+        t0 = time.perf_counter()
+        satData, satNav = matchups.import_satfile(sat_fp)
+        timings['import'].append(time.perf_counter() - t0)
+        lat_sat, lon_sat = matchups.sat_lon_lat(satNav)
+        var_names = list(satData.data_vars)
+
+        for station in stations.itertuples():
+            t0 = time.perf_counter()
+            if nav_search == 'coarse':
+                row, col, idx, min_dist = matchups.coarse_pixel_location(lat_sat, lon_sat, station.Latitude, station.Longitude)
+            else:
+                dist_array = matchups.haversine(station.Longitude, station.Latitude, lon_sat, lat_sat)
+                row, col, idx, min_dist = matchups.pixel_location(dist_array)
+            timings['locate'].append(time.perf_counter() - t0)
+            if min_dist > 1:
+                continue
+
+            t0 = time.perf_counter()
+            grid_idx, location_flag = matchups.loc_flag(min_dist, row, col, lat_sat.shape[0], lat_sat.shape[1])
+            matchups.pixel_window_stats(satData, var_names, row, col, lat_sat.shape[0], lat_sat.shape[1], windows)
+            timings['stats'].append(time.perf_counter() - t0)
+        timings['granule'].append(time.perf_counter() - started)
+
+    granid = sat_fp.split('/')[-1][0:-3]
+    return [dict({'granid':granid, 'shape':list(lat_sat.shape), 'nvars':len(var_names), 'stations':len(stations), 'stage':stage, 'navSearch':nav_search, 'windows':list(windows)}, **summary(seconds)) \
+            for stage, seconds in timings.items() if seconds]
+
+def summary(seconds):
+    ''' Summary statistics of a list of timings, in seconds. '''
+    import numpy as np
+    return {'n':len(seconds), 'mean':float(np.mean(seconds)), 'median':float(np.median(seconds)), \
+            'p95':float(np.percentile(seconds, 95)), 'min':float(np.min(seconds))}
+
+def compare_baselines(previous, current, tolerance):
+    ''' Results of current whose median increased by more than tolerance (relative) from the same granule, station density, stage,
+    nearest pixel search, and windows in previous. '''
+    key = lambda result: (result['granid'], result['stations'], result['stage'], result.get('navSearch', 'full'), tuple(result.get('windows', [5])))
+    previous_median = {key(result): result['median'] for result in previous}
+    return [dict(result, previous_median=previous_median[key(result)]) for result in current \
+            if key(result) in previous_median and result['median'] > previous_median[key(result)]*(1 + tolerance)]
+
+def environment():
+    ''' Description of the machine and package versions the baseline was measured with. '''
+    import platform
+    import os
+    from datetime import datetime
+    import numpy, pandas, xarray, netCDF4
+    return {'date':datetime.now().isoformat(timespec='seconds'), 'host':platform.node(), 'machine':platform.machine(), 'cpus':os.cpu_count(), \
+            'python':platform.python_version(), 'numpy':numpy.__version__, 'pandas':pandas.__version__, 'xarray':xarray.__version__, 'netCDF4':netCDF4.__version__}
+
+if __name__ == "__main__": main()
@@ -10,15 +10,23 @@ def main():
     import os
     from os import listdir
     import argparse
+    from table_support import read_table, write_table
+    from telemetry_support import step
+    from flag_support import rrs_cv_flag
     
     parser = argparse.ArgumentParser(description='''\
-    This script reads in the individual datarows saved in the matchup directory. It merges the datarows together into one dataframe.''')
+    This script reads in the individual datarows saved in the matchup directory. It merges the datarows together into one dataframe, \
+    and adds the Rrs coefficient of variation flag (Rrs_410_556_median_cv and cv_flag, see flag_support.py) to every row.''')
     
     parser.add_argument('--matchupDirectory', nargs=1, type=str, required=True, help='''\
     Full path and name of matchup directory where individual datarows are saved. Do NOT include trailing slash.''')
     
     parser.add_argument('--ofile', nargs=1, type=str, required=True, help='''\
-    Full path and name of where to save the matchup dataframe--the output of this script. Include .csv extension.''')
+    Full path and name of where to save the matchup dataframe--the output of this script. Include .csv extension, or .parquet for a typed Parquet file (see table_support.py).''')
+    
+    parser.add_argument('--incremental', default=False, action='store_true', help='''\
+    OPTIONAL: Merge into the existing matchup dataframe (--ofile) instead of re-reading every datarow. Its rows whose datarow file \
+    still exists, and was not rewritten since the dataframe was saved, are kept; only the other datarows are read.''')
     
     args = parser.parse_args()
     dict_args = vars(args)
@@ -36,10 +44,28 @@ def main():
         
     ##################################################################################
     
-    dfs = [pd.read_csv(path) for path in fpaths]
+    dfs = []
+    ofilepath = dict_args['ofile'][0]
+    if dict_args['incremental'] and os.path.isfile(ofilepath) and os.path.getsize(ofilepath) > 0:
+        # Datarows are saved as <ID>_<granid>.csv. Keep the rows of datarows unchanged since the dataframe was saved:
+        saved = os.path.getmtime(ofilepath)
+        unchanged = set(path for path in fpaths if os.path.getmtime(path) <= saved)
+        previousDf = read_table(ofilepath, 'matchups')
+        previous_paths = matchupDirPath + '/' + previousDf['ID'].astype(str) + '_' + previousDf['granid'].astype(str) + '.csv'
+        kept = set(previous_paths[previous_paths.isin(unchanged)])
+        dfs.append(previousDf.loc[previous_paths.isin(kept).to_numpy()])
+        fpaths = [path for path in fpaths if path not in kept]
+        print('Datarows kept: ', len(dfs[0]), ', read: ', len(fpaths))
+    
+    with step('csv_read', items=len(fpaths)):
+        dfs += [read_table(path, 'matchups') for path in fpaths]
     
     if len(dfs) > 0:
-        matchupDf = pd.concat(dfs)
-        matchupDf.to_csv(dict_args['ofile'][0], index=False)
+        with step('table_write') as record:
+            matchupDf = rrs_cv_flag(pd.concat(dfs))
+            write_table(matchupDf, ofilepath, 'matchups')
+            record['items'] = len(matchupDf)
     
-if __name__ == "__main__": main()
+if __name__ == "__main__":
+    import telemetry_support
+    telemetry_support.run_main(main)
@@ -5,6 +5,7 @@ def main():
     import pandas as pd
     import numpy as np
     import argparse
+    from table_support import read_table, write_table
     
     parser = argparse.ArgumentParser(description='''\
     This script reads in the satellite specific matchup dataframes and concats them into a single matchup dataframe. Note that this script requires two matchup dataframes and by default take in up to 6 matchup dataframes. If user has more tha 6 satellite specific matchup dataframes to merge together, user must use parser to add more arguments.''')
@@ -50,11 +51,13 @@ def main():
     matchup_dfs = []
     for fp in filepaths:
         if fp:
-            matchup_dfs.append(pd.read_csv(fp[0]))
+            matchup_dfs.append(read_table(fp[0], 'matchups'))
     
     merged_matchup_df = pd.concat(matchup_dfs)
     merged_matchup_df.sort_values(dt_col, inplace=True, ignore_index=True)
     
-    merged_matchup_df.to_csv(ofilepath, index=False)
+    write_table(merged_matchup_df, ofilepath, 'matchups')
     
-if __name__ == "__main__": main()
\ No newline at end of file
+if __name__ == "__main__":
+    import telemetry_support
+    telemetry_support.run_main(main)
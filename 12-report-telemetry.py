@@ -0,0 +1,88 @@
+## This script summarises the telemetry log of a run (see telemetry_support.py): where the time of each stage went, by step,
+## with the cpu time, peak memory, input/output, and item counts of the steps and the failures among them.
+
+def main():
+
+    import argparse
+    import os
+    import pandas as pd
+    import telemetry_support
+
+
+    parser = argparse.ArgumentParser(description='''\
+      This script reports, for each stage of a run, the run time of the stage (step main) and its steps: number of records, \
+      total, mean, median, 95th percentile, and maximum wall time, total cpu time and cpu/wall ratio (low ratios are waits on \
+      input/output or the network), peak memory, bytes read and written, items and items per second, and the number of failed steps. \
+      Stages are listed by total time, and the steps of each stage by total time, with their share of the stage's step time. \
+      Steps of concurrent processes (e.g. 09 matchups) add up to more than the elapsed time of the stage, which is reported as its span.''')
+
+    parser.add_argument('--telemetryLog', nargs='+', type=str, required=True, help='''\
+    Full path of the telemetry log (MATCHUP_TELEMETRY), or of several logs (e.g. one per shard) to report together.''')
+
+    parser.add_argument('--run', nargs=1, type=str, required=False, help='''\
+    OPTIONAL: Run id (MATCHUP_RUN_ID) to report. By default, the last run in the log is reported.''')
+
+    parser.add_argument('--ofile', nargs=1, type=str, required=False, help='''\
+    OPTIONAL: Full path and .csv extension of the file in which to also save the report table.''')
+
+    args=parser.parse_args()
+    dict_args=vars(args)
+
+    log_fps = [log_fp for log_fp in dict_args['telemetryLog'] if os.path.isfile(log_fp) and os.path.getsize(log_fp) > 0]
+    if not log_fps:
+        parser.error('The telemetry log ' + ' '.join(dict_args['telemetryLog']) + ' does not exist or is empty.')
+
+    records = pd.concat([telemetry_support.read_log(log_fp) for log_fp in log_fps], ignore_index=True)
+    if 'run' not in records or records['run'].isna().all():
+        run = None
+    else:
+        run = dict_args['run'][0] if dict_args['run'] else records['run'].dropna().iloc[-1]
+        records = records.loc[records['run'] == run]
+    if len(records) == 0:
+        parser.error('No records of run ' + str(run) + ' in ' + ' '.join(log_fps))
+
+    report = summarize(records)
+
+    print('Run: ', run, ', records: ', len(records))
+    with pd.option_context('display.max_rows', None, 'display.width', 250, 'display.float_format', '{:.2f}'.format):
+        print(report.to_string(index=False))
+
+    if dict_args['ofile']:
+        report.to_csv(dict_args['ofile'][0], index=False)
+
+def summarize(records):
+    ''' Summary table of the telemetry records of a run: one row per stage and step. '''
+    import numpy as np
+    import pandas as pd
+
+    records = records.copy()
+    for column in ['wall_s','cpu_s','max_rss_mb','read_bytes','write_bytes','items']:
+        records[column] = pd.to_numeric(records[column], errors='coerce') if column in records else np.nan
+    records['started'] = pd.to_datetime(records['started'])
+    records['finished'] = records['started'] + pd.to_timedelta(records['wall_s'], unit='s')
+    records['failed'] = records['status'] != 'ok'
+
+    grouped = records.groupby(['stage','step'], sort=False)
+    report = grouped.agg(records=('wall_s','size'), wall_s=('wall_s','sum'), mean_s=('wall_s','mean'), median_s=('wall_s','median'), \
+                         p95_s=('wall_s', lambda wall: wall.quantile(0.95)), max_s=('wall_s','max'), cpu_s=('cpu_s','sum'), \
+                         max_rss_mb=('max_rss_mb','max'), read_mb=('read_bytes', lambda b: b.sum(min_count=1)/1e6), \
+                         write_mb=('write_bytes', lambda b: b.sum(min_count=1)/1e6), items=('items', lambda i: i.sum(min_count=1)), \
+                         failed=('failed','sum'), first=('started','min'), last=('finished','max')).reset_index()
+    report['span_s'] = (report['last'] - report['first']).dt.total_seconds()
+    report['cpu_ratio'] = report['cpu_s']/report['wall_s']
+    report['items_per_s'] = report['items']/report['wall_s']
+
+    # Stages by total time (their main step, or the sum of their steps for the shell workflows), then steps by total time:
+    is_main = report['step'] == 'main'
+    stage_wall = report.loc[is_main].set_index('stage')['wall_s']
+    step_wall = report.loc[~is_main].groupby('stage')['wall_s'].sum()
+    report['stage_wall_s'] = report['stage'].map(stage_wall).fillna(report['stage'].map(step_wall))
+    report['share'] = np.where(is_main, np.nan, report['wall_s']/report['stage'].map(step_wall))
+    report['is_step'] = ~is_main
+    stages = report.drop_duplicates('stage').sort_values('stage_wall_s', ascending=False)['stage']
+    report = pd.concat([report.loc[report['stage'] == stage].sort_values(['is_step','wall_s'], ascending=[True, False]) for stage in stages])
+
+    return report[['stage','step','records','wall_s','span_s','share','mean_s','median_s','p95_s','max_s','cpu_s','cpu_ratio','max_rss_mb', \
+                   'read_mb','write_mb','items','items_per_s','failed']]
+
+if __name__ == "__main__": main()
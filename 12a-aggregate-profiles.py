@@ -0,0 +1,118 @@
+## This script merges the cProfile profiles dumped by the stage scripts run with --profile (or MATCHUP_PROFILE, see
+## telemetry_support.py), one per process, into one profile per stage. The work of 09 is spread over thousands of short
+## matchup processes, so no single profile is representative; the merged profile is. It is written as a pstats file, as a
+## text summary of the functions with the most time, and as folded stacks for flame graph tools (flamegraph.pl, speedscope).
+
+def main():
+
+    import argparse
+    import glob
+    import os
+    import pstats
+
+
+    parser = argparse.ArgumentParser(description='''\
+      This script merges the per-process profiles (<stage>.<host>.<pid>.<uuid>.prof) in the profile directory by stage, and writes, \
+      for each stage, the merged profile (<stage>.prof, for pstats, snakeviz, ...), the functions with the most own and cumulative \
+      time (<stage>.txt), and folded stacks (<stage>.folded, one 'stage;caller;...;function microseconds' line per stack). cProfile \
+      records callers but not whole stacks, so the time of a function called from several places is split between its callers \
+      in proportion to the time spent under each.''')
+
+    parser.add_argument('--profileDir', nargs=1, type=str, required=True, help='''\
+    Full path of the directory of the per-process profiles.''')
+
+    parser.add_argument('--ofileDir', nargs=1, type=str, required=True, help='''\
+    Full path of the directory in which to write the merged profiles.''')
+
+    parser.add_argument('--stage', nargs='+', type=str, required=False, help='''\
+    OPTIONAL: Stages (script names without extension, e.g. 09-matchup-datarows) to merge. By default, every stage is merged.''')
+
+    parser.add_argument('--top', nargs=1, type=int, default=([40]), help='''\
+    OPTIONAL: Number of functions listed in the text summaries. Default is 40.''')
+
+    args=parser.parse_args()
+    dict_args=vars(args)
+
+    # Profile files are named <stage>.<host>.<pid>.<uuid>.prof; host names may contain dots, stage names do not:
+    stage_files = {}
+    for fp in sorted(glob.glob(os.path.join(dict_args['profileDir'][0], '*.prof'))):
+        stage = os.path.basename(fp).split('.')[0]
+        if dict_args['stage'] is None or stage in dict_args['stage']:
+            stage_files.setdefault(stage, []).append(fp)
+    if not stage_files:
+        parser.error('No profiles found in ' + dict_args['profileDir'][0])
+
+    os.makedirs(dict_args['ofileDir'][0], exist_ok=True)
+    for stage, fps in stage_files.items():
+        stats = merge_profiles(fps)
+        if stats is None:
+            print('WARNING: skipped stage ', stage, ', none of its ', len(fps), ' profiles could be read')
+            continue
+        ofile_base = os.path.join(dict_args['ofileDir'][0], stage)
+        stats.dump_stats(ofile_base + '.prof')
+
+        with open(ofile_base + '.txt', 'w') as f:
+            summary = pstats.Stats(ofile_base + '.prof', stream=f)
+            f.write('Stage ' + stage + ': ' + str(len(fps)) + ' processes, ' + '%.1f' % summary.total_tt + ' s\n')
+            summary.sort_stats('tottime').print_stats(dict_args['top'][0])
+            summary.sort_stats('cumulative').print_stats(dict_args['top'][0])
+
+        with open(ofile_base + '.folded', 'w') as f:
+            for stack, seconds in sorted(folded_stacks(stats, stage).items()):
+                if round(seconds*1e6) > 0:
+                    f.write(stack + ' ' + str(round(seconds*1e6)) + '\n')
+
+        print(stage + ': ', len(fps), ' processes, ', '%.1f' % stats.total_tt, ' s profiled')
+
+def merge_profiles(fps):
+    ''' Merge the profile files into one pstats.Stats. Files that cannot be read (e.g. a process killed while dumping) are skipped;
+    returns None if none of them can be read. '''
+    import pstats
+
+    stats = None
+    for fp in fps:
+        try:
+            if stats is None:
+                stats = pstats.Stats(fp)
+            else:
+                stats.add(fp)
+        except (EOFError, ValueError, TypeError, OSError) as e:
+            print('WARNING: skipped unreadable profile ', fp, ' (', repr(e), ')')
+    return stats
+
+def folded_stacks(stats, root, min_seconds=1e-6, max_depth=100):
+    ''' Folded stacks ({'root;f1;f2': own seconds}) reconstructed from the caller/callee edges of the profile. The own time of a
+    function is split between the stacks reaching it in proportion to the cumulative time of each incoming edge. '''
+    callees = {}
+    for function, (cc, nc, tt, ct, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((function, edge[3]))
+
+    stacks = {}
+
+    def walk(function, seconds, path, names):
+        cc, nc, tt, ct, callers = stats.stats[function]
+        fraction = min(1.0, seconds/ct) if ct > 0 else 0.0
+        name = ';'.join(names)
+        stacks[name] = stacks.get(name, 0.0) + tt*fraction
+        if len(names) >= max_depth:
+            return
+        for callee, edge_seconds in callees.get(function, []):
+            if callee in path or edge_seconds*fraction < min_seconds:
+                continue
+            walk(callee, edge_seconds*fraction, path | {callee}, names + [function_name(callee)])
+
+    for function, (cc, nc, tt, ct, callers) in stats.stats.items():
+        if not callers:
+            walk(function, ct, {function}, [root, function_name(function)])
+    return stacks
+
+def function_name(function):
+    ''' Readable name of a pstats function key (file, line, name), without the characters of the folded format. '''
+    import os
+    fn, line, name = function
+    if fn == '~':
+        return name.replace(';', ',').replace(' ', '_')
+    return (os.path.basename(fn) + ':' + name).replace(';', ',').replace(' ', '_')
+
+if __name__ == "__main__": main()
@@ -43,6 +43,199 @@ from collections import OrderedDict
 
 #==========================================================================================================================================
 
+def is_number(s):
+
+    """
+    is_number determines if a given string is a number or not, does not handle complex numbers
+    returns True for int, float, or long numbers, else False
+    syntax: is_number(str)
+    """
+
+    try:
+        float(s) # handles int, long, and float, but not complex
+    except ValueError:
+        return False
+    return True
+
+#==========================================================================================================================================
+def is_int(s):
+
+    """
+    is_int determines if a given string is an integer or not, uses int()
+    returns True for int numbers, else False
+    syntax: is_int(str)
+    """
+
+    try:
+        int(s) # handles int
+    except ValueError:
+        return False
+    return True
+
+#==========================================================================================================================================
+def doy2mndy(yr, doy):
+
+    """
+    doy2mndy returns the month and day of month as integers
+    given year and julian day
+    syntax: [mn, dy] = doy2mndy(yr, doy)
+    """
+
+    from datetime import datetime
+
+    dt = datetime.strptime('{:04d}{:03d}'.format(yr,doy), '%Y%j')
+
+    return int(dt.strftime('%m')),int(dt.strftime('%d'))
+
+#==========================================================================================================================================
+def format_column(values, missing):
+
+    """
+    format_column converts a column of data values to strings for writing, all at once, substituting the missing value
+    string for missing values: None, and numbers (or numeric strings) equal to the missing value or NaN. Text values
+    (e.g. station IDs) are written verbatim.
+    values may be a list or a NumPy array (as read with readSB, row by row or columnar), missing is the missing value string
+    returns a list of strings
+    syntax: strings = format_column(values, missing)
+    """
+
+    import numpy as np
+    from math import isnan
+
+    missing_val = float(missing)
+
+    def format_value(dat):
+        if dat is None:
+            return missing
+        if is_number(dat) and (float(dat) == missing_val or isnan(float(dat))):
+            return missing
+        return str(dat)
+
+    if isinstance(values, np.ndarray) and values.dtype.kind in 'iuf':
+        numbers = values
+        strings = list(map(str, values.tolist()))
+
+    elif isinstance(values, np.ndarray) and values.dtype.kind == 'U':
+        strings = values.tolist()
+        try:
+            numbers = values.astype(np.float64)
+        except ValueError:
+            # Only values starting like a number (or nan/inf) can be numeric; the rest is text, written verbatim:
+            candidates = np.isin(values.astype('U1'), list(' \t0123456789+-.nNiI'))
+            for idx in np.flatnonzero(candidates):
+                strings[idx] = format_value(strings[idx])
+            return strings
+
+    else:
+        values = list(values)
+        types = set(map(type, values))
+        if types <= {int, float}:
+            numbers = np.array(values, dtype=np.float64)
+            strings = list(map(str, values))
+        elif types <= {str, np.str_}:
+            return format_column(np.array(values, dtype=str), missing)
+        else:
+            return [format_value(dat) for dat in values]
+
+    mask = numbers == missing_val
+    if numbers.dtype.kind == 'f':
+        mask |= np.isnan(numbers)
+    for idx in np.flatnonzero(mask):
+        strings[idx] = missing
+
+    return strings
+
+#==========================================================================================================================================
+def concatenate_npy(parts, ofile):
+
+    """
+    concatenate_npy concatenates the 1-D arrays of the .npy files parts into the .npy file ofile, one part at a time
+    (written memory-mapped), and removes the parts. Text and numbers are promoted as by NumPy (e.g. int64 and float64
+    to float64), except that text mixed with numbers (or object parts) gives an object array, held in memory to be saved.
+    returns the dtype of the concatenated array
+    syntax: dtype = concatenate_npy(parts, ofile)
+    """
+
+    import os
+    import numpy as np
+
+    dtypes = []
+    lengths = []
+    for fp in parts:
+        with open(fp,'rb') as fileobj:
+            read_array_header = np.lib.format.read_array_header_1_0 if np.lib.format.read_magic(fileobj) == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = read_array_header(fileobj)
+        dtypes.append(dtype)
+        lengths.append(shape[0])
+
+    kinds = set(dtype.kind for dtype in dtypes)
+    if 'O' in kinds or ('U' in kinds and len(kinds) > 1):
+        dtype = np.dtype(object)
+        np.save(ofile, np.concatenate([np.load(fp, allow_pickle=True).astype(object) for fp in parts]), allow_pickle=True)
+    else:
+        dtype = np.result_type(*dtypes)
+        out = np.lib.format.open_memmap(ofile, mode='w+', dtype=dtype, shape=(sum(lengths),))
+        start = 0
+        for fp,length in zip(parts,lengths):
+            out[start:start+length] = np.load(fp)
+            start += length
+        out.flush()
+        del out
+
+    for fp in parts:
+        os.remove(fp)
+
+    return dtype
+
+#==========================================================================================================================================
+def writeSB(ofile, headers, comments, data, missing=None, length=None, append=False):
+
+    """
+    writeSB writes out a SeaBASS file given an output file name, an ordered dictionary of headers (without the leading /,
+    including delimiter and missing), a list of comments (without the leading !), and an ordered dictionary of data columns
+    (lists or NumPy arrays) keyed by field name. Whole columns are formatted at once with format_column.
+    Optional arguments:
+    missing = missing value string written for missing and NaN values, default set to the /missing header
+    length  = number of rows to write, default set to the length of the data columns
+    append  = flag to append the rows to an existing file written by writeSB (e.g. chunk by chunk), without writing
+              the headers and comments again, default set to False
+    syntax: writeSB(ofile, headers, comments, data)
+    """
+
+    if missing is None:
+        missing = headers['missing']
+
+    if   'comma' in headers['delimiter']:
+        delim = ','
+    elif 'space' in headers['delimiter']:
+        delim = ' '
+    elif 'tab'   in headers['delimiter']:
+        delim = '\t'
+
+    if length is None:
+        length = min([len(data[var]) for var in data], default=0)
+
+    columns = [format_column(data[var][0:length], missing) for var in data]
+
+    with open(ofile,'a' if append else 'w') as fout:
+
+        if not append:
+            fout.write('/begin_header\n')
+
+            for header in headers:
+                fout.write('/' + header + '=' + headers[header] + '\n')
+
+            for comment in comments:
+                fout.write('!' + comment + '\n')
+
+            fout.write('/end_header\n')
+
+        # write the rows in blocks, to bound the size of the joined text:
+        for start in range(0, length, 100000):
+            rows = zip(*[column[start:start+100000] for column in columns])
+            fout.write('\n'.join(map(delim.join, rows)) + '\n')
+
+    return
 
 #==========================================================================================================================================
 
@@ -63,11 +256,19 @@ class readSB:
         Returned sub-functions:
         .fd_datetime()                                  - Converts date and time information from the file's data matrix to a Python
                                                           list of datetime objects
+        .fd_datetime64(as_datetime)                     - Converts date and time information from the file's data matrix to a NumPy
+                                                          array of datetime64 values, column by column
         .addDataToOutput(irow,var_name,units,var_value) - Adds or appends single data point to data matrix given row index, field name,
                                                           field units, and data value, handling fields & units headers and missing values
+        .addRowsToOutput(data,units)                    - Appends a batch of rows to data matrix given a dictionary of columns keyed by
+                                                          field name, handling fields & units headers and missing values
         .writeSBfile(ofile)                             - Writes headers, comments, and data into a SeaBASS file specified by ofile
+        .iter_chunks(chunksize)                         - Reads the data matrix in chunks of rows, yielding one columnar readSB object
+                                                          per chunk
+        .load_cache() / .write_cache()                  - Loads/writes the parsed columns, headers, and datetimes from/to the binary
+                                                          sidecar cache directory (filename + '.cache')
     """
-    def __init__(self, filename, mask_missing=True, mask_above_detection_limit=True, mask_below_detection_limit=True, no_warn=False, mask_commented_headers = True):
+    def __init__(self, filename, mask_missing=True, mask_above_detection_limit=True, mask_below_detection_limit=True, no_warn=False, mask_commented_headers = True, columnar=False, chunksize=None, cache=False):
         """
         Required arguments:
         filename = name of SeaBASS input file (string)
@@ -77,6 +278,23 @@ class readSB:
         mask_above_detection_limit = flag to set above_detection_limit values to NaN, default set to True
         mask_below_detection_limit = flag to set below_detection_limit values to NaN, default set to True
         no_warn                    = flag to suppress warnings, default set to False
+        columnar                   = flag to parse the data block column by column into typed NumPy arrays, default set to False.
+                                     .data then holds one array per field: int64 or float64 for numeric fields (float64 with NaNs
+                                     if any value was masked), str for text fields, and object for fields mixing numbers and text.
+                                     Much faster for large files, but the arrays cannot be extended with addDataToOutput.
+        chunksize                  = number of data rows per chunk. If set, only the header is read here (.data holds no rows and
+                                     .length is 0), and the data matrix is read, chunksize rows at a time, by iterating over
+                                     iter_chunks(). Memory use is then bounded by the chunk size rather than the file size.
+        cache                      = flag to reuse (or write) a binary sidecar cache of the parsed file, default set to False. Only used
+                                     with columnar=True. The cache directory (filename + '.cache') holds one .npy file per field, the
+                                     datetimes from fd_datetime64(), and the headers. It is keyed by the size, modification time, and
+                                     SHA-256 hash of the file and by the mask flags, and is rewritten whenever the key changes; the file
+                                     is only hashed when its size or modification time differ from the cache's. Cached columns are
+                                     opened as read-only memory maps instead of parsed, so they cannot be modified in place (replace
+                                     the column with a copy first, e.g. np.array(column)); the cached datetimes are dropped once data
+                                     is added with addRowsToOutput or addDataToOutput. Warnings are not repeated when the cache is
+                                     used. With chunksize, iter_chunks slices the cached columns, or, if there is no valid cache, writes
+                                     the cache chunk by chunk as it reads the file, so memory use stays bounded by the chunk size.
         """
         self.filename          = filename
         self.headers           = OrderedDict()
@@ -91,54 +309,23 @@ class readSB:
         self.empty_col         = []
         self.data_use_warning  = False
         self.err_suffixes      = ['_cv', '_sd', '_se', '_bincount']
+        self.mask_missing      = mask_missing
+        self.mask_adl          = mask_above_detection_limit
+        self.mask_bdl          = mask_below_detection_limit
+        self.chunksize         = chunksize
+        self.header_length     = 0
+        self.delim             = ''
+        self.mask_commented_headers = mask_commented_headers
+        self.cache_path        = ''
+        self.cached_datetime   = None
 
         end_header             = False
-        #utility functions put here instead of outside of class because it was making it very hard to import into other classes/packages
-        def is_number(s):
-
-            """
-            is_number determines if a given string is a number or not, does not handle complex numbers
-            returns True for int, float, or long numbers, else False
-            syntax: is_number(str)
-            """
-
-            try:
-                float(s) # handles int, long, and float, but not complex
-            except ValueError:
-                return False
-            return True
-
-        #==========================================================================================================================================
-        def is_int(s):
-
-            """
-            is_int determines if a given string is an integer or not, uses int()
-            returns True for int numbers, else False
-            syntax: is_int(str)
-            """
-
-            try:
-                int(s) # handles int
-            except ValueError:
-                return False
-            return True
-
-        #==========================================================================================================================================
-        def doy2mndy(yr, doy):
-
-            """
-            doy2mndy returns the month and day of month as integers
-            given year and julian day
-            syntax: [mn, dy] = doy2mndy(yr, doy)
-            """
-
-            from datetime import datetime
-
-            dt = datetime.strptime('{:04d}{:03d}'.format(yr,doy), '%Y%j')
-
-            return int(dt.strftime('%m')),int(dt.strftime('%d'))
-
 
+        use_cache = cache and columnar
+        if use_cache:
+            self.cache_path = self.filename + '.cache'
+            if self.load_cache():
+                return
 
         try:
             fileobj = open(self.filename,'r')
@@ -148,17 +335,28 @@ class readSB:
             return
 
         try:
-            lines = fileobj.readlines()
+            if chunksize:
+                # read only up to the end of the header; the data lines are read by iter_chunks
+                header_lines = []
+                for line in fileobj:
+                    header_lines.append(line)
+                    if '/end_header' in line.lower():
+                        break
+                text = ''.join(header_lines)
+            else:
+                text = fileobj.read()
             fileobj.close()
 
         except Exception as e:
             raise Exception('Unable to read data from file: {:}. Error: {:}'.format(self.filename,e))
             return
 
-        """ Remove any/all newline and carriage return characters """
-        lines = [re.sub("[\r\n]+",'',line).strip() for line in lines]
+        """ Split into lines, removing any/all newline and carriage return characters (already translated to newlines when reading in text mode) """
+        lines = [line.strip() for line in text.split('\n')]
+        if text.endswith('\n'):
+            lines.pop()
 
-        for line in lines:
+        for iline,line in enumerate(lines):
 
             """ Extract header """
             if not end_header \
@@ -273,30 +471,23 @@ class readSB:
                         print('Warning: No below_detection_limit in file: {:}. Unable to mask values as NaNs. Use no_warn=True to suppress this message.'.format(self.filename))
 
                 end_header = True
+                self.header_length = iline + 1
+                self.delim = delim
+
+                if columnar:
+                    data_lines = lines[iline+1:]
+                    break
+
+                if chunksize:
+                    break
+
                 continue
 
             """ Extract data after headers """
             if end_header and line:
                 try:
                     for var,dat in zip(_vars,re.split(delim,line)):
-                        if is_number(dat):
-                            if is_int(dat):
-                                dat = int(dat)
-                            else:
-                                dat = float(dat)
-
-                            if mask_above_detection_limit and self.adl != '':
-                                if dat == float(self.adl):
-                                    dat = float('nan')
-
-                            if mask_below_detection_limit and self.bdl != '':
-                                if dat == float(self.bdl):
-                                    dat = float('nan')
-
-                            if mask_missing and dat == self.missing:
-                                dat = float('nan')
-
-                        self.data[var].append(dat)
+                        self.data[var].append(self.parse_value(dat))
 
                     self.length = self.length + 1
 
@@ -304,6 +495,10 @@ class readSB:
                     raise Exception('Unable to parse data from line in file: {:}. Error: {:}. In line: {:}'.format(self.filename,e,line))
                     return
 
+        """ Extract data after headers, column by column """
+        if columnar and end_header and not chunksize:
+            self.data, self.length = self.parse_columns(data_lines, _vars, delim)
+
         try:
             self.variables = OrderedDict(zip(_vars,zip(_vars,_units)))
 
@@ -313,8 +508,460 @@ class readSB:
 
             self.variables = OrderedDict(zip(_vars,_vars))
 
+        # With chunksize, the cache is written by iter_chunks as it reads the data matrix:
+        if use_cache and end_header and not chunksize:
+            self.write_cache()
+
+        return
+
+#==========================================================================================================================================
+
+    def cache_key(self, sha256=True):
+
+        """
+        cache_key returns the key of the binary sidecar cache: the size, modification time, and SHA-256 hash of the
+        file, and the mask flags the file was read with; the hash (a full read of the file) is left out unless sha256
+        syntax: key = SELF.cache_key(sha256)
+        """
+
+        import hashlib
+
+        info = stat(self.filename)
+
+        key = {'version'               : 1,
+               'size'                  : info.st_size,
+               'mtime'                 : info.st_mtime_ns,
+               'mask_missing'          : self.mask_missing,
+               'mask_adl'              : self.mask_adl,
+               'mask_bdl'              : self.mask_bdl,
+               'mask_commented_headers': self.mask_commented_headers}
+
+        if sha256:
+            file_hash = hashlib.sha256()
+            with open(self.filename,'rb') as fileobj:
+                for block in iter(lambda: fileobj.read(1 << 24), b''):
+                    file_hash.update(block)
+            key['sha256'] = file_hash.hexdigest()
+
+        return key
+
+#==========================================================================================================================================
+
+    def load_cache(self):
+
+        """
+        load_cache fills SELF from the binary sidecar cache if it exists and its key matches the file, opening the
+        cached columns memory-mapped (read-only); returns True if the cache was used, else False
+        syntax: used = SELF.load_cache()
+        """
+
+        import os
+        import json
+        import numpy as np
+
+        meta_fp = os.path.join(self.cache_path, 'meta.json')
+        if not os.path.isfile(meta_fp):
+            return False
+
+        try:
+            with open(meta_fp,'r') as fileobj:
+                meta = json.load(fileobj)
+
+            # The file is only hashed if its size and modification time do not tell it is unchanged (e.g. it was touched or copied):
+            key = self.cache_key(sha256=False)
+            if {k:v for k,v in meta['key'].items() if k != 'sha256'} != key:
+                if {k:v for k,v in meta['key'].items() if k not in ['sha256','mtime']} != {k:v for k,v in key.items() if k != 'mtime'}:
+                    return False
+                key = self.cache_key()
+                if meta['key'].get('sha256') != key['sha256']:
+                    return False
+                meta['key'] = key
+                try:
+                    self.write_cache_meta(self.cache_path, meta)
+                except OSError:
+                    pass
+
+            data = OrderedDict()
+            for ivar,var in enumerate(meta['fields']):
+                data[var] = np.load(os.path.join(self.cache_path, '{:d}.npy'.format(ivar)), mmap_mode=None if var in meta['object_fields'] else 'r', allow_pickle=var in meta['object_fields'])
+
+            if meta['datetime']:
+                self.cached_datetime = np.load(os.path.join(self.cache_path, 'datetime.npy'), mmap_mode='r')
+
+        except Exception as e:
+            print('Warning: unable to read cache {:}, parsing the file instead. Error: {:}'.format(self.cache_path,e))
+            return False
+
+        self.headers          = OrderedDict(meta['headers'])
+        self.comments         = meta['comments']
+        self.variables        = OrderedDict((var, tuple(value) if isinstance(value, list) else value) for var,value in meta['variables'])
+        self.missing          = meta['missing']
+        self.adl              = meta['adl']
+        self.bdl              = meta['bdl']
+        self.pi               = meta['pi']
+        self.data_use_warning = meta['data_use_warning']
+        self.header_length    = meta['header_length']
+        self.delim            = meta['delim']
+        self.data             = data
+        self.length           = meta['length']
+
+        return True
+
+#==========================================================================================================================================
+
+    def write_cache(self):
+
+        """
+        write_cache writes the parsed columns, the datetimes from fd_datetime64() (if the file has valid date and time
+        information), and the headers to the binary sidecar cache, replacing any previous cache
+        The cache is written to a temporary directory that is then renamed, so readers never see a partial cache.
+        syntax: SELF.write_cache()
+        """
+
+        import os
+        import shutil
+        import numpy as np
+
+        try:
+            dt = self.fd_datetime64() if self.length else []
+        except ValueError:
+            dt = []
+
+        tmp_path = ''
+        try:
+            tmp_path = self.cache_tmp_path()
+            for ivar,var in enumerate(self.data):
+                np.save(os.path.join(tmp_path, '{:d}.npy'.format(ivar)), np.asarray(self.data[var]), allow_pickle=np.asarray(self.data[var]).dtype == object)
+            if len(dt) > 0:
+                np.save(os.path.join(tmp_path, 'datetime.npy'), dt)
+            self.publish_cache(tmp_path, list(self.data.keys()), [var for var in self.data if np.asarray(self.data[var]).dtype == object], len(dt) > 0, self.length)
+
+        except Exception as e:
+            print('Warning: unable to write cache {:}. Error: {:}'.format(self.cache_path,e))
+            if tmp_path:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+
+        if len(dt) > 0:
+            self.cached_datetime = dt
+
+        return
+
+#==========================================================================================================================================
+
+    def write_cache_chunks(self, chunks):
+
+        """
+        write_cache_chunks writes the binary sidecar cache from the chunks of the data matrix (as read by iter_chunks),
+        yielding each chunk once it is saved, so the whole data matrix is never held in memory: the columns and datetimes
+        of each chunk are saved to the temporary cache directory, then concatenated column by column into memory-mapped
+        .npy files once the last chunk is read. Fields whose chunks mix text and numbers are saved as object arrays, as
+        the columnar parser would. No cache is written if the chunks are not all read.
+        syntax: for chunk in SELF.write_cache_chunks(chunks): ...
+        """
+
+        import os
+        import shutil
+        import numpy as np
+
+        tmp_path = ''
+        try:
+            tmp_path = self.cache_tmp_path()
+        except Exception as e:
+            print('Warning: unable to write cache {:}. Error: {:}'.format(self.cache_path,e))
+
+        lengths = []
+        datetimes = True
+        try:
+            for chunk in chunks:
+                if tmp_path:
+                    try:
+                        chunk.cached_datetime = chunk.fd_datetime64()
+                    except ValueError:
+                        datetimes = False
+                    for ivar,var in enumerate(chunk.data):
+                        np.save(os.path.join(tmp_path, '{:d}.{:d}.npy'.format(ivar, len(lengths))), chunk.data[var], allow_pickle=chunk.data[var].dtype == object)
+                    if datetimes:
+                        np.save(os.path.join(tmp_path, 'datetime.{:d}.npy'.format(len(lengths))), chunk.cached_datetime)
+                    lengths.append(chunk.length)
+                yield chunk
+
+            if tmp_path:
+                if not lengths:
+                    self.data, self.length = self.parse_columns([], list(self.variables.keys()), self.delim)
+                    self.write_cache()
+                else:
+                    object_fields = []
+                    for ivar,var in enumerate(self.variables):
+                        parts = [os.path.join(tmp_path, '{:d}.{:d}.npy'.format(ivar, ichunk)) for ichunk in range(len(lengths))]
+                        if concatenate_npy(parts, os.path.join(tmp_path, '{:d}.npy'.format(ivar))) == object:
+                            object_fields.append(var)
+                    if datetimes:
+                        concatenate_npy([os.path.join(tmp_path, 'datetime.{:d}.npy'.format(ichunk)) for ichunk in range(len(lengths))], os.path.join(tmp_path, 'datetime.npy'))
+                    self.publish_cache(tmp_path, list(self.variables.keys()), object_fields, datetimes, sum(lengths))
+                tmp_path = ''
+
+        except Exception as e:
+            print('Warning: unable to write cache {:}. Error: {:}'.format(self.cache_path,e))
+
+        finally:
+            if tmp_path:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+
         return
 
+#==========================================================================================================================================
+
+    def cache_tmp_path(self):
+
+        """
+        cache_tmp_path creates and returns a temporary directory next to the binary sidecar cache, in which to write it
+        syntax: tmp_path = SELF.cache_tmp_path()
+        """
+
+        import os
+        import tempfile
+
+        return tempfile.mkdtemp(prefix=os.path.basename(self.cache_path) + '.', dir=os.path.dirname(os.path.abspath(self.cache_path)))
+
+#==========================================================================================================================================
+
+    def publish_cache(self, tmp_path, fields, object_fields, datetimes, length):
+
+        """
+        publish_cache writes the headers and key of the cache written to tmp_path (one .npy file per field, of length rows,
+        and datetime.npy if datetimes), then renames it to the binary sidecar cache, replacing any previous cache
+        syntax: SELF.publish_cache(tmp_path, fields, object_fields, datetimes, length)
+        """
+
+        import os
+        import shutil
+
+        meta = {'key'             : self.cache_key(),
+                'fields'          : fields,
+                'object_fields'   : object_fields,
+                'datetime'        : datetimes,
+                'headers'         : list(self.headers.items()),
+                'comments'        : self.comments,
+                'variables'       : list(self.variables.items()),
+                'missing'         : self.missing,
+                'adl'             : self.adl,
+                'bdl'             : self.bdl,
+                'pi'              : self.pi,
+                'data_use_warning': self.data_use_warning,
+                'header_length'   : self.header_length,
+                'delim'           : self.delim,
+                'length'          : length}
+
+        self.write_cache_meta(tmp_path, meta)
+
+        if os.path.isdir(self.cache_path):
+            shutil.rmtree(self.cache_path)
+        os.rename(tmp_path, self.cache_path)
+
+        return
+
+#==========================================================================================================================================
+
+    def write_cache_meta(self, cache_path, meta):
+
+        """
+        write_cache_meta writes (or replaces) the headers and key of a cache directory
+        syntax: SELF.write_cache_meta(cache_path, meta)
+        """
+
+        import os
+        import json
+
+        with open(os.path.join(cache_path, 'meta.json.tmp'),'w') as fileobj:
+            json.dump(meta, fileobj)
+        os.replace(os.path.join(cache_path, 'meta.json.tmp'), os.path.join(cache_path, 'meta.json'))
+
+        return
+
+#==========================================================================================================================================
+
+    def iter_chunks(self, chunksize=None):
+
+        """
+        iter_chunks reads the data matrix after the header (or, if the rows were already read, e.g. from the cache, slices
+        them), chunksize rows at a time, and yields a copy of SELF per chunk
+        whose .data holds the chunk's rows as columns (as parsed with columnar=True) and whose .length is the chunk's
+        number of rows, so chunk.fd_datetime64() and the other sub-functions work on the chunk. Blank lines are not counted.
+        chunksize defaults to the chunksize the file was opened with (or the whole file, if none).
+        syntax: for chunk in SELF.iter_chunks(chunksize): ...
+        """
+
+        from copy import copy
+        from itertools import islice
+
+        if not chunksize:
+            chunksize = self.chunksize
+
+        if not self.header_length:
+            raise Exception('No /end_header detected in file: {:}'.format(self.filename))
+            return
+
+        # Rows already read (e.g. from the cache) are sliced rather than read again:
+        if self.length:
+            if not chunksize:
+                chunksize = self.length
+            for start in range(0, self.length, chunksize):
+                chunk = copy(self)
+                chunk.headers = self.headers.copy()
+                chunk.empty_col = []
+                chunk.data = OrderedDict((var, self.data[var][start:start+chunksize]) for var in self.data)
+                chunk.length = min(chunksize, self.length - start)
+                chunk.cache_path = ''
+                if self.cached_datetime is not None:
+                    chunk.cached_datetime = self.cached_datetime[start:start+chunksize]
+                yield chunk
+            return
+
+        _vars = list(self.variables.keys())
+
+        def chunk_of(data_lines):
+            chunk = copy(self)
+            chunk.headers = self.headers.copy()
+            chunk.empty_col = []
+            chunk.cache_path = ''
+            chunk.cached_datetime = None
+            chunk.data, chunk.length = self.parse_columns(data_lines, _vars, self.delim)
+            return chunk
+
+        try:
+            fileobj = open(self.filename,'r')
+
+        except Exception as e:
+            raise Exception('Unable to open file for reading: {:}. Error: {:}'.format(self.filename,e))
+            return
+
+        def read_chunks():
+            with fileobj:
+                data_lines = []
+                for line in islice(fileobj, self.header_length, None):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    data_lines.append(line)
+                    if chunksize and len(data_lines) == chunksize:
+                        yield chunk_of(data_lines)
+                        data_lines = []
+
+                if data_lines:
+                    yield chunk_of(data_lines)
+
+        # Opened with cache and chunksize, but without a valid cache: the cache is written as the chunks are read.
+        if self.cache_path:
+            yield from self.write_cache_chunks(read_chunks())
+        else:
+            yield from read_chunks()
+
+        return
+
+#==========================================================================================================================================
+
+    def parse_value(self, dat):
+
+        """
+        parse_value converts a single data value to an int or float if it is numeric, and sets it to NaN if
+        it matches the above/below detection limit or missing value (as requested when the file was read)
+        syntax: value = SELF.parse_value(str)
+        """
+
+        if is_number(dat):
+            if is_int(dat):
+                dat = int(dat)
+            else:
+                dat = float(dat)
+
+            if self.mask_adl and self.adl != '':
+                if dat == float(self.adl):
+                    dat = float('nan')
+
+            if self.mask_bdl and self.bdl != '':
+                if dat == float(self.bdl):
+                    dat = float('nan')
+
+            if self.mask_missing and dat == self.missing:
+                dat = float('nan')
+
+        return dat
+
+#==========================================================================================================================================
+
+    def parse_columns(self, data_lines, _vars, delim):
+
+        """
+        parse_columns converts data lines into typed NumPy arrays, one per field, applying the
+        detection limit and missing value masks to whole columns at once
+        Fields are converted to int64 if every value is an integer, else to float64 if every value is numeric
+        (float64 with NaNs if any value was masked). Fields that are not entirely numeric are converted value
+        by value with parse_value, and returned as str arrays, or object arrays if numbers and text are mixed.
+        Lines with fewer values than fields are padded with empty values (''), and extra values are ignored.
+        syntax: [data, length] = SELF.parse_columns(data_lines, fields, delimiter_regex)
+        """
+
+        import numpy as np
+
+        data_lines = [line for line in data_lines if line]
+        length = len(data_lines)
+        nvars = len(_vars)
+        data = OrderedDict()
+
+        if length == 0:
+            for var in _vars:
+                data[var] = np.array([])
+            return data, length
+
+        # Without runs of delimiters, the regex split is equivalent to the (much faster) plain string split.
+        # If every line also holds exactly one value per field, the whole block is split at once.
+        block = '\n'.join(data_lines)
+        separator = {',+':',', '\t+':'\t', '\s+':None}[delim]
+        if separator is not None and separator*2 not in block and all(line.count(separator) == nvars-1 for line in data_lines):
+            cells = np.array(block.replace('\n', separator).split(separator), dtype=str).reshape(length, nvars)
+        else:
+            if separator is None or separator*2 not in block:
+                rows = [line.split(separator) for line in data_lines]
+            else:
+                split = re.compile(delim).split
+                rows = [split(line) for line in data_lines]
+            if set(map(len, rows)) != {nvars}:
+                rows = [(row + ['']*nvars)[0:nvars] for row in rows]
+            cells = np.array(rows, dtype=str)
+
+        for ivar,var in enumerate(_vars):
+            column = cells[:,ivar]
+            try:
+                try:
+                    values = column.astype(np.int64)
+                except ValueError:
+                    values = column.astype(np.float64)
+            except (ValueError, OverflowError):
+                # Only values starting like a number (or nan/inf) can be numeric; the rest stay text:
+                candidates = np.isin(column.astype('U1'), list(' \t0123456789+-.nNiI'))
+                parsed = [self.parse_value(dat) for dat in column[candidates]]
+                if all(isinstance(dat, str) for dat in parsed):
+                    data[var] = column
+                else:
+                    data[var] = column.astype(object)
+                    data[var][candidates] = parsed
+                continue
+
+            mask = np.zeros(length, dtype=bool)
+            if self.mask_adl and self.adl != '':
+                mask |= values == float(self.adl)
+            if self.mask_bdl and self.bdl != '':
+                mask |= values == float(self.bdl)
+            if self.mask_missing:
+                mask |= values == self.missing
+            if mask.any():
+                values = values.astype(np.float64)
+                values[mask] = np.nan
+
+            data[var] = values
+
+        return data, length
+
 #==========================================================================================================================================
     #fractional seconds can have anywhere from 1 to 6 digits, but datetime will prepend 0s to number until it is 6 digits for some reason
     def millisecondToMicrosecond(self, millisecond):
@@ -747,6 +1394,202 @@ class readSB:
 
         return(dt)
 
+#==========================================================================================================================================
+
+    def fd_datetime64(self, as_datetime=False):
+        """ Convert date and time information from the file's data to a NumPy array of datetime64 values, column by column.
+
+            Optional arguments:
+            as_datetime = flag to return a Python list of datetime objects instead, as returned by fd_datetime(), default set to False
+
+            Returned data structure:
+            dt = a NumPy array of datetime64[us] values (or a list of Python datetime objects if as_datetime=True)
+
+            Looks for the same fields, in the same order, as fd_datetime(). Fractional seconds are converted to
+            microseconds as in millisecondToMicrosecond. Each date and time column is converted at once with
+            integer arithmetic; text columns not in the expected yyyymmdd or hh:mm:ss[.ffffff] layout are
+            matched row by row with the same regular expressions as fd_datetime(). When the file was read from its
+            cache (see cache in __init__), the cached datetimes are returned until data is added to the file.
+        """
+        import numpy as np
+
+        dateRegex = "(\d{4})(\d{2})(\d{2})"
+        timeRegex = "(\d{1,2})\:(\d{2})\:(\d{2})(\.\d{1,6})?"
+
+        if self.length == 0:
+            raise ValueError('readSB.data structure is missing for file: {:}'.format(self.filename))
+            return
+
+        if self.cached_datetime is not None:
+            dt = np.asarray(self.cached_datetime)
+            if as_datetime:
+                return dt.astype(object).tolist()
+            return dt
+
+        def int_column(field):
+            values = np.asarray(self.data[field])
+            if values.dtype.kind == 'f' and np.isnan(values).any():
+                raise ValueError(field + ' contains NaN values')
+            try:
+                return values.astype(np.int64)
+            except (ValueError, TypeError):
+                return np.array([int(value) for value in values], dtype=np.int64)
+
+        def fraction_to_microsecond(fraction):
+            # '' -> 0, '5' -> 500000, '25' -> 250000, as in millisecondToMicrosecond
+            if (np.char.str_len(fraction) > 6).any():
+                raise ValueError('more than 6 digits of fractional seconds')
+            return np.char.ljust(fraction, 6, '0').astype(np.int64)
+
+        def second_column(field):
+            # seconds, including fractional seconds, in microseconds
+            values = np.asarray(self.data[field])
+            if values.dtype.kind in 'iu':
+                return values.astype(np.int64)*1000000
+            if values.dtype.kind == 'f':
+                if np.isnan(values).any():
+                    raise ValueError(field + ' contains NaN values')
+                return np.round(values*1000000).astype(np.int64)
+            second, _, fraction = np.char.partition(values.astype(str), '.').T
+            return second.astype(np.int64)*1000000 + fraction_to_microsecond(fraction)
+
+        def regex_columns(values, regex, ngroups):
+            # row by row match, returning ngroups integer columns and the fractional seconds group (if any) in microseconds
+            matches = [re.search(regex, str(value)) for value in values]
+            groups = np.array([[int(match.group(i+1)) for i in range(ngroups)] for match in matches], dtype=np.int64).reshape(-1, ngroups)
+            fraction = np.array([(match.group(ngroups+1) or '.').replace('.','') if match.re.groups > ngroups else '' for match in matches], dtype=str)
+            return list(groups.T) + [fraction_to_microsecond(fraction)]
+
+        def date_values(values):
+            # yyyymmdd dates (numbers or text) to year, month, day columns
+            values = np.asarray(values)
+            if values.dtype.kind in 'iuf':
+                if values.dtype.kind == 'f' and np.isnan(values).any():
+                    raise ValueError('date contains NaN values')
+                values = values.astype(np.int64)
+                return values//10000, values//100 % 100, values % 100
+            values = np.char.strip(values.astype(str))
+            if ((np.char.str_len(values) == 8) & np.char.isdigit(values)).all():
+                values = values.astype(np.int64)
+                return values//10000, values//100 % 100, values % 100
+            return regex_columns(values, dateRegex, 3)[0:3]
+
+        def time_values(values):
+            # hh:mm:ss[.ffffff] times to hour, minute, and microsecond columns
+            values = np.char.strip(np.asarray(values).astype(str))
+            hour, _, rest = np.char.partition(values, ':').T
+            minute, _, rest = np.char.partition(rest, ':').T
+            second, _, fraction = np.char.partition(rest, '.').T
+            if (np.char.isdigit(hour) & np.char.isdigit(minute) & np.char.isdigit(second) & (np.char.isdigit(fraction) | (fraction == '')) & \
+                (np.char.str_len(hour) <= 2) & (np.char.str_len(minute) == 2) & (np.char.str_len(second) == 2)).all():
+                return hour.astype(np.int64), minute.astype(np.int64), second.astype(np.int64)*1000000 + fraction_to_microsecond(fraction)
+            hour, minute, second, fraction = regex_columns(values, timeRegex, 3)
+            return hour, minute, second*1000000 + fraction
+
+        def days_from_ymd(year, month, day):
+            months = (year - 1970)*12 + (month - 1)
+            first = months.astype('datetime64[M]').astype('datetime64[D]')
+            days = first + (day - 1).astype('timedelta64[D]')
+            valid = (month >= 1) & (month <= 12) & (day >= 1) & (days < (months + 1).astype('datetime64[M]').astype('datetime64[D]'))
+            return days, valid
+
+        def days_from_ysdy(year, sdy):
+            first = ((year - 1970)*12).astype('datetime64[M]').astype('datetime64[D]')
+            days = first + (sdy - 1).astype('timedelta64[D]')
+            valid = (sdy >= 1) & (days < ((year - 1969)*12).astype('datetime64[M]').astype('datetime64[D]'))
+            return days, valid
+
+        def repeat(value):
+            return np.full(self.length, value, dtype=np.int64)
+
+        # Sources of the date and of the time of day, each with the fields/headers they require:
+        date_sources = {'date'      : lambda d: 'date' in d,
+                        'ymd'       : lambda d: 'year' in d and 'month' in d and 'day' in d,
+                        'ysdy'      : lambda d: 'year' in d and 'sdy' in d,
+                        'start_date': lambda d: 'start_date' in self.headers}
+        time_sources = {'time'      : lambda d: 'time' in d,
+                        'hms'       : lambda d: 'hour' in d and 'minute' in d and 'second' in d,
+                        'hm'        : lambda d: 'hour' in d and 'minute' in d,
+                        'h'         : lambda d: 'hour' in d,
+                        'start_time': lambda d: 'start_time' in self.headers,
+                        None        : lambda d: True}
+
+        # Same order as fd_datetime():
+        layouts = [('date','time','date/time'),
+                   ('ymd','hms','year/month/day/hour/minute/second'),
+                   ('ymd','time','year/month/day/time'),
+                   ('date','hms','date/hour/minute/second'),
+                   ('date_time',None,'date_time'),
+                   ('ysdy','hms','year/sdy/hour/minute/second'),
+                   ('ysdy','time','year/sdy/time'),
+                   ('start_date','time','start_date header and time'),
+                   ('start_date','hms','start_date header and hour/minute/second'),
+                   ('ymd','hm','year/month/day/hour/minute'),
+                   ('date','hm','date/hour/minute'),
+                   ('ysdy','hm','year/sdy/hour/minute'),
+                   ('ymd','h','year/month/day/hour'),
+                   ('date','h','date/hour'),
+                   ('ysdy','h','year/sdy/hour'),
+                   ('ymd',None,'year/month/day'),
+                   ('date',None,'date'),
+                   ('ysdy',None,'year/sdy'),
+                   ('start_date','start_time','/start_date and /start_time headers'),
+                   ('start_date',None,'/start_date header')]
+
+        for date_source, time_source, description in layouts:
+            if date_source == 'date_time':
+                if 'date_time' not in self.data:
+                    continue
+            elif not (date_sources[date_source](self.data) and time_sources[time_source](self.data)):
+                continue
+
+            try:
+                if date_source == 'date_time':
+                    year, month, day, hour, minute, second, fraction = \
+                        regex_columns(self.data['date_time'], "\{?(\d{4})-(\d{2})-(\d{2})\}?[\sT](\d{1,2})\:(\d{2})\:(\d{2})(\.\d{1,6})?", 6)
+                    days, valid = days_from_ymd(year, month, day)
+                    microsecond = second*1000000 + fraction
+                else:
+                    if date_source == 'date':
+                        days, valid = days_from_ymd(*date_values(self.data['date']))
+                    elif date_source == 'ymd':
+                        days, valid = days_from_ymd(int_column('year'), int_column('month'), int_column('day'))
+                    elif date_source == 'ysdy':
+                        days, valid = days_from_ysdy(int_column('year'), int_column('sdy'))
+                    else:
+                        year, month, day = date_values([self.headers['start_date']])
+                        days, valid = days_from_ymd(repeat(year[0]), repeat(month[0]), repeat(day[0]))
+
+                    if time_source == 'time':
+                        hour, minute, microsecond = time_values(self.data['time'])
+                    elif time_source == 'start_time':
+                        hour, minute, second, fraction = regex_columns([self.headers['start_time']], timeRegex + "\[(gmt|GMT)\]", 3)
+                        hour, minute, microsecond = repeat(hour[0]), repeat(minute[0]), repeat(second[0]*1000000 + fraction[0])
+                    else:
+                        hour = int_column('hour') if time_source in ['hms','hm','h'] else repeat(0)
+                        minute = int_column('minute') if time_source in ['hms','hm'] else repeat(0)
+                        microsecond = second_column('second') if time_source == 'hms' else repeat(0)
+
+                valid = valid & (hour >= 0) & (hour <= 23) & (minute >= 0) & (minute <= 59) & (microsecond >= 0) & (microsecond < 60000000)
+                if not valid.all():
+                    raise ValueError('date/time values out of range')
+
+            except (ValueError, TypeError, AttributeError):
+                raise ValueError('{:} fields not formatted correctly; unable to parse in file: {:}'.format(description,self.filename))
+                return
+
+            dt = days.astype('datetime64[us]') + (hour*3600000000 + minute*60000000 + microsecond).astype('timedelta64[us]')
+
+            if as_datetime:
+                return dt.astype(object).tolist()
+            return dt
+
+        print('Warning: fd_datetime64 failed -- file must contain a valid date and time information')
+
+        if as_datetime:
+            return []
+        return np.array([], dtype='datetime64[us]')
+
 #==========================================================================================================================================
 
     def addDataToOutput(self ,irow,var_name,units,var_value, overwrite):
@@ -782,6 +1625,9 @@ class readSB:
                 print('Warning: no units found in SeaBASS file header')
             self.data[var_name] = deepcopy(self.empty_col)
 
+        #the cached datetimes no longer match the data
+        self.cached_datetime = None
+
         #save data to column and row
         if is_number(self.data[var_name][irow]):
             if overwrite:
@@ -800,52 +1646,80 @@ class readSB:
 
 #==========================================================================================================================================
 
-    def writeSBfile(self, ofile):
+    def addRowsToOutput(self, data, units=None):
 
         """
-        writeSBfile writes out an SeaBASS file
-        given an output file name
-        syntax: SELF.writeSBfile(ofile)
+        addRowsToOutput appends a batch of rows to the data matrix, given a dictionary of equal length columns (lists or
+        NumPy arrays) keyed by field name, in place of calling addDataToOutput for every value
+        Fields not yet in the file are added to the fields & units headers (units from the optional units dictionary,
+        keyed by field name, default 'none') and are set to the missing value for the existing rows. Existing fields
+        not in data are set to the missing value for the new rows.
+        syntax: SELF.addRowsToOutput(data, units)
         """
-        from math import isnan
 
-        fout = open(ofile,'w')
+        import numpy as np
+
+        if not units:
+            units = {}
 
-        fout.write('/begin_header\n')
+        lengths = set(len(data[var]) for var in data)
+        if len(lengths) > 1:
+            raise ValueError('all columns must have the same length to add rows to file: {:}'.format(self.filename))
+            return
+        nrows = lengths.pop() if lengths else 0
 
-        for header in self.headers:
-            fout.write('/' + header + '=' + self.headers[header] + '\n')
+        columnar = any(isinstance(self.data[var], np.ndarray) for var in self.data)
 
-        for comment in self.comments:
-            fout.write('!' + comment + '\n')
+        def missing_col(n, like):
+            # missing values of the same type as the column they extend, so integer and text columns keep their type
+            if not columnar:
+                return [str(self.missing)] * n
+            kind = np.asarray(like).dtype.kind
+            if kind in 'iu' and float(self.missing).is_integer():
+                return np.full(n, int(self.missing), dtype=np.int64)
+            if kind == 'U':
+                return np.full(n, str(self.missing))
+            return np.full(n, np.nan)
 
-        fout.write('/end_header\n')
+        #define fields, units, and data column, if needed
+        for var_name in data:
+            if var_name not in self.data:
+                self.headers['fields'] = self.headers['fields'] + ',' + var_name
+                try:
+                    self.headers['units'] = self.headers['units'] + ',' + units.get(var_name, 'none').lower()
+                except:
+                    print('Warning: no units found in SeaBASS file header')
+                self.data[var_name] = missing_col(self.length, data[var_name])
+
+        #append the new rows to every column
+        for var in self.data:
+            new = data[var] if var in data else missing_col(nrows, self.data[var])
+            if isinstance(self.data[var], list):
+                self.data[var].extend(list(new))
+            else:
+                old, new = np.asarray(self.data[var]), np.asarray(new)
+                if old.dtype.kind != new.dtype.kind and not (old.dtype.kind in 'iuf' and new.dtype.kind in 'iuf'):
+                    old, new = old.astype(object), new.astype(object)
+                self.data[var] = np.concatenate((old, new))
 
-        if   'comma' in self.headers['delimiter']:
-            delim = ','
-        elif 'space' in self.headers['delimiter']:
-            delim = ' '
-        elif 'tab'   in self.headers['delimiter']:
-            delim = '\t'
+        self.length = self.length + nrows
+        self.empty_col = []
+        #the cached datetimes no longer match the data
+        self.cached_datetime = None
 
-        for i in range(self.length):
-            row_ls = []
+        return
 
-            for var in self.data:
+#==========================================================================================================================================
 
-                if is_number(self.data[var][i]):
-                    if float(self.data[var][i]) == float(self.missing) or isnan(float(self.data[var][i])):
-                        row_ls.append(str(self.missing))
-                    else:
-                        row_ls.append(str(self.data[var][i]))
-                else:
-                    if str(self.missing) in self.data[var][i] or 'nan' in self.data[var][i].lower():
-                        row_ls.append(str(self.missing))
-                    else:
-                        row_ls.append(str(self.data[var][i]))
+    def writeSBfile(self, ofile):
 
-            fout.write(delim.join(row_ls) + '\n')
+        """
+        writeSBfile writes out an SeaBASS file
+        given an output file name
+        Whole columns are formatted at once (see format_column), for row by row and columnar data alike.
+        syntax: SELF.writeSBfile(ofile)
+        """
 
-        fout.close()
+        writeSB(ofile, self.headers, self.comments, self.data, missing=str(self.missing), length=self.length)
 
         return
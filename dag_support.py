@@ -0,0 +1,161 @@
+""" Module for running the matchup workflow as a DAG of stages, make-style.
+
+Each stage declares its input files, output files, and parameters (sensor list, time window, par files, ...). A stage's
+fingerprint hashes its parameters and the content of its inputs, and is recorded in a JSON state file when the stage
+succeeds. On the next run, a stage is re-executed only if its fingerprint changed, one of its outputs is missing, or it
+is forced; otherwise it is skipped. Stages depend on the stages producing their inputs, and as inputs are compared by
+content, a stage that is re-executed but writes the same outputs does not cause its downstream stages to be re-executed.
+
+Notes:
+* Inputs may be files or directories. A directory produced by another stage (e.g. the satellite files written by 06)
+  is represented by that stage's fingerprint; other directories by the names, sizes, and modification times of their files.
+* The content hash of a file is cached in the state file with its size and modification time, so large unchanged inputs
+  (e.g. the field file) are not re-read on every run.
+* Stages 06 and 09 also skip the granules and matchups already recorded as done in the run state database (state_support.py),
+  so re-executing them after a change to the field file only processes the new granules and matchups.
+"""
+
+import hashlib
+import json
+import os
+
+class Stage:
+    ''' A workflow stage. action is a list of commands (argument lists) run in order, or a function called with the stage.
+    An empty output list means the stage (e.g. a report) is re-executed whenever its fingerprint changes. '''
+    def __init__(self, name, action, inputs=(), outputs=(), params=None):
+        self.name = name
+        self.action = action
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params or {}
+
+def run_stages(stages, state_fp, force=(), dry_run=False):
+    ''' Run the stages in dependency order, skipping those whose fingerprint matches the state file and whose outputs exist.
+    force lists stage names to re-execute regardless (and 'all' re-executes every stage). Returns the names of the stages run
+    (or, with dry_run, that would be run, assuming every stage run changes its outputs). '''
+    state = _load_state(state_fp)
+    producers = {os.path.normpath(output): stage.name for stage in stages for output in stage.outputs}
+    ran = []
+
+    for stage in sort_stages(stages):
+        stale = [dep for dep in dependencies(stage, producers) if dep in ran]
+        if dry_run and stale:
+            reason = 'upstream stage(s) ' + ', '.join(stale) + ' to be run'
+        else:
+            fingerprint = stage_fingerprint(stage, state, producers)
+            reason = _rerun_reason(stage, fingerprint, state, force)
+        if reason is None:
+            print('Skipping stage ', stage.name, ': up to date')
+            continue
+
+        print('Running stage ', stage.name, ': ', reason)
+        ran.append(stage.name)
+        if dry_run:
+            continue
+
+        if callable(stage.action):
+            stage.action(stage)
+        else:
+            run_commands(stage.action)
+
+        state['stages'][stage.name] = fingerprint
+        _save_state(state_fp, state)
+
+    return ran
+
+def run_commands(cmds):
+    ''' Run commands in order, raising CalledProcessError if one fails. '''
+    import subprocess
+    for cmd in cmds:
+        subprocess.run([str(arg) for arg in cmd], check=True)
+
+def sort_stages(stages):
+    ''' Order the stages so every stage comes after the stages producing its inputs, keeping the declared order otherwise. '''
+    producers = {os.path.normpath(output): stage.name for stage in stages for output in stage.outputs}
+    by_name = {stage.name: stage for stage in stages}
+    ordered, visiting = [], set()
+
+    def visit(stage):
+        if stage in ordered:
+            return
+        if stage.name in visiting:
+            raise ValueError('Workflow stages form a cycle at stage ' + stage.name)
+        visiting.add(stage.name)
+        for dep in dependencies(stage, producers):
+            visit(by_name[dep])
+        visiting.discard(stage.name)
+        ordered.append(stage)
+
+    for stage in stages:
+        visit(stage)
+    return ordered
+
+def dependencies(stage, producers):
+    ''' Names of the stages producing the inputs of stage. '''
+    deps = []
+    for fp in stage.inputs:
+        dep = producers.get(os.path.normpath(fp))
+        if dep and dep != stage.name and dep not in deps:
+            deps.append(dep)
+    return deps
+
+def stage_fingerprint(stage, state, producers):
+    ''' sha256 of the stage parameters and of the content of its inputs. '''
+    h = hashlib.sha256(json.dumps(stage.params, sort_keys=True, default=str).encode())
+    for fp in stage.inputs:
+        h.update(fp.encode())
+        producer = producers.get(os.path.normpath(fp))
+        if os.path.isdir(fp) and producer and producer != stage.name:
+            h.update(str(state['stages'].get(producer)).encode())
+        elif os.path.isdir(fp):
+            h.update(_directory_listing_hash(fp).encode())
+        elif os.path.isfile(fp):
+            h.update(_file_hash(fp, state['hashes']).encode())
+        else:
+            h.update(b'missing')
+    return h.hexdigest()
+
+def _rerun_reason(stage, fingerprint, state, force):
+    if 'all' in force or stage.name in force:
+        return 'forced'
+    if stage.name not in state['stages']:
+        return 'not run before'
+    if state['stages'][stage.name] != fingerprint:
+        return 'inputs or parameters changed'
+    missing = [fp for fp in stage.outputs if not os.path.exists(fp)]
+    if missing:
+        return 'missing output ' + missing[0]
+    return None
+
+def _file_hash(fp, hashes):
+    stat = os.stat(fp)
+    cached = hashes.get(fp)
+    if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        return cached[2]
+    h = hashlib.sha256()
+    with open(fp, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    hashes[fp] = [stat.st_size, stat.st_mtime_ns, h.hexdigest()]
+    return hashes[fp][2]
+
+def _directory_listing_hash(dp):
+    h = hashlib.sha256()
+    for root, dirs, files in sorted(os.walk(dp)):
+        dirs.sort()
+        for fn in sorted(files):
+            stat = os.stat(os.path.join(root, fn))
+            h.update((os.path.relpath(os.path.join(root, fn), dp) + ',' + str(stat.st_size) + ',' + str(stat.st_mtime_ns) + '\n').encode())
+    return h.hexdigest()
+
+def _load_state(state_fp):
+    if os.path.isfile(state_fp):
+        with open(state_fp) as f:
+            return json.load(f)
+    return {'stages': {}, 'hashes': {}}
+
+def _save_state(state_fp, state):
+    tmp_fp = state_fp + '.tmp'
+    with open(tmp_fp, 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp_fp, state_fp)
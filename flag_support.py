@@ -0,0 +1,48 @@
+""" Module for the matchup flags computed in bulk over a matchup table, rather than datarow by datarow in 09-matchup-datarows.py.
+
+Rrs coefficient of variation flag (Bailey and Werdell): the coefficient of variation (filtered stdev/filtered mean) of each Rrs band
+between 410 and 556 nm, and their median over the bands of a matchup, Rrs_410_556_median_cv. cv_flag is 0 if the median is at most
+0.15, 1 if it is above, and 2 if no band has a coefficient of variation (e.g. every Rrs pixel is NaN, or the sensor has no such band).
+10-merge-datarows.py adds both columns to the merged matchup dataframe.
+
+The Rrs bands are resolved once from the column names (Rrs_<wavelength>_filtered_mean and Rrs_<wavelength>_filtered_stdev).
+"""
+
+import re
+
+RRS_FILTERED_MEAN = re.compile(r'^Rrs_([0-9]+)_filtered_mean$')
+
+def rrs_bands(columns, wvl_min=410, wvl_max=556):
+    ''' Wavelengths (as in the column names, e.g. '443') of the Rrs bands between wvl_min and wvl_max whose filtered mean
+    and filtered stdev are both columns, by wavelength. '''
+    columns = set(columns)
+    bands = []
+    for column in columns:
+        match = RRS_FILTERED_MEAN.match(column)
+        if match and wvl_min <= float(match.group(1)) <= wvl_max and 'Rrs_' + match.group(1) + '_filtered_stdev' in columns:
+            bands.append(match.group(1))
+    return sorted(bands, key=float)
+
+def rrs_cv_flag(matchupDf, cv_max=0.15, wvl_min=410, wvl_max=556):
+    ''' Add (or replace) the Rrs_410_556_median_cv and cv_flag columns of a matchup dataframe, before location_flag if it is
+    a column (as 09-matchup-datarows.py wrote them), or at the end. '''
+    import warnings
+    import numpy as np
+    import pandas as pd
+
+    bands = rrs_bands(matchupDf.columns, wvl_min, wvl_max)
+    means = matchupDf[['Rrs_' + band + '_filtered_mean' for band in bands]].to_numpy(dtype='float64')
+    stdevs = matchupDf[['Rrs_' + band + '_filtered_stdev' for band in bands]].to_numpy(dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cvs = stdevs/means
+
+    no_cv = np.isnan(cvs).all(axis=1)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)  # median of the matchups without any cv
+        median_cv = np.nanmedian(cvs, axis=1) if len(bands) > 0 else np.full(len(matchupDf), np.nan)
+    cv_flag = np.where(no_cv, 2, median_cv > cv_max).astype('int64')
+
+    flags = pd.DataFrame({'Rrs_410_556_median_cv':median_cv, 'cv_flag':cv_flag}, index=matchupDf.index)
+    matchupDf = matchupDf.drop(columns=list(flags.columns), errors='ignore')
+    position = matchupDf.columns.get_loc('location_flag') if 'location_flag' in matchupDf.columns else len(matchupDf.columns)
+    return pd.concat([matchupDf.iloc[:, :position], flags, matchupDf.iloc[:, position:]], axis=1)
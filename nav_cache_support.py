@@ -0,0 +1,143 @@
+""" Module for the per-granule navigation cache of the matchup stage (09-matchup-datarows.py --navCache).
+
+Every matchup of a granule reads the same navigation_data group and computes the distance to every pixel of it. The cache
+decodes the navigation of a granule once into .npy files, which the matchup processes memory-map read-only: the processes of
+a node then share one copy in the page cache instead of each holding its own. It also holds a spatial index of the swath, so
+the nearest pixel search only computes the distance to the pixels of the blocks that can hold the nearest pixel.
+
+Cache layout (<cache directory>/<granid>/):
+* latitude.npy, longitude.npy : navigation arrays, as decoded from the L2 file (NaN where missing)
+* xyz.npy                     : unit vectors (rows, cols, 3) of the pixels, float32, NaN where the navigation is missing
+* block_xyz.npy               : spatial index: mean unit vector of the valid pixels of each BLOCK x BLOCK block of pixels
+* block_radius.npy            : angle (radians) from the block vector to the farthest valid pixel of the block
+* source.json                 : size and modification time of the L2 file, to rebuild the cache if the file is reprocessed
+
+Notes:
+* A cache is written under a temporary name and renamed once complete, and builds are serialised by a lock file
+  (<granid>.lock), so concurrent matchups of a granule build it once and never read a partial cache.
+* The cache can be deleted at any time; it is rebuilt by the next matchup of the granule.
+"""
+
+import os
+
+BLOCK = 32
+# Angle (radians, ~60 m) added to the search bound, well above the rounding of the float32 unit vectors and of the haversine distance
+TOLERANCE = 1e-5
+ARRAYS = ['latitude', 'longitude', 'xyz', 'block_xyz', 'block_radius']
+
+def load_nav(cache_dir, granid, satfiledir):
+    ''' Return the navigation cache of a granule (a dict of read-only memory-mapped arrays), building it from the L2 file
+    satfiledir first if it does not exist or is out of date. '''
+    import fcntl
+    import numpy as np
+
+    granule_dir = os.path.join(cache_dir, granid)
+    source = source_stamp(satfiledir)
+    if read_stamp(granule_dir) != source:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(os.path.join(cache_dir, granid + '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if read_stamp(granule_dir) != source:
+                build_nav(satfiledir, granule_dir, source)
+    return {name: np.load(os.path.join(granule_dir, name + '.npy'), mmap_mode='r') for name in ARRAYS}
+
+def build_nav(satfiledir, granule_dir, source):
+    ''' Write the navigation cache of the L2 file satfiledir to granule_dir, replacing any previous cache. '''
+    import json
+    import shutil
+    import numpy as np
+    import xarray as xr
+
+    with xr.open_dataset(satfiledir, group='navigation_data') as satNav:
+        latitude = satNav.latitude.values
+        longitude = satNav.longitude.values
+    xyz = unit_vectors(latitude, longitude)
+    block_xyz, block_radius = block_index(xyz)
+
+    tmp_dir = granule_dir + '.tmp' + str(os.getpid())
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for name, array in [('latitude', latitude), ('longitude', longitude), ('xyz', xyz.astype('float32')), ('block_xyz', block_xyz), ('block_radius', block_radius)]:
+        np.save(os.path.join(tmp_dir, name + '.npy'), array)
+    with open(os.path.join(tmp_dir, 'source.json'), 'w') as f:
+        json.dump(source, f)
+
+    # Processes still reading an out of date cache keep their memory maps of the removed files:
+    if os.path.isdir(granule_dir):
+        old_dir = granule_dir + '.old' + str(os.getpid())
+        os.rename(granule_dir, old_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+    os.rename(tmp_dir, granule_dir)
+
+def source_stamp(satfiledir):
+    ''' Size and modification time of the L2 file (raises FileNotFoundError if it does not exist). '''
+    stat = os.stat(satfiledir)
+    return {'size':stat.st_size, 'mtime_ns':stat.st_mtime_ns}
+
+def read_stamp(granule_dir):
+    import json
+    try:
+        with open(os.path.join(granule_dir, 'source.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def unit_vectors(lat, lon):
+    ''' Unit vectors (..., 3) of the points at latitudes lat and longitudes lon (degrees), in float64. '''
+    import numpy as np
+    lat = np.radians(np.asarray(lat, dtype='float64'))
+    lon = np.radians(np.asarray(lon, dtype='float64'))
+    return np.stack([np.cos(lat)*np.cos(lon), np.cos(lat)*np.sin(lon), np.sin(lat)], axis=-1)
+
+def block_index(xyz):
+    ''' Spatial index of the unit vectors xyz (rows, cols, 3): for each BLOCK x BLOCK block of pixels (row major), the
+    normalised mean vector of its valid pixels and the angle to the farthest of them. Both are NaN for blocks without valid pixels. '''
+    import warnings
+    import numpy as np
+
+    rows, cols = xyz.shape[:2]
+    block_rows, block_cols = -(-rows//BLOCK), -(-cols//BLOCK)
+    padded = np.full((block_rows*BLOCK, block_cols*BLOCK, 3), np.nan)
+    padded[:rows, :cols] = xyz
+    blocks = padded.reshape(block_rows, BLOCK, block_cols, BLOCK, 3).transpose(0, 2, 1, 3, 4).reshape(block_rows*block_cols, BLOCK*BLOCK, 3)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)  # mean and max of blocks without valid pixels
+        block_xyz = np.nanmean(blocks, axis=1)
+        block_xyz /= np.linalg.norm(block_xyz, axis=1, keepdims=True)
+        block_radius = np.nanmax(angle(blocks, block_xyz[:, None, :]), axis=1)
+    return block_xyz, block_radius
+
+def angle(a, b):
+    ''' Angle (radians) between the unit vectors a and b (along the last axis). '''
+    import numpy as np
+    return 2*np.arcsin(np.clip(np.linalg.norm(a - b, axis=-1)/2, 0, 1))
+
+def block_pixels(nav, blocks):
+    ''' Flat pixel indices (sorted) of the pixels of the given blocks. '''
+    import numpy as np
+    rows, cols = nav['latitude'].shape
+    block_cols = -(-cols//BLOCK)
+    offsets = np.arange(BLOCK)
+    pixels = []
+    for block in np.sort(blocks):
+        block_row, block_col = divmod(block, block_cols)
+        pixel_rows = block_row*BLOCK + offsets[offsets < rows - block_row*BLOCK]
+        pixel_cols = block_col*BLOCK + offsets[offsets < cols - block_col*BLOCK]
+        pixels.append((pixel_rows[:, None]*cols + pixel_cols[None, :]).ravel())
+    return np.sort(np.concatenate(pixels)) if pixels else np.array([], dtype='int64')
+
+def candidate_pixels(nav, lat, lon):
+    ''' Flat indices (sorted) of the pixels that can be the nearest pixel to (lat, lon): the pixels of the blocks whose nearest
+    possible pixel is no farther than the nearest pixel of the most promising block. Empty if the point or the whole navigation is NaN. '''
+    import numpy as np
+
+    point = unit_vectors(lat, lon)
+    if np.isnan(point).any() or np.isnan(nav['block_radius']).all():
+        return np.array([], dtype='int64')
+
+    lower_bound = np.maximum(angle(nav['block_xyz'], point) - nav['block_radius'], 0)
+    best_block = np.nanargmin(lower_bound)
+    best_pixels = block_pixels(nav, [best_block])
+    upper_bound = np.nanmin(angle(nav['xyz'].reshape(-1, 3)[best_pixels].astype('float64'), point))
+    return block_pixels(nav, np.flatnonzero(lower_bound <= upper_bound + TOLERANCE))
@@ -0,0 +1,40 @@
+""" Module for reading the l2gen product-selection manifest (06g-product-manifest.txt).
+
+The manifest is shared by 06h-generate-par.py, which writes the l2prod1 list of the l2gen par files,
+and 09-matchup-datarows.py, which only calculates pixel grid statistics for the listed products.
+
+Manifest format: one l2gen product name per line. Blank lines and lines starting with '#' are ignored.
+The l2gen band wildcard '_vvv' (i.e. Rrs_vvv, adg_vvv_giop) matches every band of the sensor.
+"""
+
+import re
+
+# Products that only exist when the par file sets proc_sst=1:
+sst_products = ['sst', 'sst4', 'sst_triple', 'qual_sst', 'qual_sst4', 'flags_sst', 'flags_sst4', 'bias_sst', 'stdv_sst']
+
+def read_product_manifest(manifest_fp):
+    ''' Return the list of l2gen product names listed in the manifest, in order and without duplicates. '''
+    products = []
+    with open(manifest_fp, 'r') as file:
+        for line in file:
+            product = line.split('#', 1)[0].strip()
+            if product and product not in products:
+                products.append(product)
+    return products
+
+def product_regex(product):
+    ''' Return a compiled regex matching the L2 variable names produced by an l2gen product name. '''
+    return re.compile('^' + re.escape(product).replace('vvv', '[0-9]+') + '$')
+
+def select_products(var_names, products):
+    ''' Return the variable names (in their original order) that are produced by any of the manifest products. '''
+    regexes = [product_regex(product) for product in products]
+    return [var_name for var_name in var_names if any(regex.match(var_name) for regex in regexes)]
+
+def l2prod_list(products, proc_sst=True):
+    ''' Return the l2prod1 par value for the manifest products. SST products are dropped when proc_sst is False, and
+    l2_flags is always appended since l2gen masking and the matchup flags depend on it. '''
+    l2prod = [product for product in products if proc_sst or product not in sst_products]
+    if 'l2_flags' not in l2prod:
+        l2prod.append('l2_flags')
+    return ','.join(l2prod)
@@ -0,0 +1,76 @@
+""" Module for the SQLite run state database of the matchup workflow.
+
+The state database records the status, timings, failure reason, and output path of every granule processed to L2 (06)
+and every matchup datarow (09), so the scheduler, the percent-processed report (07), and reruns can query it rather than
+re-scanning the satellite file and matchup directories.
+
+Granule statuses: running, done, failed
+Matchup statuses: done, excluded (failure_reason is the excluded matchup log code: FIE, Nav, 1km), failed
+
+Notes:
+* SQLite relies on file locking. Place the database on a filesystem with working locks; concurrent writers wait up to
+  the connection timeout for the lock.
+"""
+
+import sqlite3
+
+granule_columns = ['granid', 'satellite', 'status', 'started', 'finished', 'seconds', 'failure_reason', 'output_path']
+matchup_columns = ['id', 'granid', 'satellite', 'status', 'started', 'finished', 'seconds', 'failure_reason', 'output_path']
+
+def connect(db_fp, timeout=60):
+    ''' Open (and create if needed) the state database. The tables are only created if missing, so connecting to an existing
+    database does not take its write lock. '''
+    conn = sqlite3.connect(db_fp, timeout=timeout)
+    tables = set(row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'"))
+    if {'granules', 'matchups'} <= tables:
+        return conn
+    conn.execute('''CREATE TABLE IF NOT EXISTS granules (granid TEXT PRIMARY KEY, satellite TEXT, status TEXT, started TEXT,
+                    finished TEXT, seconds REAL, failure_reason TEXT, output_path TEXT)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS matchups (id TEXT, granid TEXT, satellite TEXT, status TEXT, started TEXT,
+                    finished TEXT, seconds REAL, failure_reason TEXT, output_path TEXT, PRIMARY KEY (id, granid))''')
+    conn.commit()
+    return conn
+
+def set_granule(conn, granid, satellite, status, started=None, finished=None, failure_reason=None, output_path=None):
+    ''' Insert or replace the state of a granule. started and finished are datetimes. '''
+    _upsert(conn, 'granules', granule_columns, [granid, satellite, status] + _timing(started, finished) + [failure_reason, output_path])
+
+def set_matchup(conn, matchup_id, granid, satellite, status, started=None, finished=None, failure_reason=None, output_path=None):
+    ''' Insert or replace the state of a matchup. started and finished are datetimes. '''
+    _upsert(conn, 'matchups', matchup_columns, [matchup_id, granid, satellite, status] + _timing(started, finished) + [failure_reason, output_path])
+
+def granules_with_status(conn, statuses, satellite=None):
+    ''' Return the set of granids whose status is one of statuses, optionally restricted to one satellite. '''
+    query = 'SELECT granid FROM granules WHERE status IN (' + ','.join('?'*len(statuses)) + ')'
+    params = list(statuses)
+    if satellite:
+        query += ' AND satellite = ?'
+        params.append(satellite)
+    return set(row[0] for row in conn.execute(query, params))
+
+def matchups_with_status(conn, statuses, failure_reasons=None):
+    ''' Return the set of (id, granid) whose status is one of statuses and, if given, whose failure reason is one of failure_reasons. '''
+    query = 'SELECT id, granid FROM matchups WHERE status IN (' + ','.join('?'*len(statuses)) + ')'
+    params = list(statuses)
+    if failure_reasons:
+        query += ' AND failure_reason IN (' + ','.join('?'*len(failure_reasons)) + ')'
+        params += list(failure_reasons)
+    return set(conn.execute(query, params))
+
+def delete_granules(conn, granids):
+    ''' Forget the state of the given granids, so they are checked on the filesystem (and processed if their L2 file is missing) again. '''
+    conn.executemany('DELETE FROM granules WHERE granid = ?', [(granid,) for granid in granids])
+    conn.commit()
+
+def delete_matchups(conn, keys):
+    ''' Forget the state of the given (id, granid) matchups, so they are listed as pending again. '''
+    conn.executemany('DELETE FROM matchups WHERE id = ? AND granid = ?', [tuple(key) for key in keys])
+    conn.commit()
+
+def _timing(started, finished):
+    seconds = (finished - started).total_seconds() if started and finished else None
+    return [started.isoformat() if started else None, finished.isoformat() if finished else None, seconds]
+
+def _upsert(conn, table, columns, values):
+    conn.execute('INSERT OR REPLACE INTO ' + table + ' (' + ','.join(columns) + ') VALUES (' + ','.join('?'*len(columns)) + ')', values)
+    conn.commit()
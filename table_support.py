@@ -0,0 +1,133 @@
+""" Module for reading and writing the intermediate tables passed between the matchup workflow stages.
+
+Each stage boundary has an explicit schema (column names and types), so the scripts no longer hard-code the column
+names of their input files, and every table is read back with the same types it was written with.
+
+The file format is chosen by the file extension:
+* .parquet : typed columnar Parquet file (requires pyarrow). Datetimes and station ids keep their types, and nothing
+             is re-parsed or type-inferred when the next stage reads the table.
+* .csv     : CSV file, as written by the original workflow. Tables with a fixed schema are headerless (their columns
+             are given by the schema); tables without one (field data, matchup dataframes) have a header row.
+
+Files read line by line by the submission scripts (e.g. 09-pending-granlinks-*.csv, the shard lists) must stay .csv.
+
+Field index: 08-partition-field-by-satellite.py also writes an ID index of each partitioned field file (write_field_index),
+so 09-matchup-datarows.py reads the rows of one station (read_field_rows) without reading and scanning the whole file:
+* <field file>.idx.arrow : the field table, as written to the field file, sorted by ID (Arrow IPC file, memory-mapped; requires pyarrow)
+* <field file>.idx.npy   : the sorted IDs (as text), memory-mapped and binary searched
+An index older than its field file is ignored, and no index is written or read without pyarrow.
+
+Stages:
+L2-granlinks  : CMR L2 granule links matched up to the field records (03-find-matchup.py)
+L1a-granlinks : field records matched up to L1a granules (04-edit-L2-urls.py, 09a-list-pending-matchups.py)
+download-urls : unique L1a granules with expanded bounding boxes (05-create-L1a-download-list.py)
+duplicates    : stations deduplicated from the station list (02-seabass-station-list.py --dedupTolerance)
+station-hashes: content hash of the field data of every station of a run (02a-field-delta.py)
+field         : field data, partitioned by satellite (08-partition-field-by-satellite.py); columns from the data
+matchups      : matchup datarows and dataframes (09, 10, 11); columns from the data
+"""
+
+from collections import OrderedDict
+
+bbox = [('wlon','float64'), ('slat','float64'), ('elon','float64'), ('nlat','float64')]
+
+schemas = {'L2-granlinks' : OrderedDict([('lat','float64'), ('lon','float64'), ('datetimes','datetime64[ns]'), ('station','str'), ('granurls','str')] + bbox),
+           'L1a-granlinks': OrderedDict([('station','str'), ('granid','str'), ('granurl','str')] + bbox),
+           'download-urls': OrderedDict([('granid','str'), ('granurl','str')] + bbox),
+           'duplicates'   : OrderedDict([('station','str'), ('kept_station','str')]),
+           'station-hashes': OrderedDict([('station','str'), ('hash','str')]),
+           'field'        : None,
+           'matchups'     : None}
+
+def read_table(fp, stage):
+    ''' Read the table of a stage from a .parquet or .csv file, with the columns and types of the stage schema. An empty csv file
+    (e.g. no matchups for a satellite) is read as an empty table. '''
+    import os
+    import pandas as pd
+
+    schema = schemas[stage]
+
+    if is_parquet(fp):
+        df = pd.read_parquet(fp)
+        if schema is not None and list(df.columns) != list(schema):
+            raise ValueError('Columns of ' + fp + ' do not match the ' + stage + ' schema: ' + ','.join(df.columns) + ' != ' + ','.join(schema))
+        return df
+
+    if os.path.getsize(fp) == 0:
+        return pd.DataFrame({column: pd.Series(dtype=_dtype(dtype)) for column,dtype in (schema or {}).items()})
+
+    if schema is None:
+        return pd.read_csv(fp)
+
+    dates = [column for column,dtype in schema.items() if dtype.startswith('datetime64')]
+    dtypes = {column: _dtype(dtype) for column,dtype in schema.items() if column not in dates}
+    return pd.read_csv(fp, names=list(schema), dtype=dtypes, parse_dates=dates)
+
+def write_table(df, fp, stage):
+    ''' Write the table of a stage to a .parquet or .csv file. Tables with a schema are written with exactly the schema's columns and types. '''
+    schema = schemas[stage]
+
+    if schema is not None:
+        df = df[list(schema)].copy()
+        for column,dtype in schema.items():
+            if dtype == 'str':
+                df[column] = df[column].where(df[column].isna(), df[column].astype(str)).astype(object)
+            else:
+                df[column] = df[column].astype(dtype)
+
+    if is_parquet(fp):
+        df.to_parquet(fp, index=False)
+    else:
+        df.to_csv(fp, index=False, header=schema is None)
+
+def write_field_index(df, fp, id_col='ID'):
+    ''' Write the ID index of the field data file fp (see above) from df, the field table just written to it. Without pyarrow, no
+    index is written (with a warning) and 09-matchup-datarows.py reads the whole file. '''
+    import numpy as np
+    try:
+        import pyarrow as pa
+    except ImportError:
+        print('WARNING: pyarrow is not installed, the ID index of ', fp, ' is not written')
+        return
+
+    ids = df[id_col].astype(str).to_numpy()
+    order = np.argsort(ids, kind='stable')
+    table = pa.Table.from_pandas(df.iloc[order], preserve_index=False)
+    with pa.OSFile(fp + '.idx.arrow', 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    np.save(fp + '.idx.npy', ids[order].astype(str))
+
+def read_field_rows(fp, station_id, id_col='ID'):
+    ''' Rows of a field data file whose ID is station_id (as text), through the ID index of the file if it is up to date (and pyarrow
+    is installed), or by reading the whole file. '''
+    import os
+    import numpy as np
+
+    try:
+        import pyarrow as pa
+    except ImportError:
+        pa = None
+
+    if pa is not None and os.path.isfile(fp + '.idx.npy') and os.path.isfile(fp + '.idx.arrow') and \
+       min(os.path.getmtime(fp + '.idx.npy'), os.path.getmtime(fp + '.idx.arrow')) >= os.path.getmtime(fp):
+        ids = np.load(fp + '.idx.npy', mmap_mode='r')
+        start, end = np.searchsorted(ids, [str(station_id)], side='left')[0], np.searchsorted(ids, [str(station_id)], side='right')[0]
+        table = pa.ipc.open_file(pa.memory_map(fp + '.idx.arrow')).read_all()
+        return table.slice(start, end - start).to_pandas()
+
+    field = read_table(fp, 'field')
+    return field.loc[field[id_col].astype(str) == str(station_id)].reset_index(drop=True)
+
+def satellite_path(fp, satellite):
+    ''' Path of the satellite specific file of a table: the satellite name is appended to the file name, before the extension. '''
+    import os
+    root, ext = os.path.splitext(fp)
+    return root + '-' + satellite + ext
+
+def is_parquet(fp):
+    return fp.endswith('.parquet')
+
+def _dtype(dtype):
+    # str columns are held as object columns of Python strings
+    return object if dtype == 'str' else dtype
@@ -0,0 +1,227 @@
+""" Module for the per-stage timing and resource telemetry of the matchup workflow.
+
+When the MATCHUP_TELEMETRY environment variable holds the path of a telemetry log, every stage script records one JSON line
+per stage run (step 'main', see run_main) and per sub-step (CMR queries, netCDF open, stats kernel, csv write, ...), and the
+satellite workflow scripts record their commands (wget, modis_GEO, l2gen, ...) by running them through this module:
+
+    python telemetry_support.py --stage 06b-modis-workflow --step l2gen --granid A2019086065000 -- l2gen par=A2019086065000.par
+
+When MATCHUP_TELEMETRY is not set nothing is recorded, and the overhead is a dictionary lookup per step.
+12-report-telemetry.py summarises the log of a run.
+
+Profiling: stage scripts run with --profile <directory> (or with the MATCHUP_PROFILE environment variable set to a directory)
+run their main function under cProfile, and dump the profile of the process to <directory>/<stage>.<host>.<pid>.<uuid>.prof.
+12a-aggregate-profiles.py merges the profiles of many processes (e.g. the thousands of 09 matchups).
+
+Record fields:
+* run: MATCHUP_RUN_ID environment variable (e.g. the PBS job id), stage: script name, step, host, pid, started (ISO time)
+* wall_s, cpu_s (user + system, of the process and its waited-for children), max_rss_mb (peak resident memory of the process)
+* read_bytes, write_bytes: bytes read and written by the step (Python steps: read/write calls, from /proc/self/io;
+  commands: block device input/output), or null where the platform does not report them
+* items: number of items processed by the step (queries, granules, datarows, ...), status: ok, or the exception or exit status
+* any other fields given to step (e.g. granid)
+
+Notes:
+* Each record is appended with a single write, so concurrent processes on one node do not interleave their lines.
+  On network filesystems without atomic appends, give each node its own log (e.g. include the host name in the path).
+"""
+
+import os
+
+ENV_VAR = 'MATCHUP_TELEMETRY'
+RUN_ENV_VAR = 'MATCHUP_RUN_ID'
+PROFILE_ENV_VAR = 'MATCHUP_PROFILE'
+
+# Stage recorded by step when none is given (by default, the name of the script run)
+stage_name = None
+
+def enabled():
+    ''' Whether a telemetry log is set. '''
+    return bool(os.environ.get(ENV_VAR))
+
+class step:
+    ''' Context manager recording the timing and resources of a step. The record (a dict) is returned on entry, so the step
+    can add to its items count or fields, e.g.
+
+        with telemetry_support.step('csv_write', items=len(df)) as record:
+            df.to_csv(fp)
+    '''
+
+    def __init__(self, name, stage=None, items=None, **fields):
+        self.record = dict(fields, step=name, items=items)
+        self.stage = stage
+
+    def __enter__(self):
+        if enabled():
+            self.start = _usage()
+        return self.record
+
+    def __exit__(self, exc_type, exc, tb):
+        if enabled():
+            status = 'ok' if exc_type is None else exc_type.__name__
+            if exc_type is SystemExit and exc.code in (None, 0):
+                status = 'ok'
+            _write(_record(self.stage or stage_name or _script_name(), self.start, _usage(), status, self.record))
+        return False
+
+def run_main(main, stage=None):
+    ''' Run the main function of a stage script as its step 'main', with the script name (without extension) as the stage of
+    every step recorded by the process. The --profile <directory> option is taken off the command line (before main parses it)
+    and, like MATCHUP_PROFILE, runs main under cProfile. '''
+    import sys
+    global stage_name
+    stage_name = stage or _script_name()
+    profile_dir, sys.argv[1:] = _profile_option(sys.argv[1:])
+    with step('main'):
+        if profile_dir:
+            run_profiled(main, profile_dir, stage_name)
+        else:
+            main()
+
+def run_profiled(function, profile_dir, stage):
+    ''' Run function under cProfile, and dump the profile to profile_dir/<stage>.<host>.<pid>.<uuid>.prof, even if it raises. '''
+    import cProfile
+    import platform
+    import uuid
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function)
+    finally:
+        os.makedirs(profile_dir, exist_ok=True)
+        # PIDs are reused over the thousands of short 09 processes of a node, so the file name also holds a random uuid:
+        profiler.dump_stats(os.path.join(profile_dir, stage + '.' + platform.node() + '.' + str(os.getpid()) + '.' + uuid.uuid4().hex + '.prof'))
+
+def run_command(command, stage, name, **fields):
+    ''' Run a command, recording its timing and resources (from the rusage of the child) as a step. Returns its exit status. '''
+    import subprocess
+    import time
+    from datetime import datetime
+
+    started = datetime.now()
+    t0 = time.perf_counter()
+    try:
+        proc = subprocess.Popen(command)
+    except OSError as e:
+        _write(dict(_header(stage, started), wall_s=0.0, cpu_s=0.0, max_rss_mb=None, read_bytes=None, write_bytes=None, status=type(e).__name__, **fields, step=name, items=None))
+        return 127
+    while True:
+        try:
+            pid, wait_status, rusage = os.wait4(proc.pid, 0)
+            break
+        except InterruptedError:
+            continue
+    # As os.waitstatus_to_exitcode (Python 3.9+): the exit status, or minus the signal that killed the command
+    returncode = -os.WTERMSIG(wait_status) if os.WIFSIGNALED(wait_status) else os.WEXITSTATUS(wait_status)
+    proc.returncode = returncode
+    _write(dict(_header(stage, started), wall_s=time.perf_counter() - t0, cpu_s=rusage.ru_utime + rusage.ru_stime, \
+                max_rss_mb=rusage.ru_maxrss/1024, read_bytes=rusage.ru_inblock*512, write_bytes=rusage.ru_oublock*512, \
+                status='ok' if returncode == 0 else 'exit ' + str(returncode), **fields, step=name, items=None))
+    return returncode
+
+def read_log(log_fp, run=None):
+    ''' Read the records of a telemetry log (optionally of one run only) as a dataframe. Truncated lines are skipped. '''
+    import json
+    import pandas as pd
+
+    records = []
+    with open(log_fp) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if run is None or record.get('run') == run:
+                records.append(record)
+    return pd.DataFrame(records)
+
+def _profile_option(argv):
+    # The --profile option of every stage script, and the remaining arguments (for the script's own parser)
+    import argparse
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument('--profile', nargs=1, type=str)
+    known, rest = parser.parse_known_args(argv)
+    return known.profile[0] if known.profile else os.environ.get(PROFILE_ENV_VAR), rest
+
+def _script_name():
+    import sys
+    return os.path.splitext(os.path.basename(sys.argv[0]))[0]
+
+def _usage():
+    import resource
+    import time
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {'time':time.perf_counter(), 'started':_now(), 'cpu':self_usage.ru_utime + self_usage.ru_stime + children.ru_utime + children.ru_stime, \
+            'max_rss':self_usage.ru_maxrss, 'io':_proc_io()}
+
+def _proc_io():
+    # Bytes read and written by the process's read/write calls (Linux)
+    try:
+        with open('/proc/self/io') as f:
+            fields = dict(line.split(':') for line in f)
+        return int(fields['rchar']), int(fields['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+def _record(stage, start, end, status, fields):
+    record = _header(stage, start['started'])
+    record.update({'wall_s':end['time'] - start['time'], 'cpu_s':end['cpu'] - start['cpu'], 'max_rss_mb':end['max_rss']/1024, \
+                   'read_bytes':end['io'][0] - start['io'][0] if start['io'] and end['io'] else None, \
+                   'write_bytes':end['io'][1] - start['io'][1] if start['io'] and end['io'] else None, 'status':status})
+    record.update(fields)
+    return record
+
+def _header(stage, started):
+    import platform
+    return {'run':os.environ.get(RUN_ENV_VAR), 'stage':stage, 'host':platform.node(), 'pid':os.getpid(), \
+            'started':started if isinstance(started, str) else started.isoformat(timespec='milliseconds')}
+
+def _now():
+    from datetime import datetime
+    return datetime.now().isoformat(timespec='milliseconds')
+
+def _write(record):
+    import json
+    line = (json.dumps(record, default=str) + '\n').encode()
+    fd = os.open(os.environ[ENV_VAR], os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+def main():
+
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description='''\
+      Run a command (given after --), recording its wall time, cpu time, peak memory, and block input/output to the telemetry log \
+      (MATCHUP_TELEMETRY) as a step of a stage. If MATCHUP_TELEMETRY is not set, the command is only run. Exits with the exit status \
+      of the command.''')
+
+    parser.add_argument('--stage', nargs=1, type=str, required=True, help='''\
+    Stage of the step, e.g. 06b-modis-workflow.''')
+
+    parser.add_argument('--step', nargs=1, type=str, required=True, help='''\
+    Name of the step, e.g. l2gen.''')
+
+    parser.add_argument('--granid', nargs=1, type=str, required=False, help='''\
+    OPTIONAL: Granule processed by the step, recorded with it.''')
+
+    parser.add_argument('command', nargs=argparse.REMAINDER, help='''\
+    Command to run, after --.''')
+
+    args=parser.parse_args()
+    dict_args=vars(args)
+
+    command = dict_args['command'][1:] if dict_args['command'][0:1] == ['--'] else dict_args['command']
+    if not command:
+        parser.error('no command given')
+    if not enabled():
+        os.execvp(command[0], command)
+
+    fields = {'granid':dict_args['granid'][0]} if dict_args['granid'] else {}
+    sys.exit(run_command(command, dict_args['stage'][0], dict_args['step'][0], **fields))
+
+if __name__ == "__main__": main()
@@ -0,0 +1,24 @@
+""" Module for the helpers shared by the numbered workflow scripts.
+
+Notes:
+* The numbered scripts (e.g. 03-find-matchup.py) are not valid module names, so the scripts that reuse their functions
+  (05a, 05b, 03b, 09b, 09c) import them with load_script.
+* l2_filepath is the L2 file layout written by the satellite workflow scripts (06a-06c).
+"""
+
+import os
+
+def load_script(script_fn):
+    ''' Import a numbered workflow script (whose file name is not a valid module name) from this directory as a module. '''
+    import importlib.util
+
+    spec = importlib.util.spec_from_file_location(os.path.splitext(script_fn)[0].replace('-','_'), os.path.join(os.path.dirname(os.path.abspath(__file__)), script_fn))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def l2_filepath(satFileDir, satellite, granid):
+    ''' Path of the L2 file written by the satellite workflow scripts: satFileDir/satellite/year/doy/granid.L2 '''
+    year = granid[-13:-9]
+    doy = granid[-9:-6]
+    return satFileDir + '/' + satellite + '/' + year + '/' + doy + '/' + granid + '.L2'